@@ -0,0 +1,81 @@
+"""
+File: ai_search.py
+Programmers: Fernando Rodriguez, Charles Davis
+
+Measures the computer opponent's search: nodes per second and
+depth reached within the time budget, from the opening and from
+positions a few random turns in. With --games it also plays the
+Searcher against random turns, landing attacks HIT_CHANCE of the
+time as rock paper scissors would.
+
+Usage: python -m benchmarks.ai_search [--time 0.5] [--positions 5] [--games 0] [--seed 1]
+
+"""
+import argparse
+import random
+import time
+
+from benchmarks.rules_engine import random_turn
+from src.ai import HIT_CHANCE, Searcher
+from src.rules import Rules
+
+def random_position(turns, rng):
+    rules = Rules()
+    for _ in range(turns):
+        rules.play_turn(rules.turn, random_turn(rules, rng))
+        if rules.winner:
+            break
+    return rules
+
+def play_game(searcher, rng):
+    """
+    Returns:
+        {int} -- Winner, with the Searcher as player 2
+    """
+    rules = Rules()
+    while not rules.winner:
+        if rules.turn == 2:
+            turn = searcher.choose_turn(rules, 2)
+        else:
+            turn = random_turn(rules, rng)
+        if turn["attack"] and rng.random() >= HIT_CHANCE:
+            turn["attack"] = None
+        rules.play_turn(rules.turn, turn)
+    return rules.winner
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--time", type=float, default=0.5)
+    parser.add_argument("--positions", type=int, default=5)
+    parser.add_argument("--games", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    positions = [("opening", Rules())]
+    for _ in range(args.positions - 1):
+        turns = rng.randrange(4, 20)
+        positions.append(("{} turns in".format(turns), random_position(turns, rng)))
+
+    print("{:<14} {:>8} {:>8} {:>10}".format("position", "nodes", "depth", "nodes/s"))
+    total_nodes = total_seconds = 0
+    for name, rules in positions:
+        if rules.winner:
+            continue
+        searcher = Searcher(time_budget=args.time)
+        start = time.perf_counter()
+        searcher.choose_turn(rules, rules.turn)
+        seconds = time.perf_counter() - start
+        total_nodes += searcher.nodes
+        total_seconds += seconds
+        print("{:<14} {:>8} {:>8} {:>10.0f}".format(name, searcher.nodes, searcher.depth,
+                                                    searcher.nodes / seconds))
+    print("{:<14} {:>8} {:>8} {:>10.0f}".format("all", total_nodes, "", total_nodes / total_seconds))
+
+    if args.games:
+        searcher = Searcher(time_budget=args.time)
+        wins = sum(play_game(searcher, rng) == 2 for _ in range(args.games))
+        print("won {} of {} games against random turns".format(wins, args.games))
+
+if __name__ == "__main__":
+    main()
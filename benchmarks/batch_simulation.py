@@ -0,0 +1,77 @@
+"""
+File: batch_simulation.py
+Programmers: Fernando Rodriguez, Charles Davis
+
+Measures game steps per second of BatchGames for several batch
+sizes against a pure-Python loop over GameState objects checked
+by Rules. A game step is one legal turn in one game; finished
+games are restarted so every batch stays full.
+
+Needs NumPy.
+
+Usage: python -m benchmarks.batch_simulation [--sizes 1 100 1000 10000] [--seconds 2]
+
+"""
+import argparse
+import random
+import time
+
+from benchmarks.rules_engine import random_turn
+from src.batch import BatchGames
+from src.gamestate import GameState
+from src.rules import Rules
+
+def batch_steps(size, seconds, seed):
+    """
+    Returns:
+        {(float, int)} -- Game steps per second and games finished
+    """
+    batch = BatchGames(size, seed)
+    steps, finished = 0, 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        steps += int(batch.step(*batch.random_turns()).sum())
+        finished += batch.reset_finished()
+    return steps / (time.perf_counter() - start), finished
+
+def python_steps(seconds, seed):
+    """
+    Plays games one at a time through Rules and GameState,
+    throwing random rock paper scissors hands for attacks.
+    """
+    rng = random.Random(seed)
+    steps, finished = 0, 0
+    rules = Rules(GameState())
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        turn = random_turn(rules, rng)
+        if turn["attack"]:
+            gamestate = rules.gamestate
+            gamestate.set_hand(1, rng.randint(1, 3))
+            gamestate.set_hand(2, rng.randint(1, 3))
+            if gamestate.rps_result() == 3 - rules.turn:
+                turn["attack"] = None
+            gamestate.clear_rps_hands()
+        rules.play_turn(rules.turn, turn)
+        steps += 1
+        if rules.winner:
+            finished += 1
+            rules = Rules(GameState())
+    return steps / (time.perf_counter() - start), finished
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 100, 1000, 10000])
+    parser.add_argument("--seconds", type=float, default=2)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print("{:<22} {:>14} {:>14}".format("", "game steps/s", "games played"))
+    rate, finished = python_steps(args.seconds, args.seed)
+    print("{:<22} {:>14.0f} {:>14}".format("GameState loop", rate, finished))
+    for size in args.sizes:
+        rate, finished = batch_steps(size, args.seconds, args.seed)
+        print("{:<22} {:>14.0f} {:>14}".format("BatchGames x {}".format(size), rate, finished))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+File: crash_recovery.py
+Programmers: Fernando Rodriguez, Charles Davis
+
+Measures what the write-ahead log costs and buys:
+
+1. Turn latency and throughput against a server started with and
+   without --wal, with the players of --pairs matches at once
+   sending random legal turns. With several matches, turns that
+   arrive during an fsync share the next one.
+2. Startup time of a server whose log holds --matches open
+   matches of --history turns each: reading the log, replaying
+   it into the match table and writing the first checkpoint.
+
+Usage: python -m benchmarks.crash_recovery [--turns 400] [--pairs 1 16] [--matches 10000] [--history 20]
+
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import server
+from benchmarks.rules_engine import random_turn
+from src.match import Match
+from src.network import Network
+from src.rules import Rules
+from src.wal import WriteAheadLog
+
+def start_server(port, *options):
+    process = subprocess.Popen([sys.executable, "server.py", "127.0.0.1", str(port), *options],
+                               stdout=subprocess.DEVNULL)
+    time.sleep(1)
+    return process
+
+# Held while a pair connects, so its players share a match
+connect_lock = threading.Lock()
+
+def turn_latencies(port, turns, rng):
+    """
+    Returns:
+        {list} -- Seconds from sending each turn to its acknowledgement
+    """
+    players = {}
+    with connect_lock:
+        for _ in range(2):
+            network = Network("127.0.0.1", port)
+            network.connect()
+            players[network.player_num] = network
+
+    rules = Rules()
+    latencies = []
+    while len(latencies) < turns:
+        if rules.winner:
+            # Start over in a new match
+            for network in players.values():
+                network.close()
+            return latencies + turn_latencies(port, turns - len(latencies), rng)
+        player_num = rules.turn
+        turn = random_turn(rules, rng)
+        start = time.perf_counter()
+        if not players[player_num].send_turn(turn):
+            raise RuntimeError("turn rejected")
+        latencies.append(time.perf_counter() - start)
+        rules.play_turn(player_num, turn)
+
+    for network in players.values():
+        network.close()
+    return latencies
+
+def run_pairs(port, pairs, turns):
+    """
+    Returns:
+        {(list, float)} -- Latency of every turn, and turns per second
+    """
+    results = [None] * pairs
+
+    def run_pair(pair):
+        results[pair] = turn_latencies(port, turns, random.Random(pair))
+
+    threads = [threading.Thread(target=run_pair, args=(pair,)) for pair in range(pairs)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+    latencies = sorted(latency for result in results for latency in result)
+    return latencies, len(latencies) / seconds
+
+async def write_log(path, match_count, history, rng):
+    """
+    Logs match_count matches that are history turns in.
+    """
+    open_matches = {}
+    wal = WriteAheadLog(path, open_matches.values)
+    for match_id in range(1, match_count + 1):
+        match = Match(match_id)
+        open_matches[match_id] = match
+        wal.log_opened(match)
+        for _ in range(history):
+            if match.rules.winner:
+                break
+            player_num = match.rules.turn
+            turn = random_turn(match.rules, rng)
+            match.rules.play_turn(player_num, turn)
+            wal.log_turn(match, player_num, turn)
+    await wal.close()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=400)
+    parser.add_argument("--pairs", type=int, nargs="+", default=[1, 16])
+    parser.add_argument("--matches", type=int, default=10000)
+    parser.add_argument("--history", type=int, default=20)
+    parser.add_argument("--port", type=int, default=5656)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "matches.wal")
+
+        print("{:<10} {:>6} {:>10} {:>10} {:>10} {:>10}".format(
+            "", "pairs", "mean ms", "p50 ms", "p99 ms", "turns/s"))
+        for label, options in (("no log", ()), ("--wal", ("--wal", path))):
+            for pairs in args.pairs:
+                process = start_server(args.port, *options)
+                try:
+                    latencies, throughput = run_pairs(args.port, pairs, args.turns)
+                finally:
+                    process.terminate()
+                    process.wait()
+                print("{:<10} {:>6} {:>10.3f} {:>10.3f} {:>10.3f} {:>10.0f}".format(
+                    label, pairs, statistics.mean(latencies) * 1e3,
+                    latencies[len(latencies) // 2] * 1e3,
+                    latencies[len(latencies) * 99 // 100] * 1e3, throughput))
+
+        asyncio.run(write_log(path, args.matches, args.history, random.Random(2)))
+        size = os.path.getsize(path)
+
+        start = time.perf_counter()
+        server.recover_matches(path)
+        recovered = time.perf_counter() - start
+        WriteAheadLog(path, server.matches.values)
+        checkpointed = time.perf_counter() - start
+
+        print()
+        print("{} open matches, {:.1f} MB log".format(len(server.matches), size / 1e6))
+        print("recovered in {:.2f} s, {:.2f} s with the startup checkpoint".format(
+            recovered, checkpointed))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+File: encryption_cost.py
+Programmers: Fernando Rodriguez, Charles Davis
+
+Compares the per-message cost of the old global Fernet key
+against per-connection ChaCha20-Poly1305 sessions.
+
+Usage: python -m benchmarks.encryption_cost [--messages 50000]
+
+"""
+import argparse
+import time
+
+from cryptography.fernet import Fernet
+
+from src.encryption import Session, create_keypair, create_session, key
+
+MESSAGES = {
+    "get": b"get",
+    "ok": b"ok",
+    "gamestate": bytes(28),
+    "2 KB": bytes(2048)
+}
+
+def measure(encrypt, decrypt, message, count):
+    start = time.perf_counter()
+    ciphers = [encrypt(message) for _ in range(count)]
+    encrypt_time = (time.perf_counter() - start) / count
+
+    start = time.perf_counter()
+    for cipher in ciphers:
+        decrypt(cipher)
+    decrypt_time = (time.perf_counter() - start) / count
+
+    return len(ciphers[0]), encrypt_time * 1e6, decrypt_time * 1e6
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=50000)
+    args = parser.parse_args()
+
+    fernet = Fernet(key)
+
+    for name, message in MESSAGES.items():
+        client_private, client_public = create_keypair()
+        server_private, server_public = create_keypair()
+        client = create_session(client_private, server_public, is_server=False)
+        server = create_session(server_private, client_public, is_server=True)
+
+        results = [
+            ("Fernet", measure(fernet.encrypt, fernet.decrypt, message, args.messages)),
+            ("session", measure(client.encrypt, server.decrypt, message, args.messages))
+        ]
+        for label, (size, encrypt_us, decrypt_us) in results:
+            print("{:<10} {:<8} {:>5} bytes  encrypt {:>6.2f} us  decrypt {:>6.2f} us".format(
+                name, label, size, encrypt_us, decrypt_us))
+
+    start = time.perf_counter()
+    for _ in range(1000):
+        client_private, client_public = create_keypair()
+        server_private, server_public = create_keypair()
+        create_session(client_private, server_public, is_server=False)
+        create_session(server_private, client_public, is_server=True)
+    print("handshake (both sides): {:.1f} us".format((time.perf_counter() - start) * 1000))
+
+if __name__ == "__main__":
+    main()
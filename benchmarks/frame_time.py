@@ -0,0 +1,74 @@
+"""
+File: frame_time.py
+Programmers: Fernando Rodriguez, Charles Davis
+
+Measures how long Game.draw takes per frame on a headless
+display, without a server:
+
+    idle   -- nothing changes between frames
+    hover  -- the hovered tile moves every frame
+    full   -- the whole window is drawn every frame, statistics
+              and help included, as after a turn or a popup
+
+Usage: python -m benchmarks.frame_time [--frames 2000] [--player 1]
+
+"""
+import argparse
+import os
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+
+from src.constants import *
+from src.game import Game
+from src.gamestate import GameState
+from src.map import Map
+
+def make_game(player_num):
+    """
+    Returns:
+        {Game} -- A game drawn like a real one, with no network
+    """
+    pygame.init()
+    game = Game.__new__(Game)
+    game.player_num = player_num
+    game.screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
+    game.map = Map(game.screen, player_num, None)
+    game.gamestate = GameState()
+    game.turn = {"move": None, "attack": None, "phase": SELECT_UNIT_TO_MOVE, "result": None}
+    game.drawn_hud = None
+    return game
+
+def time_frames(game, frames, kind):
+    """
+    Returns:
+        {float} -- Seconds per frame
+    """
+    tiles = [(col, row) for row in range(game.map.grid.rows) for col in range(game.map.grid.cols)]
+    # Draw once so both kinds of frame start from a drawn window
+    game.draw()
+    start = time.perf_counter()
+    for frame in range(frames):
+        if kind == "hover":
+            game.map.hover_location = tiles[frame % len(tiles)]
+        elif kind == "full":
+            game.map.invalidate()
+        game.draw()
+    return (time.perf_counter() - start) / frames
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, default=2000)
+    parser.add_argument("--player", type=int, default=1)
+    args = parser.parse_args()
+
+    game = make_game(args.player)
+    for kind in ("idle", "hover", "full"):
+        seconds = time_frames(game, args.frames, kind)
+        print("{:<6} {:>8.1f} us per frame".format(kind, seconds * 1e6))
+    pygame.quit()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+File: framing_throughput.py
+Programmers: Fernando Rodriguez, Charles Davis
+
+Measures throughput of many small commands sent back-to-back.
+
+Compares one command per round trip against batches of commands
+packed into one sendall, and times FrameBuffer on its own with
+the stream cut into small pieces.
+
+Usage: python -m benchmarks.framing_throughput [--commands 20000] [--batch 100]
+
+"""
+import argparse
+import subprocess
+import sys
+import time
+
+from benchmarks.server_scaling import free_port
+from src.encryption import Session
+from src.network import Network
+from src.protocol import FrameBuffer, pack_frames
+
+def sequential(network, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        network.send_command("request_turn")
+        network.receive()
+    return count / (time.perf_counter() - start)
+
+def send_commands(network, commands):
+    """
+    Sends several commands with a single sendall.
+    Replies arrive in the same order as the commands.
+    """
+    payloads = [network.session.encrypt(command.encode()) for command in commands]
+    network.CLIENT.sendall(pack_frames(payloads))
+
+def batched(network, count, batch):
+    start = time.perf_counter()
+    for _ in range(count // batch):
+        send_commands(network, ["request_turn"] * batch)
+        for _ in range(batch):
+            network.receive()
+    return count / (time.perf_counter() - start)
+
+def frame_buffer(count, chunk_size):
+    session = Session(bytes(32), bytes(32))
+    stream = pack_frames([session.encrypt(b"request_turn") for _ in range(count)])
+    buffer = FrameBuffer()
+    received = 0
+    start = time.perf_counter()
+    for offset in range(0, len(stream), chunk_size):
+        buffer.feed(stream[offset:offset + chunk_size])
+        for _ in buffer.frames():
+            received += 1
+    assert received == count
+    return count / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--commands", type=int, default=20000)
+    parser.add_argument("--batch", type=int, default=100)
+    args = parser.parse_args()
+
+    port = free_port()
+    server = subprocess.Popen([sys.executable, "server.py", "127.0.0.1", str(port)],
+                              stdout=subprocess.DEVNULL)
+    time.sleep(1)
+    try:
+        network = Network("127.0.0.1", port)
+        network.connect()
+        print("sequential:      {:>9.0f} commands/s".format(sequential(network, args.commands)))
+        print("batched ({:>4}):  {:>9.0f} commands/s".format(
+            args.batch, batched(network, args.commands, args.batch)))
+        network.close()
+    finally:
+        server.terminate()
+        server.wait()
+
+    for chunk_size in (7, 1460, 65536):
+        print("FrameBuffer, {:>5} byte reads: {:>9.0f} frames/s".format(
+            chunk_size, frame_buffer(args.commands, chunk_size)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+File: gamestate_codec.py
+Programmers: Fernando Rodriguez, Charles Davis
+
+Compares the size and cost of sending a GameState snapshot
+as a pickle against the binary codec, both with and without
+encryption.
+
+Usage: python -m benchmarks.gamestate_codec [--snapshots 20000]
+
+"""
+import argparse
+import pickle
+import time
+
+from cryptography.fernet import Fernet
+
+from src.codec import encode_gamestate, decode_gamestate
+from src.encryption import Session, key
+from src.gamestate import GameState
+
+def sample_gamestate():
+    gamestate = GameState()
+    gamestate.set_ready(1)
+    gamestate.set_ready(2)
+    for unit_type in range(1, 7):
+        gamestate.move_unit([unit_type, unit_type, unit_type + 2])
+    gamestate.attack_unit([5, 2])
+    return gamestate
+
+def measure(name, encode, decode, gamestate, count):
+    data = encode(gamestate)
+
+    start = time.perf_counter()
+    for _ in range(count):
+        encode(gamestate)
+    encode_time = (time.perf_counter() - start) / count
+
+    start = time.perf_counter()
+    for _ in range(count):
+        decode(data)
+    decode_time = (time.perf_counter() - start) / count
+
+    print("{:<16} {:>5} bytes  encode {:>6.2f} us  decode {:>6.2f} us".format(
+        name, len(data), encode_time * 1e6, decode_time * 1e6))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--snapshots", type=int, default=20000)
+    args = parser.parse_args()
+
+    gamestate = sample_gamestate()
+    fernet = Fernet(key)
+    # Same key both ways so every message decrypts with a fresh counter
+    session = Session(bytes(32), bytes(32))
+
+    def session_decode(data):
+        session.receive_count = 0
+        return decode_gamestate(session.decrypt(data))
+
+    measure("pickle", pickle.dumps, pickle.loads, gamestate, args.snapshots)
+    measure("codec", encode_gamestate, decode_gamestate, gamestate, args.snapshots)
+    measure("pickle + Fernet",
+            lambda state: fernet.encrypt(pickle.dumps(state)),
+            lambda data: pickle.loads(fernet.decrypt(data)),
+            gamestate, args.snapshots)
+    measure("codec + session",
+            lambda state: session.encrypt(encode_gamestate(state)),
+            session_decode,
+            gamestate, args.snapshots)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+File: grid_backends.py
+Programmers: Fernando Rodriguez, Charles Davis
+
+Compares Grid against BitboardGrid on the board operations the
+map does on every click: highlight a range, check it against
+enemy occupancy, and clear the highlight layer, on the game
+board and on larger test boards. Also shows the memory taken
+by one board and the cost of copying it.
+
+Usage: python -m benchmarks.grid_backends [--sizes 12x11 64x64 256x256] [--repeat 2000]
+
+"""
+import argparse
+import random
+import time
+import timeit
+import tracemalloc
+
+from src.bitboard import BitboardGrid
+from src.constants import *
+from src.grid import Grid
+from src.unit import get_tiles_in_range
+
+def place_units(grid, rng):
+    for unit_type in range(1, 2 * MAX_UNITS + 1):
+        grid.set_unit_type(rng.randrange(grid.cols), rng.randrange(grid.rows), unit_type)
+
+def grid_click(grid, col, row, distance):
+    tiles = get_tiles_in_range(distance, col, row, grid.cols, grid.rows)
+    for tile_col, tile_row in tiles:
+        grid.set_tile_type(tile_col, tile_row, ATTACKABLE)
+    enemy_in_range = any(grid.get_unit_type(tile_col, tile_row) > MAX_UNITS
+                         for tile_col, tile_row in tiles)
+    # Clear the layer tile by tile, as Map.remove_highlight used to
+    for tile_row in range(grid.rows):
+        for tile_col in range(grid.cols):
+            if grid.get_tile_type(tile_col, tile_row) == ATTACKABLE:
+                grid.set_tile_type(tile_col, tile_row, 0)
+    return enemy_in_range
+
+def bitboard_click(grid, col, row, distance):
+    mask = grid.get_range_mask(col, row, distance)
+    grid.set_tile_mask(mask, ATTACKABLE)
+    enemy_in_range = bool(mask & grid.get_occupied_mask(2))
+    grid.clear_tile_type(ATTACKABLE)
+    return enemy_in_range
+
+def time_clicks(click, grid, clicks):
+    start = time.perf_counter()
+    results = [click(grid, col, row, distance) for col, row, distance in clicks]
+    return (time.perf_counter() - start) / len(clicks), results
+
+def board_memory(make_board, count=1000):
+    """
+    Returns:
+        {float} -- Bytes allocated per board
+    """
+    tracemalloc.start()
+    boards = [make_board() for _ in range(count)]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size / len(boards)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", nargs="+", default=["12x11", "64x64", "256x256"])
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    print("{:>9} {:>14} {:>18} {:>9}".format("board", "Grid us/click", "Bitboard us/click",
+                                               "speedup"))
+    for size in args.sizes:
+        cols, rows = map(int, size.split("x"))
+        rng = random.Random(1)
+        clicks = [(rng.randrange(cols), rng.randrange(rows), rng.randint(1, 3))
+                  for _ in range(args.repeat)]
+
+        grid, bitboard = Grid(cols, rows), BitboardGrid(cols, rows)
+        place_units(grid, random.Random(2))
+        place_units(bitboard, random.Random(2))
+
+        grid_time, grid_results = time_clicks(grid_click, grid, clicks)
+        bitboard_time, bitboard_results = time_clicks(bitboard_click, bitboard, clicks)
+        assert grid_results == bitboard_results
+        print("{:>9} {:>14.1f} {:>18.1f} {:>8.1f}x".format(
+            size, grid_time * 1e6, bitboard_time * 1e6, grid_time / bitboard_time))
+
+    print()
+    for name, make_board in (("Grid", Grid), ("BitboardGrid", BitboardGrid)):
+        board = make_board()
+        place_units(board, random.Random(2))
+        copy_time = timeit.timeit(board.copy, number=100000) / 100000
+        print("{:<13} {:>7.0f} bytes per 12x11 board  {:>5.2f} us per copy()".format(
+            name, board_memory(make_board), copy_time * 1e6))
+
+if __name__ == "__main__":
+    main()
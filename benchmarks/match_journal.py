@@ -0,0 +1,108 @@
+"""
+File: match_journal.py
+Programmers: Fernando Rodriguez, Charles Davis
+
+Measures match journals: the cost of recording a turn, bytes
+per turn, and how long it takes to open a journal and rebuild
+the gamestate at a random turn, with snapshots and by replaying
+from the first turn. Every rebuilt gamestate is checked against
+the hash the live gamestate had at that turn.
+
+Usage: python -m benchmarks.match_journal [--games 2000] [--turns 200] [--interval 32]
+
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.rules_engine import random_turn
+from src.gamestate import GameState
+from src.journal import Journal, JournalReader
+from src.rules import Rules
+
+def write_game(path, turns, interval, rng):
+    """
+    Plays random turns, starting a new game whenever one ends.
+
+    Returns:
+        {(list, float)} -- Hash after each turn, seconds spent journaling
+    """
+    gamestate = GameState()
+    rules = Rules(gamestate)
+    journal = Journal(path, gamestate, snapshot_interval=interval)
+    hashes = [gamestate.hash]
+    seconds = 0.0
+    for _ in range(turns):
+        if rules.winner:
+            gamestate.reset()
+            rules.sync()
+            start = time.perf_counter()
+            journal.record_snapshot()
+            seconds += time.perf_counter() - start
+            hashes[-1] = gamestate.hash
+        player_num = rules.turn
+        turn = random_turn(rules, rng)
+        rules.play_turn(player_num, turn)
+        start = time.perf_counter()
+        journal.record_turn(player_num, turn)
+        seconds += time.perf_counter() - start
+        hashes.append(gamestate.hash)
+    start = time.perf_counter()
+    journal.close()
+    return hashes, seconds + time.perf_counter() - start
+
+def time_reads(paths, hashes, rng):
+    """
+    Returns:
+        {(float, float)} -- Seconds per open and per state_at()
+    """
+    open_seconds = seek_seconds = 0.0
+    for path, game_hashes in zip(paths, hashes):
+        start = time.perf_counter()
+        reader = JournalReader(path)
+        open_seconds += time.perf_counter() - start
+
+        turn_index = rng.randrange(reader.turn_count + 1)
+        start = time.perf_counter()
+        gamestate = reader.state_at(turn_index)
+        seek_seconds += time.perf_counter() - start
+        reader.close()
+        assert gamestate.hash == game_hashes[turn_index], path
+    return open_seconds / len(paths), seek_seconds / len(paths)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--games", type=int, default=2000)
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--interval", type=int, default=32)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    with tempfile.TemporaryDirectory() as directory:
+        results = {}
+        for interval in (args.interval, args.turns + 1):
+            paths, hashes = [], []
+            write_seconds = 0.0
+            for game in range(args.games):
+                path = os.path.join(directory, "{}-{}.journal".format(interval, game))
+                game_hashes, seconds = write_game(path, args.turns, interval, random.Random(game))
+                paths.append(path)
+                hashes.append(game_hashes)
+                write_seconds += seconds
+            size = sum(os.path.getsize(path) for path in paths)
+            results[interval] = time_reads(paths, hashes, random.Random(2))
+
+        turns = args.games * args.turns
+        print("{} journals of {} turns, {:.1f} bytes per turn".format(
+            args.games, args.turns, size / turns))
+        print("journaling:             {:>7.2f} us per turn".format(write_seconds / turns * 1e6))
+        for interval, label in ((args.interval, "snapshot every {} turns".format(args.interval)),
+                                (args.turns + 1, "replay from turn 0")):
+            open_time, seek_time = results[interval]
+            print("{:<23} {:>7.1f} us to open, {:>7.1f} us to rebuild a random turn".format(
+                label + ":", open_time * 1e6, seek_time * 1e6))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+File: rules_check.py
+Programmers: Fernando Rodriguez, Charles Davis
+
+Checks that the server's Rules allow what the client lets a
+player do. The client finds moves and targets with
+Unit.get_range, the server with the range tables in rules.py.
+
+1. The range tables hold the same tiles as Unit.get_range, for
+   every unit on every tile.
+2. In --games random games, the free tiles and enemies in range
+   found with Unit.get_range are the ones Rules.get_moves and
+   Rules.get_targets return, and every turn picked from them
+   passes Rules.check_turn.
+
+Prints each disagreement and exits with status 1 if there is one.
+
+Usage: python -m benchmarks.rules_check [--games 500] [--seed 1]
+
+"""
+import argparse
+import random
+import sys
+
+from src.constants import *
+from src.rules import (ATTACK_RANGE, OWNER, RANGE_SETS, SPEED, TILE_COUNT, UNIT_TYPES,
+                       IllegalTurn, Rules, position_of, tile_of)
+from src.unit import Unit
+
+def range_tiles(unit, range_type):
+    return {tile_of(col, row) for col, row in unit.get_range(range_type, GRID_COLUMNS, GRID_ROWS)}
+
+def check_range_tables():
+    """
+    Returns:
+        {int} -- Number of (unit, tile, range type) that disagree
+    """
+    mismatches = 0
+    for unit_type in UNIT_TYPES:
+        unit = Unit(unit_type)
+        for tile in range(TILE_COUNT):
+            unit.pos = position_of(tile)
+            for range_type, distance in (("move", SPEED[unit_type]),
+                                         ("attack", ATTACK_RANGE[unit_type])):
+                if range_tiles(unit, range_type) != RANGE_SETS[distance][tile]:
+                    print("unit {} on {}: {} range differs".format(unit_type, unit.pos, range_type))
+                    mismatches += 1
+    return mismatches
+
+def client_unit(rules, unit_type):
+    unit = Unit(unit_type)
+    unit.pos = rules.get_position(unit_type)
+    return unit
+
+def client_moves(rules, unit_type):
+    """
+    Returns:
+        {set} -- Free tiles in the unit's move range, as the map finds them
+    """
+    return {tile for tile in range_tiles(client_unit(rules, unit_type), "move")
+            if not rules.occupancy[tile]}
+
+def client_targets(rules, unit_type):
+    """
+    Returns:
+        {set} -- Enemy units in the unit's attack range, as the map finds them
+    """
+    tiles = range_tiles(client_unit(rules, unit_type), "attack")
+    return {target for target in UNIT_TYPES
+            if OWNER[target] != OWNER[unit_type] and rules.tiles[target] in tiles}
+
+def check_games(games, rng):
+    """
+    Returns:
+        {(int, int)} -- Turns checked and how many disagreed
+    """
+    turns = 0
+    mismatches = 0
+    for _ in range(games):
+        rules = Rules()
+        while not rules.winner:
+            player_num = rules.turn
+            unit_type = rng.choice(rules.get_units(player_num))
+
+            moves = client_moves(rules, unit_type)
+            if moves != set(rules.get_moves(unit_type)):
+                print("unit {} on {}: moves differ".format(unit_type, rules.get_position(unit_type)))
+                mismatches += 1
+            move = None
+            if moves:
+                move = [unit_type] + position_of(rng.choice(sorted(moves)))
+
+            # Targets as seen from the tile moved to
+            position = rules.copy()
+            if move:
+                position.move(unit_type, tile_of(move[1], move[2]))
+            targets = client_targets(position, unit_type)
+            if targets != set(position.get_targets(unit_type)):
+                print("unit {} on {}: targets differ".format(unit_type,
+                                                            position.get_position(unit_type)))
+                mismatches += 1
+            attack = None
+            if targets:
+                attack = [rng.choice(sorted(targets)), Unit(unit_type).attack_power]
+
+            turn = {"move": move, "attack": attack}
+            try:
+                rules.play_turn(player_num, turn)
+            except IllegalTurn as e:
+                print("turn {} rejected: {}".format(turn, e))
+                mismatches += 1
+                # Skip the turn to carry on with the game
+                rules.end_turn()
+            turns += 1
+    return turns, mismatches
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--games", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    table_mismatches = check_range_tables()
+    print("range tables: {} units x {} tiles, {} mismatches".format(
+        len(UNIT_TYPES), TILE_COUNT, table_mismatches))
+    turns, game_mismatches = check_games(args.games, random.Random(args.seed))
+    print("random games: {} turns, {} mismatches".format(turns, game_mismatches))
+    if table_mismatches or game_mismatches:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+File: rules_engine.py
+Programmers: Fernando Rodriguez, Charles Davis
+
+Measures how many turns per second the Rules class checks and
+applies by playing random games, with and without a GameState
+attached, and how fast illegal turns are rejected. Games turns/s
+includes picking the random turns, play_turn turns/s doesn't.
+
+Usage: python -m benchmarks.rules_engine [--games 2000] [--seed 1]
+
+"""
+import argparse
+import random
+import time
+
+from src.gamestate import GameState
+from src.rules import ATTACK_POWER, IllegalTurn, Rules, position_of
+
+def random_turn(rules, rng):
+    """
+    Picks a random legal move and, if an enemy is in range, attack.
+    """
+    unit_type = rng.choice(rules.get_units(rules.turn))
+    move = None
+    tiles = rules.get_moves(unit_type)
+    if tiles:
+        tile = rng.choice(tiles)
+        move = [unit_type] + position_of(tile)
+
+    attack = None
+    if move:
+        # Targets as seen from the tile moved to
+        start_tile = rules.tiles[unit_type]
+        rules.move(unit_type, tile)
+        targets = rules.get_targets(unit_type)
+        rules.move(unit_type, start_tile)
+    else:
+        targets = rules.get_targets(unit_type)
+    if targets:
+        attack = [rng.choice(targets), ATTACK_POWER[unit_type]]
+    return {"move": move, "attack": attack}
+
+def play_games(games, rng, with_gamestate):
+    """
+    Returns:
+        {(int, float, float)} -- Turns played, total seconds and
+                                 seconds spent in play_turn
+    """
+    turns = 0
+    engine_seconds = 0.0
+    start = time.perf_counter()
+    for _ in range(games):
+        rules = Rules(GameState() if with_gamestate else None)
+        while not rules.winner:
+            turn = random_turn(rules, rng)
+            turn_start = time.perf_counter()
+            rules.play_turn(rules.turn, turn)
+            engine_seconds += time.perf_counter() - turn_start
+            turns += 1
+    return turns, time.perf_counter() - start, engine_seconds
+
+def reject_turns(count):
+    rules = Rules()
+    # Player 2 trying to move while it's player 1's turn
+    turn = {"move": [4, 10, 0], "attack": None}
+    start = time.perf_counter()
+    for _ in range(count):
+        try:
+            rules.check_turn(2, turn)
+        except IllegalTurn:
+            pass
+    return count / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--games", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print("{:<20} {:>8} {:>18} {:>18}".format("", "turns", "games turns/s", "play_turn turns/s"))
+    for with_gamestate in (False, True):
+        turns, seconds, engine_seconds = play_games(args.games, random.Random(args.seed),
+                                                    with_gamestate)
+        print("{:<20} {:>8} {:>18.0f} {:>18.0f}".format(
+            "rules + GameState" if with_gamestate else "rules only",
+            turns, turns / seconds, turns / engine_seconds))
+    print("illegal turns rejected: {:.0f} turns/s".format(reject_turns(100000)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+File: server_scaling.py
+Programmers: Fernando Rodriguez, Charles Davis
+
+Measures how many connections and matches one server process
+can hold and how many requests per second it answers.
+
+Starts server.py in a subprocess, opens two clients per match
+and has every client poll the server for a fixed time.
+
+Usage: python -m benchmarks.server_scaling [--matches 1 10 100] [--seconds 5] [--workers 1 2 4]
+
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from src.encryption import create_keypair, create_session
+from src.protocol import pack_frame, read_frame
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def server_usage(pid):
+    """
+    Returns (cpu seconds, resident kB) of a process and
+    its children, read from /proc.
+    """
+    cpu, rss = 0.0, 0
+    try:
+        with open("/proc/{0}/task/{0}/children".format(pid)) as children:
+            for child in children.read().split():
+                child_cpu, child_rss = server_usage(int(child))
+                cpu += child_cpu
+                rss += child_rss
+    except OSError:
+        pass
+
+    try:
+        with open("/proc/{}/stat".format(pid)) as stat:
+            fields = stat.read().rsplit(")", 1)[1].split()
+        cpu += (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+        with open("/proc/{}/status".format(pid)) as status:
+            rss += int([line for line in status if line.startswith("VmRSS")][0].split()[1])
+    except (OSError, IndexError):
+        pass
+    return cpu, rss
+
+async def client(host, port, stop_time, counts):
+    reader, writer = await asyncio.open_connection(host, port)
+    private_key, public_key = create_keypair()
+    writer.write(pack_frame(public_key))
+    session = create_session(private_key, await read_frame(reader), is_server=False)
+    session.decrypt(await read_frame(reader))  # player number
+
+    writer.write(pack_frame(session.encrypt(b"start")))
+    session.decrypt(await read_frame(reader))
+    while time.perf_counter() < stop_time:
+        writer.write(pack_frame(session.encrypt(b"request_turn")))
+        reply = await read_frame(reader)
+        if not reply:
+            break
+        session.decrypt(reply)
+        counts[0] += 1
+
+    writer.write(pack_frame(session.encrypt(b"quit")))
+    writer.close()
+
+async def run(host, port, matches, seconds):
+    counts = [0]
+    start = time.perf_counter()
+    stop_time = start + seconds
+    tasks = [client(host, port, stop_time, counts) for _ in range(2 * matches)]
+    await asyncio.gather(*tasks)
+    return counts[0] / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--matches", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--server", default="server.py",
+                        help="server script to benchmark")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1],
+                        help="worker process counts to try")
+    args = parser.parse_args()
+
+    for workers, matches in itertools.product(args.workers, args.matches):
+        port = free_port()
+        command = [sys.executable, args.server, "127.0.0.1", str(port)]
+        if workers > 1:
+            command += ["--workers", str(workers)]
+        server = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+        time.sleep(1)
+        cpu_before, _ = server_usage(server.pid)
+        requests_per_sec = asyncio.run(run("127.0.0.1", port, matches, args.seconds))
+        cpu_after, rss = server_usage(server.pid)
+        server.terminate()
+        server.wait()
+
+        print("workers={:<3} matches={:<6} connections={:<6} requests/s={:<9.0f} "
+              "server_cpu={:.2f}s rss={}kB".format(
+                  workers, matches, 2 * matches, requests_per_sec, cpu_after - cpu_before, rss))
+
+if __name__ == "__main__":
+    main()
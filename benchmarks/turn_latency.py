@@ -0,0 +1,119 @@
+"""
+File: turn_latency.py
+Programmers: Fernando Rodriguez, Charles Davis
+
+Measures how long a client waits to submit a turn on a slow link.
+
+Puts a proxy that delays every packet by a fixed time between the
+client and server.py, then times the single-message "turn" command
+and shows several tagged commands sharing one round trip.
+
+Usage: python -m benchmarks.turn_latency [--delay 0.025] [--turns 20]
+
+"""
+import argparse
+import asyncio
+import subprocess
+import sys
+import threading
+import time
+
+from benchmarks.server_scaling import free_port
+from src.codec import encode_turn
+from src.constants import END_TURN
+from src.network import Network
+
+async def delayed_pipe(reader, writer, delay):
+    """
+    Forwards data from reader to writer, holding each chunk
+    back for delay seconds but keeping the stream in order.
+    """
+    queue = asyncio.Queue()
+
+    async def forward():
+        while True:
+            due, data = await queue.get()
+            await asyncio.sleep(due - time.monotonic())
+            if not data:
+                writer.close()
+                return
+            writer.write(data)
+            await writer.drain()
+
+    forwarder = asyncio.ensure_future(forward())
+    while True:
+        data = await reader.read(65536)
+        queue.put_nowait((time.monotonic() + delay, data))
+        if not data:
+            break
+    await forwarder
+
+def start_proxy(port, server_port, delay):
+    """
+    Runs a proxy on port in a background thread.
+    """
+    async def handle(client_reader, client_writer):
+        server_reader, server_writer = await asyncio.open_connection("127.0.0.1", server_port)
+        await asyncio.gather(delayed_pipe(client_reader, server_writer, delay),
+                             delayed_pipe(server_reader, client_writer, delay),
+                             return_exceptions=True)
+
+    async def serve(started):
+        await asyncio.start_server(handle, "127.0.0.1", port)
+        started.set()
+        await asyncio.Event().wait()
+
+    started = threading.Event()
+    threading.Thread(target=lambda: asyncio.run(serve(started)), daemon=True).start()
+    started.wait()
+
+def time_turns(send, network, count):
+    turn = {"move": None, "attack": None, "phase": END_TURN, "result": None}
+    start = time.perf_counter()
+    for _ in range(count):
+        send(network, turn)
+    return (time.perf_counter() - start) / count
+
+def pipelined(network, count):
+    """
+    Sends a turn, asks for the turn and the gamestate,
+    then collects all three replies.
+    """
+    turn = {"move": None, "attack": None, "phase": END_TURN, "result": None}
+    start = time.perf_counter()
+    for _ in range(count):
+        request_ids = [network.submit("turn", encode_turn(turn)),
+                       network.submit("request_turn"),
+                       network.submit("get")]
+        for request_id in request_ids:
+            network.get_reply(request_id)
+    return (time.perf_counter() - start) / count
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--delay", type=float, default=0.025,
+                        help="one way delay in seconds")
+    parser.add_argument("--turns", type=int, default=20)
+    args = parser.parse_args()
+
+    server_port, proxy_port = free_port(), free_port()
+    server = subprocess.Popen([sys.executable, "server.py", "127.0.0.1", str(server_port)],
+                              stdout=subprocess.DEVNULL)
+    time.sleep(1)
+    try:
+        start_proxy(proxy_port, server_port, args.delay)
+        network = Network("127.0.0.1", proxy_port)
+        network.connect()
+
+        print("one way delay {:.0f} ms".format(args.delay * 1000))
+        print("single message turn:        {:>7.1f} ms per turn".format(
+            time_turns(Network.send_turn, network, args.turns) * 1000))
+        print("turn + request_turn + get:  {:>7.1f} ms pipelined".format(
+            pipelined(network, args.turns) * 1000))
+        network.close()
+    finally:
+        server.terminate()
+        server.wait()
+
+if __name__ == "__main__":
+    main()
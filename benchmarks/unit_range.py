@@ -0,0 +1,101 @@
+"""
+File: unit_range.py
+Programmers: Fernando Rodriguez, Charles Davis
+
+Measures the range work done on each click while moving and
+attacking: highlight the move range, check for enemies in
+attack range, highlight the attack range and clear both.
+
+Compares Map's methods, which use the cached range sets,
+against the previous versions that built a list of [col, row]
+lists per call and scanned the whole grid to clear highlights.
+
+Usage: python -m benchmarks.unit_range [--clicks 20000]
+
+"""
+import argparse
+import os
+import random
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+import pygame
+
+from src.constants import *
+from src.map import Map
+
+def list_range(unit, range_type, max_col, max_row):
+    """
+    Unit.get_range as it was before range sets.
+    """
+    unit_range = unit.attack_range if range_type == "attack" else unit.speed
+    range_list = [unit.pos]
+    for s in range(1, unit_range + 1):
+        for possible_pos in ([unit.pos[0] + s, unit.pos[1]], [unit.pos[0] - s, unit.pos[1]],
+                             [unit.pos[0], unit.pos[1] + s], [unit.pos[0], unit.pos[1] - s]):
+            if 0 <= possible_pos[0] < max_col and 0 <= possible_pos[1] < max_row:
+                range_list.append(possible_pos)
+        for i in range(1, unit_range + 1):
+            for possible_pos in ([unit.pos[0] + s, unit.pos[1] + i],
+                                 [unit.pos[0] - s, unit.pos[1] - i],
+                                 [unit.pos[0] + s, unit.pos[1] - i],
+                                 [unit.pos[0] - s, unit.pos[1] + i]):
+                if 0 <= possible_pos[0] < max_col and 0 <= possible_pos[1] < max_row:
+                    range_list.append(possible_pos)
+    return range_list
+
+def list_click(game_map, unit):
+    grid = game_map.grid
+    for range_type, tile_type in (("move", MOVABLE), ("attack", ATTACKABLE)):
+        for col, row in list_range(unit, range_type, grid.cols, grid.rows):
+            grid.set_tile_type(col, row, tile_type)
+    attack_range = list_range(unit, "attack", grid.cols, grid.rows)
+    in_range = False
+    for enemy_unit in game_map.enemy_units:
+        if enemy_unit.pos in attack_range:
+            in_range = True
+    for tile_type in (MOVABLE, ATTACKABLE):
+        for row in range(grid.rows):
+            for col in range(grid.cols):
+                if grid.get_tile_type(col, row) == tile_type:
+                    grid.set_tile_type(col, row, 0)
+    return in_range
+
+def set_click(game_map, unit):
+    game_map.highlight_tiles(unit, "move")
+    game_map.highlight_tiles(unit, "attack")
+    game_map.selected_unit = unit
+    in_range = game_map.enemy_in_attack_range()
+    game_map.remove_highlight("move")
+    game_map.remove_highlight("attack")
+    return in_range
+
+def time_clicks(click, game_map, positions):
+    unit = game_map.players_units[0]
+    start = time.perf_counter()
+    for position in positions:
+        unit.pos = position
+        click(game_map, unit)
+    return (time.perf_counter() - start) / len(positions)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clicks", type=int, default=20000)
+    args = parser.parse_args()
+
+    pygame.init()
+    screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
+    game_map = Map(screen, 1, None)
+
+    rng = random.Random(1)
+    positions = [[rng.randrange(GRID_COLUMNS), rng.randrange(GRID_ROWS)]
+                 for _ in range(args.clicks)]
+
+    before = time_clicks(list_click, game_map, positions)
+    after = time_clicks(set_click, game_map, positions)
+    print("list ranges, full grid clear: {:>7.1f} us per click".format(before * 1e6))
+    print("cached range sets:            {:>7.1f} us per click".format(after * 1e6))
+    print("speedup:                      {:>7.1f}x".format(before / after))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+File: loadtest.py
+Programmers: Fernando Rodriguez, Charles Davis
+
+Runs many headless bots against a server and reports command
+latencies, matches per second and errors.
+
+"""
+import argparse
+import collections
+import contextlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+from src.bot import Bot
+from src.network import Network
+
+# Bots block on sockets, so they need little stack
+THREAD_STACK_SIZE = 256 * 1024
+
+def run_player(args, seed, results):
+    """
+    Plays args.games games in a row and stores each
+    bot along with whether it finished its game.
+    """
+    rng = random.Random(seed)
+    for _ in range(args.games):
+        bot = Bot(Network(args.host, args.port), rng, args.poll_interval, args.timeout)
+        finished = bot.play()
+        results.append((bot, finished))
+
+def percentile(sorted_values, fraction):
+    index = min(int(fraction * len(sorted_values)), len(sorted_values) - 1)
+    return sorted_values[index]
+
+def summarize(results, players, elapsed):
+    """
+    Merges the statistics of every bot.
+
+    Arguments:
+        results {list} -- (Bot, bool) for every game played, True if it finished
+
+    Returns:
+        {dict} -- Report that can be written as JSON
+    """
+    latencies = collections.defaultdict(list)
+    errors = collections.Counter()
+    games_finished = 0
+    matches_finished = 0
+    for bot, finished in results:
+        for command, times in bot.latencies.items():
+            latencies[command].extend(times)
+        errors.update(bot.errors)
+        if finished:
+            games_finished += 1
+            # Every match has one player 1, whether player 2
+            # is another bot or the server's computer player
+            if bot.player_num == 1:
+                matches_finished += 1
+
+    commands = {}
+    for command, times in sorted(latencies.items()):
+        times.sort()
+        commands[command] = {
+            "count": len(times),
+            "p50_ms": percentile(times, 0.50) * 1000,
+            "p90_ms": percentile(times, 0.90) * 1000,
+            "p99_ms": percentile(times, 0.99) * 1000,
+            "max_ms": times[-1] * 1000
+        }
+
+    return {
+        "players": players,
+        "elapsed_s": elapsed,
+        "games_finished": games_finished,
+        "matches_finished": matches_finished,
+        "matches_per_s": matches_finished / elapsed,
+        "errors": dict(errors),
+        "error_count": sum(errors.values()),
+        "commands": commands
+    }
+
+def print_report(report):
+    print("players: {players}  elapsed: {elapsed_s:.1f}s  matches: {matches_finished}"
+          "  matches/s: {matches_per_s:.2f}  errors: {error_count}".format(**report))
+    print("{:<14}{:>9}{:>10}{:>10}{:>10}{:>10}".format(
+        "command", "count", "p50 ms", "p90 ms", "p99 ms", "max ms"))
+    for command, stats in report["commands"].items():
+        print("{:<14}{count:>9}{p50_ms:>10.2f}{p90_ms:>10.2f}{p99_ms:>10.2f}{max_ms:>10.2f}".format(
+            command, **stats))
+    for error, count in report["errors"].items():
+        print("[Error]: {} x{}".format(error, count))
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test a Game of Shapes server with bots.")
+    parser.add_argument("host")
+    parser.add_argument("port", type=int)
+    parser.add_argument("--players", type=int, default=100, help="simultaneous bots (default: 100)")
+    parser.add_argument("--games", type=int, default=1, help="games played by each bot (default: 1)")
+    parser.add_argument("--ramp", type=float, default=1.0,
+                        help="seconds over which bots connect (default: 1)")
+    parser.add_argument("--poll-interval", type=float, default=0.05,
+                        help="seconds between polls while waiting (default: 0.05)")
+    parser.add_argument("--timeout", type=float, default=60,
+                        help="seconds to wait on the other player (default: 60)")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", metavar="PATH", help="also write the report as JSON ('-' for stdout)")
+    args = parser.parse_args()
+
+    seeds = random.Random(args.seed)
+    results = []
+    threading.stack_size(THREAD_STACK_SIZE)
+    threads = [threading.Thread(target=run_player, args=(args, seeds.random(), results))
+               for _ in range(args.players)]
+
+    start = time.perf_counter()
+    # Network prints on every connection; keep the report readable
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for thread in threads:
+            thread.start()
+            time.sleep(args.ramp / args.players)
+        for thread in threads:
+            thread.join()
+    elapsed = time.perf_counter() - start
+
+    report = summarize(results, args.players, elapsed)
+    if args.json == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        print_report(report)
+        if args.json:
+            with open(args.json, "w") as json_file:
+                json.dump(report, json_file, indent=2)
+
+    return 1 if report["error_count"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,222 +2,886 @@
 File: server.py
 Programmers: Fernando Rodriguez, Charles Davis
 
-Controls the connection between two clients.
+Hosts matches between pairs of clients.
 
-"""
-import socket
-import sys
-import threading
-import pickle
+Every connection is served by a coroutine on one asyncio event
+loop. Clients are paired in the order they connect, and each pair
+shares a Match holding its own gamestate. The server keeps running
+after a match ends.
+
+With --workers N the server forks N worker processes, each running
+its own event loop. The parent accepts connections and hands each
+socket to a worker, sending the second player of a match to the
+worker holding the first.
 
-from src.encryption import encrypt, decrypt
-from src.gamestate import GameState
+With --ai every client plays against the computer, which
+searches for --ai-time seconds per turn.
 
-# Number of clients connected
-client_count = 0
+With --journal DIR every match's accepted turns and rock paper
+scissors results are logged to a file in DIR (see journal.py).
 
-# Global gamestate object holding
-# positions of player units and
-# other game information.
-gamestate = None
+With --wal FILE matches are logged to FILE before turns are
+acknowledged, and matches still open in it are picked up again
+when the server restarts. Clients take their seat back with the
+token they got from "seat" (see wal.py).
 
-def start_server():
+With --metrics-port P the server answers on 127.0.0.1:P with its
+metrics in Prometheus text format (worker i uses port P + i).
+
+"""
+import argparse
+import asyncio
+import collections
+import itertools
+import os
+import random
+import secrets
+import selectors
+import socket
+import sys
+import time
+
+from cryptography.exceptions import InvalidTag
+
+from src.ai import Searcher
+from src.codec import encode_gamestate, encode_changes, decode_turn
+from src.constants import ROCK, PAPER, SCISSORS
+from src.connection import Connection, VirtualConnection
+from src.journal import Journal
+from src.match import Match
+from src.metrics import registry
+from src.rules import IllegalTurn
+from src.wal import COMPUTER_OPPONENT, WriteAheadLog, recover
+from src.protocol import (pack_event, pack_request, unpack_request, RPS_ABANDONED,
+                          TURN_EVENT, RPS_START_EVENT, RPS_WINNER_EVENT, GAME_OVER_EVENT)
+
+# Max. number of pending connections
+BACKLOG = 1024
+
+# Active matches keyed by match id
+matches = {}
+
+# Matches with one player waiting for an opponent, longest waiting first
+waiting_matches = collections.deque()
+
+# Matches recovered from the WAL that none of their players resumed yet
+unresumed_matches = set()
+
+# Source of unique match ids
+match_ids = itertools.count(1)
+
+# Seconds the computer searches per turn; None unless --ai is given
+ai_time_budget = None
+
+# Used for computer players of recovered matches when --ai isn't given
+DEFAULT_AI_TIME = 0.5
+
+# Directory match journals are written to; None unless --journal is given
+journal_dir = None
+
+# Write-ahead log of every match; None unless --wal is given
+wal = None
+
+# Tasks of virtual players; the loop only keeps weak references
+virtual_player_tasks = set()
+
+# Commands the client loop understands
+COMMANDS = ("get", "since", "turn", "request_turn", "hand", "rps_winner",
+            "check_rps", "subscribe", "start", "reset", "seat", "resume", "quit")
+
+COMMAND_SECONDS = {
+    command: registry.histogram("gameofshapes_command_seconds",
+                                "Time taken to handle a command", command=command)
+    for command in COMMANDS
+}
+ILLEGAL_TURNS = registry.counter("gameofshapes_illegal_turns_total",
+                                 "Turns rejected for breaking the rules")
+INVALID_COMMANDS = registry.counter("gameofshapes_invalid_commands_total",
+                                    "Commands the server didn't understand")
+ACTIVE_CONNECTIONS = registry.gauge("gameofshapes_active_connections",
+                                    "Clients currently connected")
+registry.gauge("gameofshapes_active_matches", "Matches currently in the match table",
+               function=lambda: len(matches))
+SERIALIZE_SECONDS = {
+    kind: registry.histogram("gameofshapes_serialize_seconds",
+                             "Time taken to encode or decode a payload", kind=kind)
+    for kind in ("gamestate", "changes")
+}
+
+# Worker mode only: socket to the parent process
+dispatcher = None
+
+# Worker -> parent messages, one byte each. After seating a handed
+# off client the worker replies with its waiting state, or with
+# HANDOFF_FAILED if the client never got through the handshake; it
+# also reports when its waiting state changes otherwise, such as
+# when a lone waiting player leaves.
+NO_PLAYER_WAITING = b"0"
+PLAYER_WAITING = b"1"
+HANDOFF_FAILED = b"f"
+WAITING_PLAYER_LEFT = b"a"
+PLAYER_LEFT_WAITING = b"b"
+
+# Seconds a client has to get through the handshake
+HANDSHAKE_TIMEOUT = 10
+
+# Seconds a recovered match waits for one of its players to resume
+RECOVERED_MATCH_TIMEOUT = 300
+
+def start_server(host, port, workers=1, metrics_port=None, ai_time=None, journal=None,
+                 wal_path=None):
     """
     Sets up server and begins listening for
     client connections.
+
+    Keyword Arguments:
+        ai_time {float} -- If given, clients play the computer, which
+                           searches this many seconds per turn (default: {None})
+        journal {str} -- If given, matches are journaled to this directory (default: {None})
+        wal_path {str} -- If given, matches are logged to and recovered from
+                          this file; needs a single worker (default: {None})
     """
+    global ai_time_budget
+    global journal_dir
 
-    # Use the global variables
-    global gamestate
-    global client_count
+    ai_time_budget = ai_time
+    journal_dir = journal
+    if journal_dir is not None:
+        os.makedirs(journal_dir, exist_ok=True)
+    try:
+        if workers > 1:
+            start_workers(host, port, workers, metrics_port)
+        else:
+            asyncio.run(serve(host, port, metrics_port, wal_path))
+    except KeyboardInterrupt:
+        pass
 
-    # Create a socket object
-    SERVER = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    print("\nServer closing...")
 
-    # Use localhost and grab port from commandline arg
-    HOST = sys.argv[1]
-    PORT = int(sys.argv[2])
+async def serve(host, port, metrics_port=None, wal_path=None):
+    """
+    Accepts connections until the server is stopped.
+    """
+    global wal
+
+    if wal_path is not None:
+        start = time.perf_counter()
+        recover_matches(wal_path)
+        wal = WriteAheadLog(wal_path, matches.values)
+        print("Recovered {} matches in {:.2f} s".format(len(matches), time.perf_counter() - start))
 
     # Attempt bind to (host, port) pair
     try:
-        SERVER.bind((HOST, PORT))
-    except socket.error:
-        print("Binding to " + HOST + ":" + str(PORT) + " failed.")
-        SERVER.close()
+        server = await asyncio.start_server(client_connected, host, port, backlog=BACKLOG)
+    except OSError:
+        print("Binding to " + host + ":" + str(port) + " failed.")
         sys.exit()
 
-    # Start listeing for connections, max of two
-    SERVER.listen(2)
-    print("Server listening on " + HOST + ":" + str(PORT))
+    print("Server listening on " + host + ":" + str(port))
+    if metrics_port is not None:
+        await serve_metrics(metrics_port)
 
-    # Main server loop
-    while True:
-        if client_count < 2:
-            # Accept incoming connection
-            print("Waiting for client {}...".format(client_count + 1))
-            connection, address = SERVER.accept()
-            print("Established connection with " + address[0] + ":" + str(address[1]))
-
-            # Increment global client counter
-            client_count += 1
-            # Keep track of whose turn it is
-            player_num = 1
-
-            if client_count == 1:
-                # Create new gamestate object
-                gamestate = GameState()
-            else:
-                # One client already connected so
-                # this connection will be player 2
-                player_num = 2
+    async with server:
+        await server.serve_forever()
 
-            # Create thread to handle client
-            t = threading.Thread(target=client_thread, args=(connection, player_num))
-            t.start()
+def join_match():
+    """
+    Seats a client in the waiting match, or opens
+    a new match if nobody is waiting.
 
-        if client_count < 2 and gamestate.ready():
-            # Game over, exit loop
-            break
+    Returns:
+        {(Match, int)} -- The match joined and the client's player number
+    """
+    if ai_time_budget is not None:
+        # Every client gets a match of its own against the computer
+        match = open_match(computer_opponent=True)
+        player_num = match.add_player()
+        start_virtual_player(match, 2)
+        return match, player_num
 
-    print("\nServer closing...")
-    SERVER.close()
+    if not waiting_matches:
+        waiting_matches.append(open_match())
+
+    match = waiting_matches[0]
+    player_num = match.add_player()
+
+    if match.is_full():
+        waiting_matches.popleft()
+
+    return match, player_num
+
+def open_match(computer_opponent=False):
+    """
+    Adds a new match to the match table.
+    """
+    match = Match(next(match_ids))
+    match.computer_opponent = computer_opponent
+    add_match(match)
+    if wal:
+        wal.log_opened(match)
+    return match
+
+def add_match(match):
+    matches[match.match_id] = match
+    if journal_dir is not None:
+        path = os.path.join(journal_dir, "match-{}-{}.journal".format(int(time.time()),
+                                                                      match.match_id))
+        match.journal = Journal(path, match.gamestate)
+
+def recover_matches(path):
+    """
+    Puts the matches still open in the write-ahead log back in
+    the match table, to wait for their players to resume.
+    """
+    global match_ids
+
+    loop = asyncio.get_running_loop()
+    for recovered in recover(path).values():
+        match = Match(recovered.match_id, recovered.gamestate)
+        match.tokens = recovered.tokens
+        match.computer_opponent = bool(recovered.flags & COMPUTER_OPPONENT)
+        add_match(match)
+        if match.computer_opponent:
+            start_virtual_player(match, 2)
+        # Otherwise it would be kept, and checkpointed, forever
+        unresumed_matches.add(match)
+        loop.call_later(RECOVERED_MATCH_TIMEOUT, expire_recovered_match, match)
+
+    if matches:
+        match_ids = itertools.count(max(matches) + 1)
+
+def expire_recovered_match(match):
+    """
+    Closes a recovered match if none of its players came back.
+    """
+    if match in unresumed_matches:
+        unresumed_matches.discard(match)
+        remove_virtual_players(match)
+        close_match(match)
+        print("Match {} expired before its players resumed".format(match.match_id))
+
+def resume_seat(argument, match, player_num):
+    """
+    Moves a client to the seat it held before reconnecting.
+
+    Arguments:
+        argument {bytes} -- "<match id> <player num> <token>", as sent by "seat"
+
+    Returns:
+        {(Match, int)} -- The match and player number, or None if the seat
+                          doesn't exist, is taken or the token is wrong
+    """
+    try:
+        match_id, seat_num, token = argument.split()
+        match_id, seat_num, token = int(match_id), int(seat_num), bytes.fromhex(token.decode())
+    except ValueError:
+        return None
+
+    target = matches.get(match_id)
+    if (target is None or target is match or seat_num in target.players
+            or not secrets.compare_digest(target.tokens.get(seat_num, b""), token)):
+        return None
+
+    leave_match(match, player_num)
+    target.players.add(seat_num)
+    if target in unresumed_matches:
+        unresumed_matches.discard(target)
+        if (not target.gamestate.ready() and not target.computer_opponent
+                and not target.is_full()):
+            # Nobody else had joined before the restart, so the
+            # player waits for someone new, as in leave_match()
+            waiting_matches.append(target)
+            report_waiting_change()
+    return target, seat_num
+
+def leave_match(match, player_num):
+    """
+    Removes a client from its match and deletes
+    the match once both players are gone.
+    """
+    match.remove_player(player_num)
+    gamestate = match.gamestate
+    if gamestate.rps_in_session() and not gamestate.rps_result():
+        # Nobody is left to throw the hand the others wait on
+        gamestate.clear_rps_hands()
+        push_event(match, RPS_WINNER_EVENT, RPS_ABANDONED)
+    match.wake_rps_waiters(RPS_ABANDONED)
+    # Virtual players leave along with the last client
+    remove_virtual_players(match)
+
+    if match.is_empty():
+        close_match(match)
+        print("All clients disconnected from match", match.match_id)
+    elif (not match.gamestate.ready() and not match.computer_opponent
+          and match not in waiting_matches):
+        # Left before the game started, such as to resume another
+        # match, so the player still here waits for someone new.
+        # Its seat number may be the same as that of a player
+        # already waiting, so it queues behind them instead.
+        waiting_matches.append(match)
+        report_waiting_change()
+
+def remove_virtual_players(match):
+    for player_num, connection in list(match.subscribers.items()):
+        if isinstance(connection, VirtualConnection):
+            connection.close()
+            match.remove_player(player_num)
+
+def close_match(match):
+    """
+    Deletes a match that has no players left.
+    """
+    del matches[match.match_id]
+    if match.journal:
+        match.journal.close()
+    if wal:
+        wal.log_closed(match)
+    if match in waiting_matches:
+        waiting_matches.remove(match)
+        report_waiting_change()
+
+def report_to_dispatcher(message):
+    if dispatcher is not None:
+        dispatcher.send(message)
+
+def report_waiting_state():
+    if waiting_matches:
+        report_to_dispatcher(PLAYER_WAITING)
+    else:
+        report_to_dispatcher(NO_PLAYER_WAITING)
+
+def report_waiting_change():
+    """
+    Tells the parent whether a player is waiting, after
+    it changed other than by seating a handed off client.
+    """
+    if waiting_matches:
+        report_to_dispatcher(PLAYER_LEFT_WAITING)
+    else:
+        report_to_dispatcher(WAITING_PLAYER_LEFT)
 
 ##############   Client Loop   #################
 
-def client_thread(connection, player_num):
+async def client_connected(reader, writer):
     """
     Handles connection to clients.
 
     Sends player_num to client and then
-    enters a loop where commands are 
+    enters a loop where commands are
     received from client and processed.
 
     Arguments:
-        connection {socket} -- Used to access network
-        player_num {int} -- Defines player order
+        reader {asyncio.StreamReader} -- Used to receive from client
+        writer {asyncio.StreamWriter} -- Used to send to client
     """
+    connection = Connection(reader, writer)
+    try:
+        await asyncio.wait_for(connection.handshake(), HANDSHAKE_TIMEOUT)
+    except (asyncio.TimeoutError, ConnectionError, EOFError, ValueError) as e:
+        print("[Error]: Handshake failed.")
+        print(repr(e))
+        connection.close()
+        report_to_dispatcher(HANDOFF_FAILED)
+        return
+
+    match, player_num = join_match()
+    report_waiting_state()
+    gamestate = match.gamestate
+    ACTIVE_CONNECTIONS.inc()
 
-    # Access global variables
-    global client_count
-    global gamestate
-
-    # Send player's number to client
-    send_data(player_num, connection)
+    try:
+        address = connection.get_address()
+        print("Established connection with {}:{} as player {} of match {}".format(
+            address[0], address[1], player_num, match.match_id))
+        print("[Debug]: Active matches:", len(matches))
+
+        # Send player's number to client
+        await send_data(player_num, connection)
+
+        while True:
+            message = await receive_message(connection)
+            if message:
+                start = time.perf_counter()
+                # Commands look like "[@<id> ]<command>[ <argument>]"
+                try:
+                    request_id, message = unpack_request(message)
+                    command, _, argument = message.partition(b" ")
+                    command = command.decode()
+                except ValueError:
+                    command = None
+
+                if command == "get":
+                    await send_gamestate(gamestate, connection, request_id)
+                elif command == "since" and argument:
+                    if argument.isdigit():
+                        # Send only what changed after the client's version
+                        await send_changes(gamestate, int(argument), connection, request_id)
+                    else:
+                        INVALID_COMMANDS.inc()
+                        await send_data("invalid", connection, request_id)
+                elif command in ("turn", "hand") and not argument:
+                    # The turn or hand must come along with the command
+                    INVALID_COMMANDS.inc()
+                    await send_data("invalid", connection, request_id)
+                elif command == "turn":
+                    try:
+                        turn = decode_turn(argument)
+                    except ValueError:
+                        break
+                    # Only acknowledged once it would survive a crash
+                    reply = await play_turn(match, player_num, turn)
+                    await send_data(reply, connection, request_id)
+                elif command == "request_turn":
+                    turn = gamestate.get_turn()
+                    await send_data(turn, connection, request_id)
+                elif command == "hand":
+                    hand = int(argument) if argument.isdigit() else None
+                    if hand not in (ROCK, PAPER, SCISSORS):
+                        break
+                    await send_data("ok", connection, request_id)
+                    gamestate.set_hand(player_num, hand)
+                    push_rps_progress(match, player_num)
+                elif command == "rps_winner":
+                    winner = await wait_for_rps_winner(match, player_num)
+                    await send_data(winner, connection, request_id)
+                elif command == "check_rps":
+                    in_session = gamestate.rps_in_session()
+                    await send_data(in_session, connection, request_id)
+                elif command == "subscribe":
+                    # Push events to this client from now on
+                    match.subscribe(player_num, connection)
+                    await send_data("ok", connection, request_id)
+                elif command == "start":
+                    await send_data("ok", connection, request_id)
+                    gamestate.set_ready(player_num)
+                    if wal:
+                        wal.log_snapshot(match)
+                elif command == "reset":
+                    gamestate.reset()
+                    match.rules.sync()
+                    if match.journal:
+                        match.journal.record_snapshot()
+                    if wal:
+                        wal.log_snapshot(match)
+                elif command == "seat":
+                    # What the client needs to resume after reconnecting
+                    await send_data("{} {} {}".format(match.match_id, player_num,
+                                                      match.tokens[player_num].hex()),
+                                    connection, request_id)
+                elif command == "resume":
+                    seat = resume_seat(argument, match, player_num)
+                    if seat:
+                        match, player_num = seat
+                        gamestate = match.gamestate
+                        print("Player {} of match {} resumed".format(player_num, match.match_id))
+                    await send_data("ok" if seat else "denied", connection, request_id)
+                elif command == "quit":
+                    break  # Exit main client loop to close connection
+                else:
+                    print("[Error]: Received invalid command from player", player_num)
+                    INVALID_COMMANDS.inc()
+                    continue
+                COMMAND_SECONDS[command].observe(time.perf_counter() - start)
+            else:
+                # Data wasn't received; exit loop
+                break
+    finally:
+        # Free the seat even if a command failed
+        print("Closing connection with player {} of match {}".format(player_num, match.match_id))
+        leave_match(match, player_num)
+        connection.close()
+        ACTIVE_CONNECTIONS.dec()
 
-    # Track number of active threads
-    thread_count = threading.active_count()
-    print("[Debug]: Active threads:", thread_count)
+################################################
 
-    while True:
-        # Receive one kB of data from client
-        data = receive(connection)
-        if data:
-            if data == "get":
-                send_gamestate(gamestate, connection)
-            elif data == "turn":
-                # Recieve a turn from client
-                send_data("ok", connection)
-                turn = None
-                while not turn:
-                    turn = receive_pickle(connection)
-                send_data("ok", connection)
-                # Turn consists of a move and an attack
-                move = turn["move"]
-                attack = turn["attack"]
-                if move:
-                    gamestate.move_unit(move)
-                if attack:
-                    gamestate.attack_unit(attack)
-                    gamestate.determine_if_game_over()
-                # Change player turn
-                gamestate.change_turns()
-            elif data == "request_turn":
-                turn = gamestate.get_turn()
-                send_data(turn, connection)
-            elif data == "hand":
-                send_data("ok", connection)
-                hand = receive_pickle(connection)
-                while not isinstance(hand, int):
-                    hand = receive_pickle(connection)
-                send_data("ok", connection)
-                gamestate.set_hand(player_num, hand)
-            elif data == "rps_winner":
-                winner = gamestate.determine_rps_winner()
-                send_data(winner, connection)
-            elif data == "check_rps":
-                in_session = gamestate.rps_in_session()
-                send_data(in_session, connection)
-            elif data == "start":
-                send_data("ok", connection)
-                gamestate.set_ready(player_num)
-            elif data == "reset":
-                gamestate.reset()
-            elif data == "quit":
-                break  # Exit main client loop to close connection
-            else:
-                print("[Error]: Received invalid command from player", player_num)
-        else:
-            # Data wasn't received; exit loop
-            break
+async def play_turn(match, player_num, turn):
+    """
+    Applies a turn's move and attack if they are legal,
+    passes the turn over and tells subscribers about it
+    once it would survive a crash.
 
-    # Close connection
-    print("Closing connection with player", player_num)
-    client_count -= 1
-    if client_count == 0:
-        # Delete gamestate object
-        gamestate = None
-        print("All clients disconnected.")
-    connection.close()
+    Returns:
+        {str} -- "ok", or "illegal" if the turn was rejected
+    """
+    gamestate = match.gamestate
+    try:
+        if turn.get("attack") and match.rps_winner not in (player_num, 3):
+            raise IllegalTurn("attack without winning rock paper scissors")
+        match.rules.play_turn(player_num, turn)
+    except (IllegalTurn, TypeError, ValueError) as e:
+        print("[Error]: Rejected turn from player {} of match {}: {}".format(
+            player_num, match.match_id, e))
+        ILLEGAL_TURNS.inc()
+        return "illegal"
+    # Each win is good for one attack
+    match.rps_winner = 0
+
+    if match.journal:
+        match.journal.record_turn(player_num, turn)
+    events = [(TURN_EVENT, gamestate.get_turn())]
+    if gamestate.game_is_over:
+        events.append((GAME_OVER_EVENT, gamestate.winner))
+    if wal:
+        wal.log_turn(match, player_num, turn)
+        await wal.commit()
+    for name, value in events:
+        push_event(match, name, value)
+    return "ok"
+
+def push_event(match, name, value=0, players=(1, 2)):
+    """
+    Sends an event to the subscribed clients of a match
+    without waiting for it to be written.
+    """
+    event = pack_event(name, value)
+    for player_num, connection in match.subscribers.items():
+        if player_num in players and not connection.is_closing():
+            connection.write(event)
 
-################################################
+def push_rps_progress(match, player_num):
+    """
+    Tells subscribers that rock paper scissors started
+    or was decided after player_num threw a hand.
+    """
+    gamestate = match.gamestate
+    winner = gamestate.rps_result()
+    if winner:
+        match.rps_winner = winner
+        if match.journal:
+            match.journal.record_rps(gamestate.hands[1], gamestate.hands[2], winner)
+        push_event(match, RPS_WINNER_EVENT, winner)
+        # Subscribers were just told the winner
+        for subscriber in match.subscribers:
+            gamestate.determine_rps_winner(subscriber)
+        match.wake_rps_waiters(winner)
+        return
+    opponent = 2 if player_num == 1 else 1
+    if opponent in match.players:
+        # First hand thrown; wake up the other player
+        push_event(match, RPS_START_EVENT, player_num, players=(opponent,))
+    else:
+        # Nobody is there to throw the other hand
+        gamestate.clear_rps_hands()
+        push_event(match, RPS_WINNER_EVENT, RPS_ABANDONED, players=(player_num,))
+
+async def wait_for_rps_winner(match, player_num):
+    """
+    Waits for both hands to be thrown.
 
-def send_data(data, connection):
+    Returns:
+        {int} -- The winner, 3 on a tie or RPS_ABANDONED if a player left first
+    """
+    gamestate = match.gamestate
+    if not gamestate.rps_result():
+        opponent = 2 if player_num == 1 else 1
+        if opponent not in match.players:
+            return RPS_ABANDONED
+        future = asyncio.get_running_loop().create_future()
+        match.rps_waiters.append(future)
+        winner = await future
+        if winner != RPS_ABANDONED:
+            # The hands may already be cleared if the others were
+            # told by events, so only count this player as told
+            gamestate.determine_rps_winner(player_num)
+        return winner
+    return gamestate.determine_rps_winner(player_num)
+
+async def send_data(data, connection, request_id=None):
     try:
-        encrypted_data = encrypt(str(data).encode())
-        connection.sendall(encrypted_data)
-    except socket.error as e:
+        connection.write(pack_request(request_id, str(data).encode()))
+        await connection.drain()
+    except ConnectionError as e:
         print("[Error]: Socket cannot be used to send data.")
         print(str(e))
-    except TypeError:
-        print("[Error]: Data cannot be converted to string to be sent.")
 
-def send_gamestate(gamestate, connection):
-    # Send gamestate as serialized pickle object
-    gamestate_pickle = pickle.dumps(gamestate)
+async def send_gamestate(gamestate, connection, request_id=None):
+    # Send gamestate in its compact binary form
     try:
-        encrypted_data = encrypt(gamestate_pickle)
-        connection.sendall(encrypted_data)
-    except socket.error as e:
+        start = time.perf_counter()
+        data = encode_gamestate(gamestate)
+        SERIALIZE_SECONDS["gamestate"].observe(time.perf_counter() - start)
+        connection.write(pack_request(request_id, data))
+        await connection.drain()
+    except ConnectionError as e:
         print(str(e))
 
-def receive(connection):
-    # Receive data from client
+async def send_changes(gamestate, version, connection, request_id=None):
     try:
-        decrypted_reply = decrypt(connection.recv(2048))
-        reply = decrypted_reply.decode()
-        return reply
-    except socket.error as e:
-        print(str(e))
-        return None
-    except UnicodeDecodeError as e:
-        print("[Error]: Unable to decode message from client.")
+        start = time.perf_counter()
+        data = encode_changes(gamestate, version)
+        SERIALIZE_SECONDS["changes"].observe(time.perf_counter() - start)
+        connection.write(pack_request(request_id, data))
+        await connection.drain()
+    except ConnectionError as e:
         print(str(e))
-        return None
 
-def receive_pickle(connection):
-    # Receive pickle object
+async def receive_message(connection):
+    # Receive data from client
     try:
-        decrypted_reply = decrypt(connection.recv(2048))
-        reply = pickle.loads(decrypted_reply)
-        return reply
-    except socket.error as e:
-        print(str(e))
+        return await connection.read()
+    except (ConnectionError, EOFError, InvalidTag, ValueError) as e:
+        print("[Error]: Unable to read message from client.")
+        print(repr(e))
         return None
 
-if __name__ == "__main__":
-    # Check for correct number of arguments
-    if len(sys.argv) < 3:
-        print("Usage: python server.py <ip_address> <port>")
+##############   Virtual Players   #############
+
+def start_virtual_player(match, player_num):
+    """
+    Seats the computer in a match as a subscriber
+    that is always ready.
+    """
+    match.players.add(player_num)
+    connection = VirtualConnection()
+    match.subscribe(player_num, connection)
+    match.gamestate.set_ready(player_num)
+
+    # Searchers keep state between turns, so each player needs its own
+    searcher = Searcher(time_budget=ai_time_budget or DEFAULT_AI_TIME)
+    task = asyncio.ensure_future(run_virtual_player(match, player_num, connection, searcher))
+    virtual_player_tasks.add(task)
+    task.add_done_callback(virtual_player_tasks.discard)
+
+    gamestate = match.gamestate
+    if gamestate.get_turn() == player_num and not gamestate.game_is_over:
+        # Already its turn, as in a recovered match
+        connection.write(pack_event(TURN_EVENT, player_num))
+
+async def run_virtual_player(match, player_num, connection, searcher):
+    """
+    Plays for player_num in response to pushed events
+    until the connection is closed.
+    """
+    rng = random.Random()
+    gamestate = match.gamestate
+    while True:
+        event = await connection.next_event()
+        if event is None:
+            break
+        name, value = event
+        if name == RPS_START_EVENT:
+            # Defend with a random hand
+            gamestate.set_hand(player_num, rng.choice((ROCK, PAPER, SCISSORS)))
+            push_rps_progress(match, player_num)
+        elif name == TURN_EVENT and value == player_num and not gamestate.game_is_over:
+            await play_virtual_turn(match, player_num, connection, searcher, rng)
+
+async def play_virtual_turn(match, player_num, connection, searcher, rng):
+    # Search in a thread so other matches keep being served
+    loop = asyncio.get_running_loop()
+    turn = await loop.run_in_executor(None, searcher.choose_turn,
+                                      match.rules.copy(), player_num)
+
+    if turn["attack"]:
+        # Throw first and wait for the other player's hand
+        match.gamestate.set_hand(player_num, rng.choice((ROCK, PAPER, SCISSORS)))
+        push_rps_progress(match, player_num)
+        while True:
+            event = await connection.next_event()
+            if event is None:
+                return
+            if event[0] == RPS_WINNER_EVENT:
+                break
+        # Ties go to the attacker
+        if event[1] not in (player_num, 3):
+            turn["attack"] = None
+
+    await play_turn(match, player_num, turn)
+
+##############   Admin Socket   ################
+
+async def serve_metrics(port):
+    """
+    Answers every connection on 127.0.0.1:port with the
+    metrics in Prometheus text format. Works with both
+    Prometheus scrapes and plain `nc 127.0.0.1 port`.
+    """
+    try:
+        await asyncio.start_server(send_metrics, "127.0.0.1", port)
+    except OSError:
+        print("[Error]: Unable to serve metrics on port", port)
+        return
+    print("Metrics available on 127.0.0.1:" + str(port))
+
+async def send_metrics(reader, writer):
+    body = registry.render().encode()
+    writer.write(b"HTTP/1.0 200 OK\r\n"
+                 b"Content-Type: text/plain; version=0.0.4\r\n"
+                 b"Content-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body)
+    try:
+        await writer.drain()
+    except ConnectionError:
+        pass
+    writer.close()
+
+############   Worker Processes   ##############
+
+def start_workers(host, port, workers, metrics_port=None):
+    """
+    Forks worker processes and hands them
+    connections accepted by this process.
+    """
+    global dispatcher
+    global match_ids
+
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    try:
+        listener.bind((host, port))
+    except socket.error:
+        print("Binding to " + host + ":" + str(port) + " failed.")
+        listener.close()
         sys.exit()
+    listener.listen(BACKLOG)
+    print("Server listening on " + host + ":" + str(port) + " with", workers, "workers")
+
+    channels = []
+    for worker in range(workers):
+        parent_end, worker_end = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+        if os.fork() == 0:
+            # Worker process
+            listener.close()
+            parent_end.close()
+            for channel in channels:
+                channel.close()
+            dispatcher = worker_end
+            # Keep match ids unique across workers
+            match_ids = itertools.count(worker + 1, workers)
+            if metrics_port is not None:
+                metrics_port += worker
+            try:
+                asyncio.run(serve_handoffs(worker_end, metrics_port))
+            except KeyboardInterrupt:
+                pass
+            os._exit(0)
+        worker_end.close()
+        channels.append(parent_end)
+
+    dispatch_connections(listener, channels)
+
+def dispatch_connections(listener, channels):
+    """
+    Accepts connections and passes each one to a worker.
+
+    New players go to a worker holding a lone waiting player, so
+    both players of a match land in the same process. Only a join
+    the worker confirmed counts as a waiting player; a connection
+    still on its way may never get through the handshake. Failing
+    that, a player goes to a worker with an odd number of
+    connections on their way, to meet the player arriving just
+    before. Workers answer for every connection within
+    HANDSHAKE_TIMEOUT.
+    """
+    workers = range(len(channels))
+    player_waiting = [False for worker in workers]
+    in_flight = [0 for worker in workers]
+    next_worker = itertools.cycle(workers)
+
+    selector = selectors.DefaultSelector()
+    selector.register(listener, selectors.EVENT_READ)
+    for worker in workers:
+        selector.register(channels[worker], selectors.EVENT_READ, worker)
+
+    while True:
+        for key, _ in selector.select():
+            if key.fileobj is listener:
+                connection, address = listener.accept()
+
+                # Prefer a worker with someone to pair against
+                target = None
+                for worker in workers:
+                    if player_waiting[worker]:
+                        target = worker
+                        break
+                else:
+                    for worker in workers:
+                        if in_flight[worker] % 2:
+                            target = worker
+                            break
+                if target is None:
+                    target = next(next_worker)
+
+                socket.send_fds(channels[target], [b"c"], [connection.fileno()])
+                connection.close()
+                in_flight[target] += 1
+            else:
+                worker = key.data
+                messages = key.fileobj.recv(1024)
+                if not messages:
+                    print("[Error]: Worker", worker, "exited.")
+                    selector.unregister(key.fileobj)
+                    continue
+                for message in messages:
+                    message = bytes([message])
+                    if message == WAITING_PLAYER_LEFT:
+                        player_waiting[worker] = False
+                    elif message == PLAYER_LEFT_WAITING:
+                        player_waiting[worker] = True
+                    elif message == HANDOFF_FAILED:
+                        in_flight[worker] -= 1
+                    else:
+                        in_flight[worker] -= 1
+                        player_waiting[worker] = message == PLAYER_WAITING
+
+async def serve_handoffs(channel, metrics_port=None):
+    """
+    Serves connections handed over by the parent process.
+    """
+    if metrics_port is not None:
+        await serve_metrics(metrics_port)
+
+    loop = asyncio.get_running_loop()
+    channel.setblocking(False)
+    closed = loop.create_future()
+
+    # The loop only keeps weak references to tasks
+    tasks = set()
+
+    def receive_handoff():
+        try:
+            message, fds, _, _ = socket.recv_fds(channel, 1024, 64)
+        except BlockingIOError:
+            return
+        if not message:
+            # Parent process is gone
+            loop.remove_reader(channel)
+            closed.set_result(None)
+            return
+        for fd in fds:
+            task = loop.create_task(serve_handoff(socket.socket(fileno=fd)))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+    loop.add_reader(channel, receive_handoff)
+    print("Worker", os.getpid(), "ready")
+    await closed
+
+async def serve_handoff(sock):
+    reader, writer = await asyncio.open_connection(sock=sock)
+    await client_connected(reader, writer)
+
+################################################
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hosts A Game of Shapes matches.")
+    parser.add_argument("host", help="IP address to listen on")
+    parser.add_argument("port", type=int, help="port to listen on")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of worker processes sharing the port (default: 1)")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="serve Prometheus metrics on this port of 127.0.0.1")
+    parser.add_argument("--ai", action="store_true",
+                        help="pair every client with a computer opponent")
+    parser.add_argument("--ai-time", type=float, default=DEFAULT_AI_TIME,
+                        help="seconds the computer thinks per turn (default: 0.5)")
+    parser.add_argument("--journal", metavar="DIR", default=None,
+                        help="log every match to a journal file in this directory")
+    parser.add_argument("--wal", metavar="FILE", default=None,
+                        help="log matches to FILE and resume them after a restart")
+    args = parser.parse_args()
+    if args.wal and args.workers > 1:
+        parser.error("--wal needs a single worker")
+
     # Enter server loop
-    start_server()
+    start_server(args.host, args.port, args.workers, args.metrics_port,
+                 args.ai_time if args.ai else None, args.journal, args.wal)
@@ -0,0 +1,216 @@
+"""
+File: ai.py
+Programmers: Fernando Rodriguez, Charles Davis
+
+Contains the Searcher class, a computer player that picks
+turns with expectimax search.
+
+Each turn is a move of one unit (or none) followed by an attack
+on an enemy in range of where it ends up, if there is one. An
+attack is a chance node: it lands if the attacker wins or ties
+rock paper scissors, so HIT_CHANCE of the time with random
+hands. Search deepens one turn at a time until the time budget
+runs out, and a transposition table keeps the value and best
+turn of every position searched so the next, deeper pass tries
+the best turn first and skips repeated positions.
+
+"""
+import time
+
+from src.constants import *
+from src.rules import (ATTACK_POWER, ATTACK_RANGE, OWNER, RANGES, TILE_COUNT, UNIT_TYPES,
+                       position_of)
+
+# Chance an attack lands: the attacker wins or ties
+HIT_CHANCE = 2 / 3
+
+# Value of a won game, well above any evaluate() score
+WIN_SCORE = 10000
+
+# DISTANCES[a][b] is how many moves of one tile apart tiles a and b are
+DISTANCES = [
+    bytes(max(abs(position_of(a)[0] - position_of(b)[0]), abs(position_of(a)[1] - position_of(b)[1]))
+          for b in range(TILE_COUNT))
+    for a in range(TILE_COUNT)
+]
+
+class SearchTimeout(Exception):
+    """
+    Raised inside search when the time budget runs out.
+    """
+
+class Searcher:
+    """
+    Picks turns for one player with iterative deepening
+    expectimax over Rules positions.
+    """
+
+    def __init__(self, time_budget=0.5, max_depth=8, table_size=200000):
+        """
+        Keyword Arguments:
+            time_budget {float} -- Seconds to search each turn (default: {0.5})
+            max_depth {int} -- Turns to look ahead at most (default: {8})
+            table_size {int} -- Positions kept in the transposition table (default: {200000})
+        """
+        self.time_budget = time_budget
+        self.max_depth = max_depth
+        self.table_size = table_size
+
+        # Position key -> (depth, value, best turn)
+        self.table = {}
+
+        # Stats of the last choose_turn() call
+        self.nodes = 0
+        self.depth = 0
+
+    def choose_turn(self, rules, player_num):
+        """
+        Searches for player_num's best turn.
+
+        Arguments:
+            rules {Rules} -- The current position, left unchanged
+            player_num {int} -- Player to move, must be rules.turn
+
+        Returns:
+            {dict} -- Turn with "move" and "attack" as sent by clients
+        """
+        self.player_num = player_num
+        self.deadline = time.perf_counter() + self.time_budget
+        self.nodes = 0
+        self.depth = 0
+        if len(self.table) > self.table_size:
+            self.table.clear()
+
+        rules = rules.copy()
+        best = None
+        for depth in range(1, self.max_depth + 1):
+            try:
+                self.search(rules, depth)
+            except SearchTimeout:
+                break
+            best = self.table[self.key(rules)][2]
+            self.depth = depth
+
+        if best is None:
+            # Not even one turn deep in time; take the first turn found
+            best = next(self.get_turns(rules))
+        return self.to_turn(best)
+
+    def search(self, rules, depth):
+        """
+        Returns:
+            {float} -- Expected value of the position for self.player_num
+        """
+        self.nodes += 1
+        if not self.nodes & 1023 and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+        if rules.winner:
+            # Prefer quicker wins and slower losses
+            score = WIN_SCORE + depth
+            return score if rules.winner == self.player_num else -score
+        if depth == 0:
+            return self.evaluate(rules)
+
+        key = self.key(rules)
+        entry = self.table.get(key)
+        if entry and entry[0] >= depth:
+            return entry[1]
+
+        maximizing = rules.turn == self.player_num
+        best_value, best_turn = None, None
+        turns = self.get_turns(rules)
+        if entry:
+            # Best turn of the shallower search first
+            turns = self.first(entry[2], turns)
+
+        for turn in turns:
+            value = self.expected_value(rules, turn, depth)
+            if (best_value is None or (value > best_value if maximizing
+                                       else value < best_value)):
+                best_value, best_turn = value, turn
+
+        self.table[key] = (depth, best_value, best_turn)
+        return best_value
+
+    def expected_value(self, rules, turn, depth):
+        unit_type, tile, target = turn
+        child = rules.copy()
+        if tile is not None:
+            child.move(unit_type, tile)
+        child.end_turn()
+
+        if not target:
+            return self.search(child, depth - 1)
+
+        missed = self.search(child, depth - 1)
+        child.damage(target, ATTACK_POWER[unit_type])
+        hit = self.search(child, depth - 1)
+        return HIT_CHANCE * hit + (1 - HIT_CHANCE) * missed
+
+    def get_turns(self, rules):
+        """
+        Yields (unit type, tile moved to or None, target or NO_UNIT)
+        for every turn the player to move can take. Attacks are
+        never passed up, since they can't hurt the attacker.
+        """
+        occupancy = rules.occupancy
+        player_num = rules.turn
+        for unit_type in rules.get_units(player_num):
+            tiles = [None] + rules.get_moves(unit_type)
+            attack_ranges = RANGES[ATTACK_RANGE[unit_type]]
+            for tile in tiles:
+                from_tile = rules.tiles[unit_type] if tile is None else tile
+                attacked = False
+                for range_tile in attack_ranges[from_tile]:
+                    target = occupancy[range_tile]
+                    if target and OWNER[target] != player_num:
+                        attacked = True
+                        yield unit_type, tile, target
+                if not attacked:
+                    yield unit_type, tile, NO_UNIT
+
+    def evaluate(self, rules):
+        """
+        Scores a position for self.player_num: health and units
+        left on each side, and a small pull towards the enemy.
+
+        Returns:
+            {float} -- Positive if self.player_num is ahead
+        """
+        score = 0.0
+        health = rules.health
+        tiles = rules.tiles
+        enemy_tiles = []
+        for unit_type in UNIT_TYPES:
+            if health[unit_type] > 0:
+                value = 10 + 2 * health[unit_type]
+                if OWNER[unit_type] == self.player_num:
+                    score += value
+                else:
+                    score -= value
+                    enemy_tiles.append(tiles[unit_type])
+
+        for unit_type in rules.get_units(self.player_num):
+            distances = DISTANCES[tiles[unit_type]]
+            score -= 0.05 * min(distances[enemy_tile] for enemy_tile in enemy_tiles)
+        return score
+
+    def key(self, rules):
+        # Values are from self.player_num's side, so it's part of the key
+        return rules.hash, self.player_num
+
+    def first(self, turn, turns):
+        yield turn
+        for other_turn in turns:
+            if other_turn != turn:
+                yield other_turn
+
+    def to_turn(self, turn):
+        unit_type, tile, target = turn
+        move = None
+        if tile is not None:
+            move = [unit_type] + position_of(tile)
+        attack = None
+        if target:
+            attack = [target, ATTACK_POWER[unit_type]]
+        return {"move": move, "attack": attack, "phase": END_TURN, "result": None}
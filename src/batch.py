@@ -0,0 +1,186 @@
+"""
+File: batch.py
+Programmers: Fernando Rodriguez, Charles Davis
+
+Contains the BatchGames class, which plays many games at once
+with NumPy arrays, for bot training and balance testing.
+
+Each game is a row in arrays of unit columns, rows and health,
+plus a turn and winner per game. One call to step() checks and
+applies one turn in every game. Unit stats come from Unit
+through the rules module, so they match the real game.
+
+NumPy is optional; nothing else in the game imports this module.
+
+"""
+import numpy as np
+
+from src.constants import *
+from src.rules import (ATTACK_POWER, ATTACK_RANGE, MAX_HEALTH, OWNER, SPEED,
+                       START_TILES, position_of)
+
+# Unit stats indexed by unit type - 1
+UNIT_OWNER = np.array(OWNER[1:], dtype=np.int8)
+UNIT_SPEED = np.array(SPEED[1:], dtype=np.int16)
+UNIT_ATTACK_POWER = np.array(ATTACK_POWER[1:], dtype=np.int8)
+UNIT_ATTACK_RANGE = np.array(ATTACK_RANGE[1:], dtype=np.int16)
+UNIT_MAX_HEALTH = np.array(MAX_HEALTH[1:], dtype=np.int8)
+
+START_COLS = np.array([position_of(tile)[0] for tile in START_TILES[1:]], dtype=np.int16)
+START_ROWS = np.array([position_of(tile)[1] for tile in START_TILES[1:]], dtype=np.int16)
+
+# Winner of rock paper scissors by [attacker's hand, defender's hand],
+# 1 if the attacker wins, 2 if the defender wins, 3 on a tie
+RPS_WINNER = np.zeros((4, 4), dtype=np.int8)
+RPS_WINNER[1:, 1:] = RPS_OUTCOMES
+
+class BatchGames:
+    """
+    Holds count independent games as arrays and
+    plays a turn in all of them at once.
+
+    Unit arrays have one column per unit type, with
+    unit type 1 in column 0.
+    """
+
+    def __init__(self, count, seed=None):
+        """
+        Arguments:
+            count {int} -- Number of games
+
+        Keyword Arguments:
+            seed {int} -- Seeds rock paper scissors and random turns (default: {None})
+        """
+        self.count = count
+        self.rng = np.random.default_rng(seed)
+        self.games = np.arange(count)
+
+        self.cols = np.empty((count, len(START_COLS)), dtype=np.int16)
+        self.rows = np.empty_like(self.cols)
+        self.health = np.empty((count, len(START_COLS)), dtype=np.int8)
+        self.turn = np.empty(count, dtype=np.int8)
+        self.winner = np.empty(count, dtype=np.int8)
+        self.reset()
+
+    def reset(self, games=None):
+        """
+        Sets games back to the start.
+
+        Keyword Arguments:
+            games {ndarray} -- Indices or mask of games to reset, all if None (default: {None})
+        """
+        if games is None:
+            games = slice(None)
+        self.cols[games] = START_COLS
+        self.rows[games] = START_ROWS
+        self.health[games] = UNIT_MAX_HEALTH
+        self.turn[games] = 1
+        self.winner[games] = 0
+
+    def reset_finished(self):
+        """
+        Restarts every game that has a winner.
+
+        Returns:
+            {int} -- Number of games restarted
+        """
+        finished = self.winner != 0
+        self.reset(finished)
+        return int(finished.sum())
+
+    def step(self, units, cols, rows, targets):
+        """
+        Plays one turn in every game. A turn is a move and,
+        if targets isn't NO_UNIT, an attack from the tile moved
+        to. The attack lands if the attacker wins or ties a
+        game of rock paper scissors with random hands.
+
+        Illegal turns are skipped and the game keeps its turn.
+
+        Arguments:
+            units {ndarray} -- Unit type to move in each game
+            cols {ndarray} -- Column to move to in each game
+            rows {ndarray} -- Row to move to in each game
+            targets {ndarray} -- Unit type to attack in each game, or NO_UNIT
+
+        Returns:
+            {ndarray} -- True for games where the turn was legal and applied
+        """
+        games = self.games
+        alive = self.health > 0
+        unit_index = np.clip(units - 1, 0, len(START_COLS) - 1)
+        target_index = np.clip(targets - 1, 0, len(START_COLS) - 1)
+
+        # Move: a living unit of the player to move, within
+        # its speed, onto a free tile on the map
+        legal = (self.winner == 0) & (units >= 1) & (units <= len(START_COLS))
+        legal &= UNIT_OWNER[unit_index] == self.turn
+        legal &= alive[games, unit_index]
+        legal &= (cols >= 0) & (cols < GRID_COLUMNS) & (rows >= 0) & (rows < GRID_ROWS)
+        distance = np.maximum(np.abs(cols - self.cols[games, unit_index]),
+                              np.abs(rows - self.rows[games, unit_index]))
+        legal &= distance <= UNIT_SPEED[unit_index]
+        occupied = alive & (self.cols == cols[:, None]) & (self.rows == rows[:, None])
+        legal &= ~occupied.any(axis=1)
+
+        # Attack: a living enemy within attack range of the new tile
+        attacking = targets != NO_UNIT
+        attack_distance = np.maximum(np.abs(cols - self.cols[games, target_index]),
+                                     np.abs(rows - self.rows[games, target_index]))
+        can_attack = ((targets >= 1) & (targets <= len(START_COLS))
+                      & (UNIT_OWNER[target_index] != self.turn)
+                      & alive[games, target_index]
+                      & (attack_distance <= UNIT_ATTACK_RANGE[unit_index]))
+        legal &= ~attacking | can_attack
+
+        moved = games[legal]
+        self.cols[moved, unit_index[legal]] = cols[legal]
+        self.rows[moved, unit_index[legal]] = rows[legal]
+
+        hands = self.rng.integers(ROCK, SCISSORS + 1, size=(2, self.count))
+        hit = legal & attacking & (RPS_WINNER[hands[0], hands[1]] != 2)
+        hit_games, hit_units = games[hit], target_index[hit]
+        self.health[hit_games, hit_units] = np.maximum(
+            self.health[hit_games, hit_units] - UNIT_ATTACK_POWER[unit_index[hit]], 0)
+
+        # Game over checks as reductions over each player's units
+        player_1_dead = (self.health[:, :MAX_UNITS] == 0).all(axis=1)
+        player_2_dead = (self.health[:, MAX_UNITS:] == 0).all(axis=1)
+        no_winner = self.winner == 0
+        self.winner[no_winner & player_2_dead] = 1
+        self.winner[no_winner & player_1_dead] = 2
+
+        self.turn[legal] = 3 - self.turn[legal]
+        return legal
+
+    def random_turns(self):
+        """
+        Picks a random unit of the player to move in each game,
+        a random tile within its speed and the closest enemy in
+        range of that tile. Moves onto taken tiles are left in
+        for step() to reject.
+
+        Returns:
+            {(ndarray, ndarray, ndarray, ndarray)} -- units, cols, rows and targets
+        """
+        games = self.games
+        alive = self.health > 0
+        own = alive & (UNIT_OWNER == self.turn[:, None])
+
+        scores = self.rng.random(own.shape)
+        scores[~own] = -1
+        unit_index = scores.argmax(axis=1)
+
+        speed = UNIT_SPEED[unit_index]
+        cols = np.clip(self.cols[games, unit_index] + self.rng.integers(-speed, speed + 1),
+                       0, GRID_COLUMNS - 1)
+        rows = np.clip(self.rows[games, unit_index] + self.rng.integers(-speed, speed + 1),
+                       0, GRID_ROWS - 1)
+
+        distance = np.maximum(np.abs(self.cols - cols[:, None]), np.abs(self.rows - rows[:, None]))
+        in_range = (alive & (UNIT_OWNER != self.turn[:, None])
+                    & (distance <= UNIT_ATTACK_RANGE[unit_index][:, None]))
+        closest = np.where(in_range, distance, GRID_COLUMNS + GRID_ROWS).argmin(axis=1)
+        targets = np.where(in_range.any(axis=1), closest + 1, NO_UNIT)
+
+        return unit_index + 1, cols, rows, targets
@@ -0,0 +1,241 @@
+"""
+File: bitboard.py
+Programmers: Fernando Rodriguez, Charles Davis
+
+Contains BitboardGrid, a Grid backend that stores the board as
+Python ints with one bit per tile.
+
+Tile (col, row) is bit row * cols + col. Each tile type and each
+unit type has its own bitboard, and each player's occupancy is
+kept as one more, so clearing a highlight layer is a single
+assignment and checking a range against occupied tiles is a
+single AND. Python ints grow as needed, so boards can be far
+larger than the 12x11 game board.
+
+"""
+import functools
+
+from src.constants import *
+
+TILE_TYPES = (HEALTH, HARM, MOVABLE, ATTACKABLE)
+UNIT_TYPES = range(1, 2 * MAX_UNITS + 1)
+
+@functools.lru_cache(maxsize=4096)
+def square_mask(cols, rows, col, row, distance):
+    """
+    Returns:
+        {int} -- Bitboard of tiles at most distance columns and
+                 rows from (col, row), itself included
+    """
+    first_col, last_col = max(col - distance, 0), min(col + distance, cols - 1)
+    first_row, last_row = max(row - distance, 0), min(row + distance, rows - 1)
+    row_mask = ((1 << (last_col - first_col + 1)) - 1) << first_col
+    mask = 0
+    for mask_row in range(first_row, last_row + 1):
+        mask |= row_mask << (mask_row * cols)
+    return mask
+
+class BitboardGrid:
+    """
+    Drop-in replacement for Grid. Has the same methods,
+    plus whole-board operations on bitboards.
+    """
+
+    def __init__(self, cols=GRID_COLUMNS, rows=GRID_ROWS):
+        """
+        Keyword Arguments:
+            cols {int} -- Number of columns (default: {GRID_COLUMNS})
+            rows {int} -- Number of rows (default: {GRID_ROWS})
+        """
+        self.cols = cols
+        self.rows = rows
+        self.full_mask = (1 << (cols * rows)) - 1
+        self.clear()
+
+    def clear(self):
+        """
+        Removes every tile type and unit from the board.
+        """
+        # Bitboards indexed by tile type and unit type, index 0 unused
+        self.tile_boards = [0] * (max(TILE_TYPES) + 1)
+        self.unit_boards = [0] * (len(UNIT_TYPES) + 1)
+        self.occupancy = {1: 0, 2: 0}
+
+    def bit(self, col, row):
+        """
+        Returns:
+            {int} -- The tile's bit, or 0 if it is off the board
+        """
+        if 0 <= col < self.cols and 0 <= row < self.rows:
+            return 1 << (row * self.cols + col)
+        print("[Error]: Tile at Column: {0} Row: {1} doesn't exist.".format(col, row))
+        return 0
+
+    def tile_in_move_range(self, col, row):
+        return self.get_tile_type(col, row) == MOVABLE
+
+    def tile_in_attack_range(self, col, row):
+        return self.get_tile_type(col, row) == ATTACKABLE
+
+    def set_tile_type(self, col, row, tile_type=0):
+        """
+        Change the type of a given tile.
+
+        Keyword Arguments:
+            tile_type {int} -- 0=blank, 1=health, 2=harm (default: {0})
+        """
+        bit = self.bit(col, row)
+        if not bit:
+            return
+        boards = self.tile_boards
+        for other_type in TILE_TYPES:
+            boards[other_type] &= ~bit
+        if tile_type:
+            boards[tile_type] |= bit
+
+    def get_tile_type(self, col, row):
+        """
+        Returns:
+            int -- The tile_type of given tile
+                   Will be -1 if tile doesn't exist
+        """
+        bit = self.bit(col, row)
+        if not bit:
+            return -1
+        for tile_type in TILE_TYPES:
+            if self.tile_boards[tile_type] & bit:
+                return tile_type
+        return BLANK
+
+    def get_unit_type(self, col, row):
+        """
+        Returns:
+            int -- The unit_type at a given tile
+                   Will be -1 if tile doesn't exist
+        """
+        bit = self.bit(col, row)
+        if not bit:
+            return -1
+        for unit_type in UNIT_TYPES:
+            if self.unit_boards[unit_type] & bit:
+                return unit_type
+        return NO_UNIT
+
+    def set_unit_type(self, col, row, unit_type):
+        """
+        Change the unit_type on a given grid tile.
+
+        Arguments:
+            unit_type {int} -- 0=blank, 1-3=player1, 4-6=player2
+        """
+        bit = self.bit(col, row)
+        if not bit:
+            return
+        for other_type in UNIT_TYPES:
+            if self.unit_boards[other_type] & bit:
+                self.unit_boards[other_type] &= ~bit
+                self.occupancy[1 if other_type <= MAX_UNITS else 2] &= ~bit
+        if unit_type:
+            self.unit_boards[unit_type] |= bit
+            self.occupancy[1 if unit_type <= MAX_UNITS else 2] |= bit
+
+    ###########   Whole-board operations   ###########
+
+    def get_tile_mask(self, tile_type):
+        return self.tile_boards[tile_type]
+
+    def set_tile_mask(self, mask, tile_type):
+        """
+        Gives every tile in mask the tile type, leaving
+        other tiles alone.
+        """
+        mask &= self.full_mask
+        boards = self.tile_boards
+        for other_type in TILE_TYPES:
+            boards[other_type] &= ~mask
+        if tile_type:
+            boards[tile_type] |= mask
+
+    def clear_tile_type(self, tile_type):
+        """
+        Sets every tile of tile_type back to blank.
+        """
+        self.tile_boards[tile_type] = 0
+
+    def clear_tile_types(self):
+        self.tile_boards = [0] * len(self.tile_boards)
+
+    def fill(self, tile_type=BLANK):
+        """
+        Gives every tile the same tile type, leaving units alone.
+        """
+        self.clear_tile_types()
+        if tile_type:
+            self.tile_boards[tile_type] = self.full_mask
+
+    def copy(self):
+        """
+        Returns:
+            {BitboardGrid} -- A new grid with the same tiles and units
+        """
+        grid = BitboardGrid(self.cols, self.rows)
+        grid.tile_boards = list(self.tile_boards)
+        grid.unit_boards = list(self.unit_boards)
+        grid.occupancy = dict(self.occupancy)
+        return grid
+
+    def snapshot(self):
+        """
+        Returns:
+            {tuple} -- Board size, tile and unit bitboards and
+                       occupancy, for restore()
+        """
+        return ((self.cols, self.rows), tuple(self.tile_boards), tuple(self.unit_boards),
+                (self.occupancy[1], self.occupancy[2]))
+
+    def restore(self, snapshot):
+        """
+        Puts back the tiles and units saved by snapshot().
+        """
+        size, tile_boards, unit_boards, occupancy = snapshot
+        if size != (self.cols, self.rows):
+            raise ValueError("Snapshot is from a grid of another size")
+        self.tile_boards = list(tile_boards)
+        self.unit_boards = list(unit_boards)
+        self.occupancy = {1: occupancy[0], 2: occupancy[1]}
+
+    def get_occupied_mask(self, player_num=None):
+        """
+        Returns:
+            {int} -- Tiles holding the player's units, or any unit if None
+        """
+        if player_num is None:
+            return self.occupancy[1] | self.occupancy[2]
+        return self.occupancy[player_num]
+
+    def get_range_mask(self, col, row, distance):
+        return square_mask(self.cols, self.rows, col, row, distance)
+
+    def mask_from_tiles(self, tiles):
+        """
+        Returns:
+            {int} -- Bitboard of the (col, row) tiles on the board
+        """
+        mask = 0
+        for col, row in tiles:
+            if 0 <= col < self.cols and 0 <= row < self.rows:
+                mask |= 1 << (row * self.cols + col)
+        return mask
+
+    def tiles_from_mask(self, mask):
+        """
+        Returns:
+            {list} -- (col, row) of every tile in mask
+        """
+        tiles = []
+        while mask:
+            low_bit = mask & -mask
+            row, col = divmod(low_bit.bit_length() - 1, self.cols)
+            tiles.append((col, row))
+            mask ^= low_bit
+        return tiles
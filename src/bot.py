@@ -0,0 +1,184 @@
+"""
+File: bot.py
+Programmers: Fernando Rodriguez, Charles Davis
+
+Contains the Bot class, a headless client that plays random games.
+
+"""
+import collections
+import random
+import time
+
+from src.constants import *
+from src.protocol import RPS_ABANDONED
+from src.rules import ATTACK_POWER, Rules, position_of
+
+class BotError(Exception):
+    """
+    Raised when the server replies with something
+    unexpected or doesn't reply in time.
+    """
+
+class Bot:
+    """
+    Plays one game through a Network connection using the
+    same commands as the pygame client, picking a random
+    legal move and attack each turn.
+
+    Records the latency of every command it sends.
+    """
+
+    def __init__(self, network, rng=None, poll_interval=0.05, timeout=60):
+        """
+        Arguments:
+            network {Network} -- Unconnected connection to the server
+
+        Keyword Arguments:
+            rng {random.Random} -- Source of random moves (default: {None})
+            poll_interval {float} -- Seconds between polls while waiting (default: {0.05})
+            timeout {float} -- Seconds to wait on the other player (default: {60})
+        """
+        self.network = network
+        self.rng = rng or random.Random()
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.player_num = None
+
+        # Seconds taken by each command, keyed by command
+        self.latencies = collections.defaultdict(list)
+        self.errors = collections.Counter()
+        self.winner = None
+
+    def play(self):
+        """
+        Connects, plays until the game is over and disconnects.
+
+        Returns:
+            {bool} -- True if the game was finished
+        """
+        finished = False
+        try:
+            self.timed("connect", self.network.connect)
+            self.player_num = self.network.get_player_num()
+            if self.player_num not in (1, 2):
+                raise BotError("no player number")
+
+            self.network.send_command("start")
+            if self.timed("start", self.network.receive) != "ok":
+                raise BotError("start not acknowledged")
+            self.wait_for(lambda: self.get_gamestate().ready(), "opponent")
+
+            self.play_turns()
+            finished = True
+        except BotError as e:
+            self.errors[str(e)] += 1
+        except (OSError, ValueError, TypeError) as e:
+            self.errors[type(e).__name__] += 1
+        finally:
+            try:
+                self.timed("quit", self.network.close)
+            except OSError:
+                pass
+
+        return finished
+
+    def play_turns(self):
+        """
+        Takes turns until a winner is known.
+        """
+        deadline = time.monotonic() + self.timeout
+        # Hands stay on the server until both players have asked
+        # for the winner, so only defend once per enemy turn
+        defended = False
+        while True:
+            turn = self.timed("request_turn", self.network.request_turn)
+            if turn == self.player_num:
+                defended = False
+                gamestate = self.get_gamestate()
+                if gamestate.game_is_over:
+                    break
+                self.take_turn(gamestate)
+                gamestate = self.get_gamestate()
+                if gamestate.game_is_over:
+                    break
+                deadline = time.monotonic() + self.timeout
+            elif turn is None:
+                raise BotError("request_turn failed")
+            else:
+                in_session = self.timed("check_rps", self.network.check_for_rps)
+                if in_session and not defended:
+                    self.play_rps()
+                    defended = True
+                if time.monotonic() > deadline:
+                    raise BotError("timed out waiting for turn")
+                time.sleep(self.poll_interval)
+
+        self.winner = gamestate.winner
+
+    def take_turn(self, gamestate):
+        """
+        Moves a random unit to a random free tile and
+        attacks a random enemy in range, if any.
+        """
+        rules = Rules(gamestate)
+        unit_type = self.rng.choice(rules.get_units(self.player_num))
+
+        move = None
+        free_tiles = rules.get_moves(unit_type)
+        if free_tiles:
+            tile = self.rng.choice(free_tiles)
+            move = [unit_type] + position_of(tile)
+            rules.move(unit_type, tile)
+
+        attack = None
+        targets = rules.get_targets(unit_type)
+        if targets:
+            enemy = self.rng.choice(targets)
+            winner = self.play_rps()
+            # Ties go to the attacker
+            if winner in (self.player_num, 3):
+                attack = [enemy, ATTACK_POWER[unit_type]]
+
+        turn = {"move": move, "attack": attack, "phase": END_TURN, "result": None}
+        if not self.timed("turn", self.network.send_turn, turn):
+            raise BotError("turn rejected")
+
+    def play_rps(self):
+        """
+        Throws a random hand and waits for the winner.
+        """
+        self.timed("hand", self.network.send_hand, self.rng.choice((ROCK, PAPER, SCISSORS)))
+        winner = self.timed("rps_winner", self.network.get_rps_winner)
+        if winner == RPS_ABANDONED:
+            raise BotError("opponent left during rock paper scissors")
+        if not winner:
+            raise BotError("rps_winner failed")
+        return winner
+
+    def wait_for(self, condition, waiting_on):
+        """
+        Polls condition until it returns something truthy.
+        """
+        deadline = time.monotonic() + self.timeout
+        result = condition()
+        while not result:
+            if time.monotonic() > deadline:
+                raise BotError("timed out waiting for " + waiting_on)
+            time.sleep(self.poll_interval)
+            result = condition()
+        return result
+
+    def get_gamestate(self):
+        gamestate = self.timed("get", self.network.get_gamestate)
+        if gamestate is None:
+            raise BotError("get failed")
+        return gamestate
+
+    def timed(self, command, function, *args):
+        """
+        Calls function and records how long it took under command.
+        """
+        start = time.perf_counter()
+        result = function(*args)
+        self.latencies[command].append(time.perf_counter() - start)
+        return result
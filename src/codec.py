@@ -0,0 +1,202 @@
+"""
+File: codec.py
+Programmers: Fernando Rodriguez, Charles Davis
+
+Fixed-layout binary encoding of GameState.
+
+Snapshot layout (unsigned bytes unless noted):
+    codec version
+    gamestate version (4 bytes)
+    flags         -- bit 0/1: player 1/2 ready, bit 2: game over,
+                     bit 3: playing rps
+    turn          -- player whose turn it is
+    winner        -- 0 if nobody has won
+    hand 1, hand 2 -- 0 if not played
+    then for each unit type 1-6:
+        col, row, health  -- col and row are NO_POSITION if unit is dead
+
+Changes layout, the reply to "since <version>":
+    codec version
+    gamestate version (4 bytes)
+    count         -- STALE if the changes are no longer kept
+    then count records of kind, target, a, b (see GameState.apply_change)
+
+Turn layout, the payload of a single-message "turn" command:
+    moved unit, col, row   -- unit is NO_UNIT if nothing moved
+    attacked unit, power   -- unit is NO_UNIT if nothing was attacked
+
+"""
+import collections
+import struct
+
+from src.constants import *
+from src.gamestate import GameState
+
+# Bumped whenever the layout changes
+CODEC_VERSION = 2
+
+# Stands in for a unit location of None
+NO_POSITION = 0xFF
+
+UNIT_TYPES = range(1, 2 * MAX_UNITS + 1)
+
+GAMESTATE_FORMAT = struct.Struct("!BI5B" + "3B" * len(UNIT_TYPES))
+
+CHANGES_HEADER = struct.Struct("!BIB")
+CHANGE_FORMAT = struct.Struct("!4B")
+
+TURN_FORMAT = struct.Struct("!5B")
+
+# Change count meaning the client must fetch a snapshot
+STALE = 0xFF
+
+# Flag bits, suffixed so they never shadow a phase from constants
+P1_READY_FLAG = 1
+P2_READY_FLAG = 2
+GAME_OVER_FLAG = 4
+PLAYING_RPS_FLAG = 8
+
+def encode_gamestate(gamestate):
+    """
+    Packs a gamestate into bytes.
+
+    Arguments:
+        gamestate {GameState} -- The gamestate to encode
+
+    Returns:
+        {bytes} -- GAMESTATE_FORMAT.size bytes
+    """
+    flags = 0
+    if gamestate.ready_state[1]:
+        flags |= P1_READY_FLAG
+    if gamestate.ready_state[2]:
+        flags |= P2_READY_FLAG
+    if gamestate.game_is_over:
+        flags |= GAME_OVER_FLAG
+    if gamestate.playing_rps:
+        flags |= PLAYING_RPS_FLAG
+
+    values = [
+        CODEC_VERSION,
+        gamestate.version,
+        flags,
+        gamestate.get_turn(),
+        gamestate.winner or 0,
+        gamestate.hands[1] or 0,
+        gamestate.hands[2] or 0
+    ]
+    for unit_type in UNIT_TYPES:
+        location = gamestate.unit_locations[unit_type]
+        if location is None:
+            values += [NO_POSITION, NO_POSITION]
+        else:
+            values += location
+        values.append(gamestate.unit_health[unit_type])
+
+    return GAMESTATE_FORMAT.pack(*values)
+
+def decode_gamestate(data):
+    """
+    Rebuilds a gamestate from encode_gamestate() output.
+
+    Arguments:
+        data {bytes} -- The encoded gamestate
+
+    Returns:
+        {GameState} -- A new gamestate object
+    """
+    if len(data) != GAMESTATE_FORMAT.size or data[0] != CODEC_VERSION:
+        raise ValueError("Unsupported gamestate encoding")
+
+    values = GAMESTATE_FORMAT.unpack(data)
+    _, version, flags, turn, winner, hand_1, hand_2 = values[:7]
+
+    # Every field is set below, so skip __init__ and its rehash
+    gamestate = GameState.__new__(GameState)
+    gamestate.version = version
+    gamestate.changes = collections.deque(maxlen=CHANGE_HISTORY)
+    gamestate.ready_state = {1: bool(flags & P1_READY_FLAG), 2: bool(flags & P2_READY_FLAG)}
+    gamestate.game_is_over = bool(flags & GAME_OVER_FLAG)
+    gamestate.playing_rps = bool(flags & PLAYING_RPS_FLAG)
+    gamestate.turn = {1: turn == 1, 2: turn == 2}
+    gamestate.winner = winner or None
+    gamestate.hands = {1: hand_1 or None, 2: hand_2 or None}
+    gamestate.told_rps_winner = set()
+
+    unit_locations = {}
+    unit_health = {}
+    offset = 7
+    for unit_type in UNIT_TYPES:
+        col, row, health = values[offset:offset + 3]
+        unit_locations[unit_type] = None if col == NO_POSITION else [col, row]
+        unit_health[unit_type] = health
+        offset += 3
+    gamestate.unit_locations = unit_locations
+    gamestate.unit_health = unit_health
+
+    gamestate.rehash()
+    return gamestate
+
+def encode_changes(gamestate, version):
+    """
+    Packs the changes a client at the given version is missing.
+
+    Arguments:
+        gamestate {GameState} -- The up-to-date gamestate
+        version {int} -- The last version seen by the client
+
+    Returns:
+        {bytes} -- The encoded changes
+    """
+    changes = gamestate.changes_since(version)
+    if changes is None:
+        return CHANGES_HEADER.pack(CODEC_VERSION, gamestate.version, STALE)
+
+    header = CHANGES_HEADER.pack(CODEC_VERSION, gamestate.version, len(changes))
+    return header + b"".join([CHANGE_FORMAT.pack(*change) for change in changes])
+
+def decode_changes(data):
+    """
+    Unpacks encode_changes() output.
+
+    Returns:
+        {(int, list)} -- The new gamestate version and a list of
+                         (kind, target, a, b) records, or None
+                         in place of the list if a snapshot is needed
+    """
+    codec_version, version, count = CHANGES_HEADER.unpack_from(data)
+    if codec_version != CODEC_VERSION:
+        raise ValueError("Unsupported changes encoding")
+    if count == STALE:
+        return version, None
+
+    changes = list(CHANGE_FORMAT.iter_unpack(data[CHANGES_HEADER.size:]))
+    if len(changes) != count:
+        raise ValueError("Truncated changes")
+    return version, changes
+
+def encode_turn(turn):
+    """
+    Packs the move and attack of a turn dictionary.
+
+    Returns:
+        {bytes} -- TURN_FORMAT.size bytes
+    """
+    move = turn.get("move") or (NO_UNIT, 0, 0)
+    attack = turn.get("attack") or (NO_UNIT, 0)
+    return TURN_FORMAT.pack(*move, *attack)
+
+def decode_turn(data):
+    """
+    Unpacks encode_turn() output.
+
+    Returns:
+        {dict} -- "move" and "attack" as sent by the client, or None
+    """
+    if len(data) != TURN_FORMAT.size:
+        raise ValueError("Invalid turn encoding")
+    moved_unit, col, row, attacked_unit, power = TURN_FORMAT.unpack(data)
+    return {
+        "move": [moved_unit, col, row] if moved_unit != NO_UNIT else None,
+        "attack": [attacked_unit, power] if attacked_unit != NO_UNIT else None
+    }
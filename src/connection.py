@@ -0,0 +1,115 @@
+"""
+File: connection.py
+Programmers: Fernando Rodriguez, Charles Davis
+
+Contains the Connection class used by the server for each client,
+and VirtualConnection for players the server plays itself.
+
+"""
+import asyncio
+import time
+
+from src.encryption import create_keypair, create_session
+from src.metrics import registry
+from src.protocol import HEADER, pack_frame, read_frame, unpack_event
+
+BYTES_SENT = registry.counter("gameofshapes_sent_bytes_total", "Bytes written to clients")
+BYTES_RECEIVED = registry.counter("gameofshapes_received_bytes_total", "Bytes read from clients")
+ENCRYPT_SECONDS = registry.histogram("gameofshapes_crypto_seconds",
+                                     "Time spent encrypting or decrypting one message",
+                                     operation="encrypt")
+DECRYPT_SECONDS = registry.histogram("gameofshapes_crypto_seconds",
+                                     "Time spent encrypting or decrypting one message",
+                                     operation="decrypt")
+
+class Connection:
+    """
+    Server side of a client connection.
+
+    Wraps the asyncio streams and the session
+    keys agreed on during the handshake.
+    """
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.session = None
+
+    async def handshake(self):
+        """
+        Swaps public keys with the client and derives session keys.
+        Raises ValueError if the client doesn't send a valid key.
+        """
+        client_public_key = await read_frame(self.reader)
+        if client_public_key is None:
+            raise ValueError("Client closed connection during handshake")
+
+        private_key, public_key = create_keypair()
+        self.writer.write(pack_frame(public_key))
+        self.session = create_session(private_key, client_public_key, is_server=True)
+
+    def write(self, message):
+        """
+        Encrypts message and queues it to be sent.
+        """
+        start = time.perf_counter()
+        frame = pack_frame(self.session.encrypt(message))
+        ENCRYPT_SECONDS.observe(time.perf_counter() - start)
+        BYTES_SENT.inc(len(frame))
+        self.writer.write(frame)
+
+    async def drain(self):
+        await self.writer.drain()
+
+    async def read(self):
+        """
+        Returns:
+            {bytes} -- The next decrypted message, or None
+                       if the client closed the connection
+        """
+        frame = await read_frame(self.reader)
+        if frame is None:
+            return None
+        BYTES_RECEIVED.inc(len(frame) + HEADER.size)
+
+        start = time.perf_counter()
+        message = self.session.decrypt(frame)
+        DECRYPT_SECONDS.observe(time.perf_counter() - start)
+        return message
+
+    def get_address(self):
+        return self.writer.get_extra_info("peername")
+
+    def is_closing(self):
+        return self.writer.is_closing()
+
+    def close(self):
+        self.writer.close()
+
+class VirtualConnection:
+    """
+    Stands in for the connection of a player run by the
+    server, such as the computer opponent. Events pushed
+    to it are queued for the player instead of sent.
+    """
+
+    def __init__(self):
+        self.events = asyncio.Queue()
+        self.closing = False
+
+    def write(self, message):
+        self.events.put_nowait(unpack_event(message))
+
+    async def next_event(self):
+        """
+        Returns:
+            {(str, int)} -- The next event pushed, or None once closed
+        """
+        return await self.events.get()
+
+    def is_closing(self):
+        return self.closing
+
+    def close(self):
+        self.closing = True
+        self.events.put_nowait(None)
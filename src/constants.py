@@ -13,7 +13,7 @@ WINDOW_HEIGHT = 500
 WINDOW_CENTER = (WINDOW_WIDTH / 2, WINDOW_HEIGHT / 2)
 
 # In-game font
-GAME_FONT = "FFFFORWA.ttf"
+GAME_FONT = "FFFFORWA.TTF"
 
 # Tile size
 TILE_WIDTH = 23
@@ -64,4 +64,34 @@ ROCK = 1
 PAPER = 2
 SCISSORS = 3
 
+# Winner of rock paper scissors by [player 1's hand - 1][player 2's hand - 1],
+# 3 on a tie
+RPS_OUTCOMES = (
+    # Rock Paper Scissors
+    (3, 2, 1),  # Rock
+    (1, 3, 2),  # Paper
+    (2, 1, 3)   # Scissors
+)
+
+# Kinds of change recorded by GameState
+UNIT_MOVED = 1
+HEALTH_CHANGED = 2
+TURN_CHANGED = 3
+WINNER_SET = 4
+
+# Number of changes kept for clients catching up
+CHANGE_HISTORY = 64
+
+# Milliseconds between attempts to reach a server that went down
+RECONNECT_DELAY = 1000
+
+# Most frames per second drawn while the player is acting,
+# and while waiting on the other player or the server
+PLAYING_FPS = 60
+WAITING_FPS = 15
+
+# Milliseconds between asking the server whether something
+# changed, where it can't push an event instead
+POLL_INTERVAL = 250
+
 #########################################################################
\ No newline at end of file
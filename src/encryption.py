@@ -3,17 +3,87 @@ File: encryption.py
 Programmers: Fernando Rodriguez, Charles Davis
 
 Encrypts and decrypts binary data.
+
+Each connection starts with a handshake: client and server swap
+X25519 public keys in plain frames and derive a pair of session
+keys from the shared secret and the pre-shared key below. After
+that every frame is sealed with ChaCha20-Poly1305 using a counter
+as nonce, so frames must be decrypted in the order they were sent.
 """
-from cryptography.fernet import Fernet
+import struct
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey, X25519PublicKey
+from cryptography.hazmat.primitives.ciphers.aead import ChaCha20Poly1305
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 
+# Pre-shared key; only clients that know it can talk to the server
 key = b"REaIOWIUaGqGv7kvCgq24ilu0BNQhGiGF2Ahq-f1Hv8="
-f = Fernet(key)
 
-def encrypt(message):
-    # Encrypt bytecode
-    return f.encrypt(message)
+# Size of a raw X25519 public key
+PUBLIC_KEY_SIZE = 32
+
+# 4 zero bytes followed by a 64 bit message counter
+NONCE = struct.Struct("!IQ")
+
+class Session:
+    """
+    Encrypts outgoing and decrypts incoming messages
+    of one connection. Each direction has its own key
+    and message counter.
+    """
+
+    def __init__(self, send_key, receive_key):
+        self.send_cipher = ChaCha20Poly1305(send_key)
+        self.receive_cipher = ChaCha20Poly1305(receive_key)
+        self.send_count = 0
+        self.receive_count = 0
+
+    def encrypt(self, message):
+        # Encrypt bytecode
+        nonce = NONCE.pack(0, self.send_count)
+        self.send_count += 1
+        return self.send_cipher.encrypt(nonce, message, None)
+
+    def decrypt(self, cipher):
+        # Decrypt bytecode, raises InvalidTag if tampered with
+        nonce = NONCE.pack(0, self.receive_count)
+        message = self.receive_cipher.decrypt(nonce, cipher, None)
+        self.receive_count += 1
+        return message
+
+def create_keypair():
+    """
+    Returns:
+        {(X25519PrivateKey, bytes)} -- A new private key and its raw public key
+    """
+    private_key = X25519PrivateKey.generate()
+    return private_key, private_key.public_key().public_bytes_raw()
+
+def create_session(private_key, peer_public_key, is_server):
+    """
+    Derives the session keys after public keys have been swapped.
+
+    Arguments:
+        private_key {X25519PrivateKey} -- This side's private key
+        peer_public_key {bytes} -- The other side's raw public key
+        is_server {bool} -- Which side of the connection this is
+
+    Returns:
+        {Session} -- Ready to encrypt and decrypt messages
+    """
+    if len(peer_public_key) != PUBLIC_KEY_SIZE:
+        raise ValueError("Invalid public key")
 
+    shared_secret = private_key.exchange(X25519PublicKey.from_public_bytes(peer_public_key))
+    key_material = HKDF(
+        algorithm=hashes.SHA256(),
+        length=64,
+        salt=key,
+        info=b"game of shapes session"
+    ).derive(shared_secret)
 
-def decrypt(cipher):
-    # Decrypt bytecode
-    return f.decrypt(cipher)
+    client_key, server_key = key_material[:32], key_material[32:]
+    if is_server:
+        return Session(server_key, client_key)
+    return Session(client_key, server_key)
@@ -0,0 +1,44 @@
+"""
+File: fonts.py
+Programmers: Fernando Rodriguez, Charles Davis
+
+Fonts and rendered text shared by everything the client draws.
+
+Loading a font reads it from disk, and rendering a line of text
+rasterizes every glyph, so both are cached. Text surfaces are
+shared between callers and must only be blitted, never drawn on.
+
+"""
+import functools
+
+import pygame
+
+from src.constants import GAME_FONT
+
+# Rendered lines of text kept at once
+TEXT_CACHE_SIZE = 256
+
+@functools.lru_cache(maxsize=None)
+def get_font(size, font_file=GAME_FONT):
+    """
+    Returns:
+        {pygame.font.Font} -- The font loaded once per file and size
+    """
+    return pygame.font.Font(font_file, size)
+
+@functools.lru_cache(maxsize=TEXT_CACHE_SIZE)
+def render_text(text, size, color, font_file=GAME_FONT):
+    """
+    Renders text without antialiasing, like the rest of the
+    game. The least recently used lines are dropped once
+    TEXT_CACHE_SIZE are kept.
+
+    Arguments:
+        text {str} -- The line to render
+        size {int} -- Font size
+        color {(int, int, int)} -- Text color
+
+    Returns:
+        {pygame.Surface} -- The rendered line, shared with other callers
+    """
+    return get_font(size, font_file).render(text, False, color)
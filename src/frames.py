@@ -0,0 +1,65 @@
+"""
+File: frames.py
+Programmers: Fernando Rodriguez, Charles Davis
+
+Paces the client's loops.
+
+Nothing on screen moves unless the player does something or the
+server sends something, so a loop sleeps until there is input, a
+network wake-up or a timeout, instead of drawing at a fixed rate.
+Once awake it still waits out the frame rate cap of its phase,
+so a flood of mouse motion can't make it draw more often.
+
+"""
+import pygame
+
+# Posted by wake_up() so a sleeping loop notices network activity
+NETWORK_EVENT = pygame.USEREVENT + 1
+
+def wake_up():
+    """
+    Wakes up a loop sleeping in FrameScheduler.next_frame().
+    Safe to call from any thread, such as the network thread.
+    """
+    pygame.event.post(pygame.event.Event(NETWORK_EVENT))
+
+def window_exposed(events):
+    """
+    Returns true if the window must be drawn again,
+    such as after it was uncovered.
+    """
+    return any(event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED) for event in events)
+
+class FrameScheduler:
+    """
+    Decides when a loop runs its next frame.
+    """
+
+    def __init__(self):
+        self.clock = pygame.time.Clock()
+
+    def next_frame(self, fps, timeout=None):
+        """
+        Sleeps until there is something to do, but no more
+        often than fps frames per second.
+
+        Arguments:
+            fps {int} -- Most frames per second
+
+        Keyword Arguments:
+            timeout {int} -- Most milliseconds to sleep, or None to sleep until
+                             input or network activity (default: {None})
+
+        Returns:
+            {list} -- Input events since the last frame
+        """
+        events = pygame.event.get()
+        if not events:
+            if timeout is None:
+                events.append(pygame.event.wait())
+            else:
+                events.append(pygame.event.wait(max(timeout, 1)))
+        # Cap the frame rate, taking in whatever arrives meanwhile
+        self.clock.tick(fps)
+        events += pygame.event.get()
+        return [event for event in events if event.type not in (pygame.NOEVENT, NETWORK_EVENT)]
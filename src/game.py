@@ -3,16 +3,20 @@ File: game.py
 Programmers: Fernando Rodriguez, Charles Davis
 
 """
+import functools
 import sys
 import pygame
 
 # Constants
 import src.colors as colors
 from src.constants import *
+from src.fonts import render_text
+from src.frames import FrameScheduler, wake_up, window_exposed
+from src.protocol import TURN_EVENT, RPS_START_EVENT, GAME_OVER_EVENT
 
 # Classes
 from src.gamestate import GameState
-from src.network import Network
+from src.network import BackgroundNetwork
 from src.map import Map
 from src.unit import Unit
 
@@ -36,8 +40,7 @@ class Game:
         pygame.init()
 
         # Connection to the server
-        self.network = network
-        self.player_num = self.network.get_player_num()
+        self.player_num = network.get_player_num()
         print("You are player", self.player_num)
 
         # Set up display window
@@ -47,14 +50,22 @@ class Game:
         
         # Set up font
         pygame.font.init()
-        self.game_font = pygame.font.Font(GAME_FONT, 40)
 
-        # Set up gameplay map
-        self.map = Map(self.screen, self.player_num, self.network)
+        # Have the server tell us when the enemy acts
+        # instead of asking it every frame
+        network.subscribe()
 
         # Represents the state of game
         # Modified by server and sent to clients
-        self.gamestate = self.network.get_gamestate()
+        self.gamestate = network.get_gamestate()
+
+        # Talk to the server from a thread of its own from now on,
+        # so waiting on a reply never stalls input or drawing
+        self.network = BackgroundNetwork(network, notify=wake_up)
+
+        # Set up gameplay map
+        self.map = Map(self.screen, self.player_num, self.network)
+
         is_turn = self.gamestate.is_players_turn(self.player_num)
 
         # Effects of turn that are sent across network
@@ -69,12 +80,28 @@ class Game:
         if is_turn:
             self.turn["phase"] = SELECT_UNIT_TO_MOVE
 
-        # Clock tracks time from beginning of game
-        self.clock = pygame.time.Clock()
+        # Sleeps between frames until there is something to do
+        self.frames = FrameScheduler()
 
         # Keep track of user's cursor. Updates every frame
         self.mouse_position = pygame.mouse.get_pos()
 
+        # What the statistics and help showed when last drawn
+        self.drawn_hud = None
+
+        # Set while a gamestate, or whose turn it is, has
+        # been asked for and the reply hasn't arrived, and
+        # the time in ticks to ask again
+        self.fetching_gamestate = False
+        self.next_fetch = 0
+        self.polling = False
+        self.next_poll = 0
+
+        # Set while trying to take our seat back, and
+        # the time in ticks to try again after failing
+        self.reconnecting = False
+        self.next_reconnect = 0
+
         # Show waiting screen until other player connects
         self.waiting_screen()
         # Start the game
@@ -84,6 +111,8 @@ class Game:
         """
         Loop until window is closed.
         """
+        # Draw before sleeping until the first input
+        self.draw()
         while True:
             self.event_loop()
             self.update()
@@ -96,7 +125,13 @@ class Game:
         Events include mouse clicks
         and keyboard presses.
         """
-        events = pygame.event.get()
+        is_turn = self.gamestate.is_players_turn(self.player_num)
+        events = self.frames.next_frame(PLAYING_FPS if is_turn else WAITING_FPS,
+                                        self.frame_timeout())
+        self.mouse_position = pygame.mouse.get_pos()
+        if window_exposed(events):
+            self.map.invalidate()
+
         for event in events:
 
             # Client closes window
@@ -125,26 +160,31 @@ class Game:
         """
         Update variables that change every frame.
         """
-        self.time = self.clock.tick(60)
-        self.mouse_position = pygame.mouse.get_pos()
-
+        # Take in replies and events that arrived since last frame
+        self.network.poll()
+
+        # Lost the server, such as when it restarted
+        if self.network.connection_lost:
+            self.reconnect()
+            return
+
+        if self.network.subscribed:
+            # Handle all that was pushed, even on our turn, since the
+            # loop sleeps until something else arrives
+            event = self.network.get_event()
+            while event:
+                self.handle_event(*event)
+                event = self.network.get_event()
         # Other player's turn
-        if not self.gamestate.is_players_turn(self.player_num):
-            rps_in_session = self.network.check_for_rps()
-            if rps_in_session:
-                winner = self.map.rps_loop("defender")
-                # Block attack
-                if winner == self.player_num:
-                    self.turn["result"] = "block"
-            players_turn = self.network.request_turn()
-            if players_turn == self.player_num:
-                self.update_gamestate()
-                self.turn["phase"] = SELECT_UNIT_TO_MOVE
+        elif not self.gamestate.is_players_turn(self.player_num):
+            self.poll_server()
 
         # Check if turn ended
         if self.turn["phase"] == END_TURN:
-            # Send moves and attacks made to server
-            self.network.send_turn(self.turn)
+            # Send moves and attacks made to server, carrying on
+            # without waiting for it to accept them
+            self.network.request("send_turn", dict(self.turn),
+                                 callback=self.receive_turn_reply)
             self.gamestate.change_turns()
             self.turn["phase"] = NOT_TURN
 
@@ -152,67 +192,204 @@ class Game:
         if self.gamestate.game_is_over:
             self.gameover()
 
-    def update_gamestate(self):
+    def frame_timeout(self):
         """
-        Pull in new information from server and apply changes.
+        Returns:
+            {int} -- Most milliseconds to sleep before the next frame,
+                     or None to sleep until input or network activity
         """
-        new_gamestate = self.network.get_gamestate()
-
-        self.update_health(new_gamestate)
-        self.update_positions(new_gamestate)
+        if self.network.connection_lost:
+            if self.reconnecting:
+                # The reply wakes the loop
+                return None
+            return self.next_reconnect - pygame.time.get_ticks()
+        if not (self.network.subscribed or self.gamestate.is_players_turn(self.player_num)):
+            # Nothing is pushed, so ask the server now and then
+            return POLL_INTERVAL
+        return None
+
+    def reconnect(self):
+        """
+        Try to take our seat back, and catch up with
+        the server's gamestate if it works.
+        """
+        if self.reconnecting or pygame.time.get_ticks() < self.next_reconnect:
+            return
+        self.reconnecting = True
+        self.network.request("reconnect", callback=self.receive_reconnect)
+
+    def receive_reconnect(self, reconnected):
+        self.reconnecting = False
+        if not reconnected:
+            # Server isn't back yet
+            self.next_reconnect = pygame.time.get_ticks() + RECONNECT_DELAY
+            return
+        self.update_gamestate(self.resume_turn)
+
+    def resume_turn(self):
+        """
+        Picks the turn phase back up after reconnecting.
+        """
+        if self.gamestate.is_players_turn(self.player_num):
+            # A turn sent before the server went down may be lost
+            if self.turn["phase"] == NOT_TURN:
+                self.turn["phase"] = SELECT_UNIT_TO_MOVE
+        else:
+            self.turn["phase"] = NOT_TURN
 
-        self.turn["attack"] = None
+    def receive_turn_reply(self, accepted):
+        if not accepted and not self.network.connection_lost:
+            # The server kept the turn with us; undo
+            # what it didn't accept and play it again
+            self.network.request("get_gamestate", callback=self.restore_turn)
+
+    def restore_turn(self, gamestate):
+        if gamestate is None:
+            return
+        self.gamestate = gamestate
+        self.map.sync(gamestate)
         self.turn["move"] = None
+        self.turn["attack"] = None
+        self.resume_turn()
 
-        self.gamestate = new_gamestate
+    def poll_server(self):
+        """
+        Ask the server whether the enemy started rock
+        paper scissors or ended their turn.
+        """
+        if self.polling or pygame.time.get_ticks() < self.next_poll:
+            return
+        self.polling = True
+        self.next_poll = pygame.time.get_ticks() + POLL_INTERVAL
+        self.network.request("check_for_rps", callback=self.receive_rps_check)
+
+    def receive_rps_check(self, rps_in_session):
+        if rps_in_session:
+            winner = self.map.rps_loop("defender")
+            # Block attack
+            if winner == self.player_num:
+                self.turn["result"] = "block"
+        self.network.request("request_turn", callback=self.receive_turn)
+
+    def receive_turn(self, players_turn):
+        if players_turn == self.player_num:
+            self.update_gamestate(self.start_turn)
+        else:
+            self.polling = False
 
-    def update_health(self, new_gamestate):
+    def start_turn(self):
+        self.polling = False
+        self.turn["phase"] = SELECT_UNIT_TO_MOVE
+
+    def handle_event(self, name, value):
+        """
+        React to an event pushed by the server.
         """
-        Update units with any health changes.
+        if name == RPS_START_EVENT:
+            winner = self.map.rps_loop("defender")
+            # Block attack
+            if winner == self.player_num:
+                self.turn["result"] = "block"
+        elif name == TURN_EVENT:
+            if value == self.player_num:
+                self.update_gamestate(self.start_turn)
+        elif name == GAME_OVER_EVENT:
+            self.update_gamestate()
+
+    def update_gamestate(self, then=None):
         """
-        if new_gamestate.unit_health != self.gamestate.unit_health:
-            for unit_type, health in new_gamestate.unit_health.items():
-                unit = self.map.get_unit_by_type(unit_type)
-                if unit:
-                    if unit.health != health:
-                        unit.change_health(health)
-                        if not unit.is_alive:
-                            self.map.kill_unit(unit)
-                            self.turn["result"] = "kill"
-                        else:
-                            self.turn["result"] = "damage"
+        Pull in new information from server and apply changes.
 
-    def update_positions(self, new_gamestate):
+        The changes arrive on a later frame. Once they are
+        applied, then() is called, if given.
+        """
+        self.network.request("get_changes",
+                             callback=functools.partial(self.receive_changes, then))
+
+    def receive_changes(self, then, changes):
+        if changes is None:
+            # Too far behind; diff against a full gamestate
+            self.network.request("get_gamestate",
+                                 callback=functools.partial(self.receive_full_gamestate, then))
+            return
+        self.apply_changes(changes)
+        self.gamestate_updated(then)
+
+    def receive_full_gamestate(self, then, new_gamestate):
+        if new_gamestate is not None:
+            # Moves and kills made on the map may never have reached
+            # the server, so the map is rebuilt rather than patched
+            self.map.sync(new_gamestate)
+            self.gamestate = new_gamestate
+        self.gamestate_updated(then)
+
+    def gamestate_updated(self, then):
+        self.turn["attack"] = None
+        self.turn["move"] = None
+        if then:
+            then()
+
+    def apply_changes(self, changes):
+        """
+        Apply changes received from the server
+        to the map and the local gamestate.
+        """
+        for kind, target, a, b in changes:
+            if kind == UNIT_MOVED:
+                unit = self.map.get_unit_by_type(target)
+                self.map.move(unit, a, b)
+            elif kind == HEALTH_CHANGED:
+                self.update_unit_health(target, a)
+            self.gamestate.apply_change(kind, target, a, b)
+
+    def update_unit_health(self, unit_type, health):
         """
-        Update units with changes in position.
+        Set a unit's health, removing it from the map if it died.
         """
-        if new_gamestate.unit_locations != self.gamestate.unit_locations:
-            # Update map with any moved units
-            for unit_type, location in new_gamestate.unit_locations.items():
-                if location:
-                    col, row = location
-                    unit = self.map.get_unit_by_type(unit_type)
-                    self.map.move(unit, col, row)
+        unit = self.map.get_unit_by_type(unit_type)
+        if unit:
+            if unit.health != health:
+                unit.change_health(health)
+                if not unit.is_alive:
+                    self.map.kill_unit(unit)
+                    self.turn["result"] = "kill"
+                else:
+                    self.turn["result"] = "damage"
 
     def draw(self):
         """
         Draw graphics and display on screen.
+
+        The whole window is only drawn when the statistics or help
+        change, or something was drawn over it. Otherwise just the
+        map tiles that changed are drawn and updated.
         """
-        self.screen.fill(colors.lightgray)
+        hud = (self.gamestate.is_players_turn(self.player_num), self.turn["phase"],
+               tuple((unit.type, unit.health) for unit in self.map.all_units))
+        if hud != self.drawn_hud or self.map.drawn_tiles is None:
+            self.screen.fill(colors.lightgray)
 
-        # Display player statistics and help
-        self.display_statistics()
-        self.display_help()
+            # Display player statistics and help
+            self.display_statistics()
+            self.display_help()
 
-        # Display game board
-        self.map.draw()
+            # Display game board
+            self.map.invalidate()
+            self.map.draw()
 
-        pygame.display.update()
+            pygame.display.update()
+            self.drawn_hud = hud
+        else:
+            dirty_rects = self.map.draw()
+            if dirty_rects:
+                pygame.display.update(dirty_rects)
 
         # Display attack result
         if self.turn["result"] and self.turn["phase"] != END_TURN:
             self.map.display_attack_result(self.turn["result"])
             self.turn["result"] = None
+            # Take the popup down without waiting for another frame
+            self.draw()
 
     def display_statistics(self):
         """
@@ -225,9 +402,6 @@ class Game:
         # Font size is equal to line spacing 
         SIZE = 16
 
-        font = pygame.font.Font(GAME_FONT, SIZE)
-        turn_font = pygame.font.Font(GAME_FONT, SIZE+10)
-
         # Display player turn
         is_turn = self.gamestate.is_players_turn(self.player_num)
         turn_text = ""
@@ -238,7 +412,7 @@ class Game:
         else:
             turn_text = "Enemy Turn"
             text_color = colors.darkred
-        textsurface = turn_font.render(turn_text, False, text_color)
+        textsurface = render_text(turn_text, SIZE+10, text_color)
         text_rect = textsurface.get_rect(center=[WINDOW_WIDTH/2, SIZE*3])
         self.screen.blit(textsurface, text_rect)
 
@@ -246,47 +420,47 @@ class Game:
         if self.player_num == 1:
             # Display "Unit Information"
             location = [20, SIZE*5]  # Beginning of unit info.
-            textsurface = font.render("Your Health", False, colors.white)
+            textsurface = render_text("Your Health", SIZE, colors.white)
             self.screen.blit(textsurface, location)
             for unit in self.map.players_units:
                 # Increment vertical placement
                 location[1] += SIZE + 8
                 health = str(unit.health)
-                textsurface = font.render(unit.archetype + ": " + health, False, unit.color)
+                textsurface = render_text(unit.archetype + ": " + health, SIZE, unit.color)
                 self.screen.blit(textsurface, location)
 
             # Display "Enemy Unit Information"
             location = [self.screen.get_width() - 150, SIZE*5]  # Beginning of unit info.
-            textsurface = font.render("Enemy Health", False, colors.white)
+            textsurface = render_text("Enemy Health", SIZE, colors.white)
             self.screen.blit(textsurface, location)
             for unit in self.map.enemy_units:
                 # Increment vertical placement
                 location[1] += SIZE + 8
                 health = str(unit.health)
-                textsurface = font.render(unit.archetype + ": " + health, False, unit.color)
+                textsurface = render_text(unit.archetype + ": " + health, SIZE, unit.color)
                 self.screen.blit(textsurface, location)
 
         elif self.player_num == 2:
              # Display "Unit Information"
             location = [self.screen.get_width() - 150, SIZE*5]  # Beginning of unit info.
-            textsurface = font.render("Your Health", False, colors.white)
+            textsurface = render_text("Your Health", SIZE, colors.white)
             self.screen.blit(textsurface, location)
             for unit in self.map.players_units:
                 # Increment horizontal placement
                 location[1] += SIZE + 8
                 health = str(unit.health)
-                textsurface = font.render(unit.archetype + ": " + health, False, unit.color)
+                textsurface = render_text(unit.archetype + ": " + health, SIZE, unit.color)
                 self.screen.blit(textsurface, location)
 
             # Display "Enemy Information"
             location = [20, SIZE*5]  # Beginning of unit info.
-            textsurface = font.render("Enemy Health", False, colors.white)
+            textsurface = render_text("Enemy Health", SIZE, colors.white)
             self.screen.blit(textsurface, location)
             for unit in self.map.enemy_units:
                 # Increment horizontal placement
                 location[1] += SIZE + 8
                 health = str(unit.health)
-                textsurface = font.render(unit.archetype + ": " + health, False, unit.color)
+                textsurface = render_text(unit.archetype + ": " + health, SIZE, unit.color)
                 self.screen.blit(textsurface, location)
 
     def display_help(self):
@@ -295,7 +469,6 @@ class Game:
         """
         LOCATION = [0,WINDOW_HEIGHT-25]
         SIZE = 12
-        font = pygame.font.Font(GAME_FONT, SIZE)
         phase_text = ""
         
         # Change help text based on phase
@@ -308,7 +481,7 @@ class Game:
         elif self.turn["phase"] == NOT_TURN:
             phase_text = "HELP: Wait for your enemy to make their move."
 
-        textsurface = font.render(phase_text, False, colors.white)
+        textsurface = render_text(phase_text, SIZE, colors.white)
         self.screen.blit(textsurface, LOCATION)
         
     def waiting_screen(self):
@@ -316,40 +489,62 @@ class Game:
         Display a waiting message until
         other client connects.
         """
-        self.network.send_command("start")
-        reply = self.network.receive()
-        self.gamestate = self.network.get_gamestate()
+        self.network.request("start")
 
+        events = []
+        drawn = False
         while not self.gamestate.ready():
             # Update events so window can be closed
-            events = pygame.event.get()
             for event in events:
                 if event.type == pygame.QUIT:
                     self.exit_game()
 
-            # Display waiting text
-            self.screen.fill(colors.darkgray)
-            textsurface = self.game_font.render("Waiting for player 2...", False, colors.white)
-            text_rect = textsurface.get_rect(center=(WINDOW_CENTER))
-            self.screen.blit(textsurface, text_rect)
-            pygame.display.update()
+            # Display waiting text, which only needs drawing again
+            # if the window was uncovered
+            if not drawn or window_exposed(events):
+                self.screen.fill(colors.darkgray)
+                textsurface = render_text("Waiting for player 2...", 40, colors.white)
+                text_rect = textsurface.get_rect(center=(WINDOW_CENTER))
+                self.screen.blit(textsurface, text_rect)
+                pygame.display.update()
+                drawn = True
 
             # Update gamestate to check if other player is connected
-            self.gamestate = self.network.get_gamestate()
+            self.network.poll()
+            self.fetch_gamestate()
+            events = self.frames.next_frame(WAITING_FPS, POLL_INTERVAL)
+
+    def fetch_gamestate(self):
+        """
+        Asks for a full gamestate, unless one is on its way
+        or was asked for less than POLL_INTERVAL ago.
+        """
+        if not self.fetching_gamestate and pygame.time.get_ticks() >= self.next_fetch:
+            self.fetching_gamestate = True
+            self.next_fetch = pygame.time.get_ticks() + POLL_INTERVAL
+            self.network.request("get_gamestate", callback=self.receive_gamestate)
+
+    def receive_gamestate(self, gamestate):
+        self.fetching_gamestate = False
+        if gamestate is not None:
+            self.gamestate = gamestate
 
     def gameover(self):
         """
         Gameover loop. 
         TODO: Allow clients to restart game.
         """
-        self.network.send_turn(self.turn)
+        events = []
+        drawn_gamestate = None
         # Loop until player resets or quits
         while True:
 
-            # Show text and how to reset
-            self.display_endgame_results()
+            # Show text and how to reset, again only
+            # for a new gamestate or an uncovered window
+            if self.gamestate is not drawn_gamestate or window_exposed(events):
+                self.display_endgame_results()
+                drawn_gamestate = self.gamestate
 
-            events = pygame.event.get()
             for event in events:
                 if event.type == pygame.QUIT:
                     self.exit_game()
@@ -358,12 +553,14 @@ class Game:
                 if event.type == pygame.KEYDOWN:
                     if event.key == pygame.K_SPACE:
                         # Tell server that you're ready
-                        self.network.send_command("start")
+                        self.network.request("start")
                     elif event.key == pygame.K_ESCAPE:
                         self.exit_game()
 
             # Update gamestate to check if other player is ready
-            self.gamestate = self.network.get_gamestate()
+            self.network.poll()
+            self.fetch_gamestate()
+            events = self.frames.next_frame(WAITING_FPS, POLL_INTERVAL)
 
         # Clear the map
         self.map.reset()    
@@ -381,9 +578,9 @@ class Game:
 
         # Show results
         if self.gamestate.winner == self.player_num:
-            textsurface = self.game_font.render("You won!", False, colors.darkgreen)
+            textsurface = render_text("You won!", 40, colors.darkgreen)
         else:
-            textsurface = self.game_font.render("You lost...", False, colors.darkred)
+            textsurface = render_text("You lost...", 40, colors.darkred)
         text_rect = textsurface.get_rect(center=(WINDOW_CENTER))
         self.screen.blit(textsurface, text_rect)
 
@@ -3,7 +3,11 @@ File: gamestate.py
 Programmers: Fernando Rodriguez, Charles Davis
 
 """
+import collections
+
 from src.constants import *
+from src.rules import START_TILES, UNIT_TYPES
+from src.zobrist import HEALTH_KEYS, TURN_KEY, UNIT_KEYS
 
 class GameState:
 
@@ -26,11 +30,22 @@ class GameState:
             1 : None,
             2 : None
         }
+        # Players told who won the hands above
+        self.told_rps_winner = set()
 
         self.game_is_over = False
         self.winner = None
         self.playing_rps = False
 
+        # Incremented on every change. Recent changes are kept
+        # as (version, kind, target, a, b) so clients can catch up
+        self.version = 0
+        self.changes = collections.deque(maxlen=CHANGE_HISTORY)
+
+        # Zobrist hash of unit locations, health and turn,
+        # equal for equal positions (see zobrist.py)
+        self.rehash()
+
     def is_players_turn(self, player_num):
         return self.turn[player_num]
 
@@ -47,19 +62,96 @@ class GameState:
     def change_turns(self):
         self.turn[1] = not self.turn[1]
         self.turn[2] = not self.turn[2]
+        self.hash ^= TURN_KEY
+        self.record_change(TURN_CHANGED, self.get_turn())
 
     def move_unit(self, move):
         # move is [unit_type, col, row]
         unit_type, col, row = move
-        self.unit_locations[unit_type] = [col, row]
+        self.apply_change(UNIT_MOVED, unit_type, col, row)
+        self.record_change(UNIT_MOVED, unit_type, col, row)
 
     def attack_unit(self, attack):
         # attack is [unit_type, attack_power] where unit_type is the unit being attacked
         unit_type, attack_power = attack
-        self.unit_health[unit_type] -= attack_power
-        if self.unit_health[unit_type] <= 0:
-            self.unit_health[unit_type] = 0
-            self.unit_locations[unit_type] = None
+        health = max(self.unit_health[unit_type] - attack_power, 0)
+        self.apply_change(HEALTH_CHANGED, unit_type, health)
+        self.record_change(HEALTH_CHANGED, unit_type, health)
+
+    def apply_change(self, kind, target, a=0, b=0):
+        """
+        Applies one change record without recording it.
+
+        Arguments:
+            kind {int} -- UNIT_MOVED, HEALTH_CHANGED, TURN_CHANGED or WINNER_SET
+            target {int} -- Unit type for unit changes, otherwise player number
+            a {int} -- Column for UNIT_MOVED, health for HEALTH_CHANGED
+            b {int} -- Row for UNIT_MOVED
+        """
+        if kind == UNIT_MOVED:
+            if self.unit_health[target] > 0:
+                keys = UNIT_KEYS[target]
+                self.hash ^= keys[self.get_tile(target)] ^ keys[b * GRID_COLUMNS + a]
+            self.unit_locations[target] = [a, b]
+        elif kind == HEALTH_CHANGED:
+            health = self.unit_health[target]
+            keys = HEALTH_KEYS[target]
+            self.hash ^= keys[health] ^ keys[max(a, 0)]
+            if health > 0 and a <= 0:
+                self.hash ^= UNIT_KEYS[target][self.get_tile(target)]
+            self.unit_health[target] = a
+            if a <= 0:
+                self.unit_locations[target] = None
+        elif kind == TURN_CHANGED:
+            if target != self.get_turn():
+                self.hash ^= TURN_KEY
+            self.turn[1] = target == 1
+            self.turn[2] = target == 2
+        elif kind == WINNER_SET:
+            self.winner = target
+            self.game_is_over = True
+
+    def get_tile(self, unit_type):
+        """
+        Returns:
+            {int} -- Tile of a living unit, see rules.py
+        """
+        location = self.unit_locations[unit_type]
+        if location:
+            return location[1] * GRID_COLUMNS + location[0]
+        # Units stand on their start tile until they first move
+        return START_TILES[unit_type]
+
+    def rehash(self):
+        """
+        Computes the hash from scratch, for after
+        fields are set directly.
+        """
+        position_hash = TURN_KEY if self.turn[2] else 0
+        for unit_type, health in self.unit_health.items():
+            if health > 0:
+                position_hash ^= HEALTH_KEYS[unit_type][health]
+                position_hash ^= UNIT_KEYS[unit_type][self.get_tile(unit_type)]
+            else:
+                position_hash ^= HEALTH_KEYS[unit_type][0]
+        self.hash = position_hash
+
+    def record_change(self, kind, target, a=0, b=0):
+        self.version += 1
+        self.changes.append((self.version, kind, target, a, b))
+
+    def changes_since(self, version):
+        """
+        Returns the changes made after the given version.
+
+        Returns:
+            {list} -- (kind, target, a, b) records, oldest first, or None
+                      if they are no longer all kept
+        """
+        missing = self.version - version
+        if missing < 0 or missing > len(self.changes):
+            return None
+        return [change[1:] for change in list(self.changes)[len(self.changes) - missing:]]
 
     def set_ready(self, player_num):
         self.ready_state[player_num] = True
@@ -90,59 +182,39 @@ class GameState:
             self.winner = 1
             game_is_over = True
 
-        if game_is_over:
+        if game_is_over and not self.game_is_over:
             self.game_is_over = True
+            self.record_change(WINNER_SET, self.winner)
 
     def set_hand(self, player_num, hand):
         self.hands[player_num] = hand
 
-    def determine_rps_winner(self, winner_cache=[]):
+    def determine_rps_winner(self, player_num):
         """
         See who won the game of rock paper scissors!
 
-        If it returns 0, both haven't played yet.
-        Ties go to the winner.
+        If it returns 0, both haven't played yet. Hands are
+        cleared once both players have been told the winner.
         """
-
-        # If both haven't played, there's no winner yet
-        both_have_played = True
-        for hand in self.hands.values():
-            if not hand:
-                both_have_played = False
-
-        winner = 0
-        if both_have_played:
-            # Check if winner has already been calculated
-            if winner_cache:
-                # Both have played, so remove their plays
-                self.hands[1] = None
-                self.hands[2] = None
-                return winner_cache.pop()
-
-            # Winning conditions
-            if self.hands[1] == self.hands[2]:
-                # Tie
-                winner = 3
-            elif self.hands[1] == ROCK:
-                if self.hands[2] == PAPER:
-                    winner = 2
-                elif self.hands[2] == SCISSORS:
-                    winner = 1
-            elif self.hands[1] == PAPER:
-                if self.hands[2] == SCISSORS:
-                    winner = 2
-                elif self.hands[2] == ROCK:
-                    winner = 1
-            elif self.hands[1] == SCISSORS:
-                if self.hands[2] == ROCK:
-                    winner = 2
-                elif self.hands[2] == PAPER:
-                    winner = 1 
-
-            winner_cache.append(winner)
-
+        winner = self.rps_result()
+        if winner:
+            self.told_rps_winner.add(player_num)
+            if len(self.told_rps_winner) == 2:
+                self.clear_rps_hands()
         return winner
 
+    def rps_result(self):
+        """
+        Returns the winner of the hands played so far
+        without clearing them. 0 if a hand is missing,
+        3 on a tie.
+        """
+        hand_1 = self.hands[1]
+        hand_2 = self.hands[2]
+        if not (hand_1 and hand_2):
+            return 0
+        return RPS_OUTCOMES[hand_1 - 1][hand_2 - 1]
+
     def rps_in_session(self):
         """
         Returns true if rock paper scissors game
@@ -158,10 +230,20 @@ class GameState:
     def clear_rps_hands(self):
         self.hands[1] = None
         self.hands[2] = None
+        self.told_rps_winner.clear()
 
     def reset(self):
         self.unit_locations = self.initialize_locations()
         self.unit_health = self.initialize_health()
+        self.game_is_over = False
+        self.winner = None
+        self.clear_rps_hands()
+        self.rehash()
+
+        # Reset can't be expressed as changes, so
+        # clients must fetch a full snapshot
+        self.version += 1
+        self.changes.clear()
 
         # Set both players to not ready
         for player in self.ready_state.keys():
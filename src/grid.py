@@ -3,19 +3,15 @@ File: grid.py
 Programmers: Fernando Rodriguez, Charles Davis
 
 """
-import pygame
-
-import src.colors as colors
 from src.constants import *
-from src.unit import Unit
 
 class Grid:
     """
     Data structure representing the game
     board and the state of each tile.
 
-    Every tile contains a list of two
-    values: [tile_type, unit_type]
+    Every tile has two values, stored in two
+    flat bytearrays at index row * cols + col:
 
     tile_type {int} --
         0 is blank
@@ -34,18 +30,24 @@ class Grid:
         6 is player2, unit3
     """
 
-    def __init__(self):
+    __slots__ = ("cols", "rows", "tile_types", "unit_types")
+
+    def __init__(self, cols=GRID_COLUMNS, rows=GRID_ROWS):
         """
         Set up tile grid and units.
+
+        Keyword Arguments:
+            cols {int} -- Number of columns (default: {GRID_COLUMNS})
+            rows {int} -- Number of rows (default: {GRID_ROWS})
         """
-        # Create grid data structure.
-        # Each element of the grid contains
-        # two values: [tile_type, unit_type].
-        # Both are ints; [0, 0] means the tile
-        # is blank and no unit is present.
-        self.cols = GRID_COLUMNS
-        self.rows = GRID_ROWS
-        self.grid = [[[0, 0] for j in range(self.cols)] for i in range(self.rows)]
+        self.cols = cols
+        self.rows = rows
+        self.tile_types = bytearray(cols * rows)
+        self.unit_types = bytearray(cols * rows)
+
+    def missing_tile(self, col, row):
+        print("[Error]: Tile at Column: {0} Row: {1} doesn't exist.".format(col, row))
+        return -1
 
     def tile_in_move_range(self, col, row):
         return self.get_tile_type(col, row) == MOVABLE
@@ -64,13 +66,10 @@ class Grid:
         Keyword Arguments:
             tile_type {int} -- 0=blank, 1=health, 2=harm (default: {0})
         """
-
-        try:
-            self.grid[row][col][0] = tile_type
-        except IndexError as e:
-            print("[Error]: Tile at Column: {0} Row: {1} doesn't exist.".format(
-                col, row))
-            print("       ", e)
+        if 0 <= col < self.cols and 0 <= row < self.rows:
+            self.tile_types[row * self.cols + col] = tile_type
+        else:
+            self.missing_tile(col, row)
 
     def get_tile_type(self, col, row):
         """
@@ -84,14 +83,9 @@ class Grid:
             int -- The tile_type of given tile
                    Will be -1 if tile doesn't exist
         """
-
-        try:
-            return self.grid[row][col][0]
-        except IndexError as e:
-            print("[Error]: Tile at Column: {0} Row: {1} doesn't exist.".format(
-                col, row))
-            print("       ", e)
-            return -1
+        if 0 <= col < self.cols and 0 <= row < self.rows:
+            return self.tile_types[row * self.cols + col]
+        return self.missing_tile(col, row)
 
     def get_unit_type(self, col, row):
         """
@@ -105,13 +99,9 @@ class Grid:
             int -- The unit_type at a given tile
                    Will be -1 if tile doesn't exist
         """
-        try:
-            return self.grid[row][col][1]
-        except IndexError as e:
-            print("[Error]: Tile at Column: {0} Row: {1} doesn't exist.".format(
-                col, row))
-            print("       ", e)
-            return -1
+        if 0 <= col < self.cols and 0 <= row < self.rows:
+            return self.unit_types[row * self.cols + col]
+        return self.missing_tile(col, row)
 
     def set_unit_type(self, col, row, unit_type):
         """
@@ -122,10 +112,42 @@ class Grid:
             row {int} -- The row of the tile
             unit_type {int} -- 0=blank, 1-3=player1, 4-6=player2
         """
+        if 0 <= col < self.cols and 0 <= row < self.rows:
+            self.unit_types[row * self.cols + col] = unit_type
+        else:
+            self.missing_tile(col, row)
+
+    def fill(self, tile_type=BLANK):
+        """
+        Gives every tile the same tile type, leaving units alone.
+        """
+        self.tile_types[:] = bytes([tile_type]) * len(self.tile_types)
 
-        try:
-            self.grid[row][col][1] = unit_type
-        except IndexError as e:
-            print("[Error]: Tile at Column: {0} Row: {1} doesn't exist.".format(
-                col, row))
-            print("       ", e)
\ No newline at end of file
+    def copy(self):
+        """
+        Returns:
+            {Grid} -- A new grid with the same tiles and units
+        """
+        grid = Grid.__new__(Grid)
+        grid.cols = self.cols
+        grid.rows = self.rows
+        grid.tile_types = self.tile_types[:]
+        grid.unit_types = self.unit_types[:]
+        return grid
+
+    def snapshot(self):
+        """
+        Returns:
+            {bytes} -- Tile types followed by unit types, for restore()
+        """
+        return bytes(self.tile_types + self.unit_types)
+
+    def restore(self, snapshot):
+        """
+        Puts back the tiles and units saved by snapshot().
+        """
+        size = self.cols * self.rows
+        if len(snapshot) != 2 * size:
+            raise ValueError("Snapshot is from a grid of another size")
+        self.tile_types[:] = snapshot[:size]
+        self.unit_types[:] = snapshot[size:]
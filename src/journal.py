@@ -0,0 +1,343 @@
+"""
+File: journal.py
+Programmers: Fernando Rodriguez, Charles Davis
+
+Append-only binary journal of a match, and a reader that can
+rebuild the gamestate at any turn.
+
+Layout (unsigned, big-endian):
+    header    -- magic b"GOSJ", journal version, codec version,
+                 snapshot interval (2 bytes)
+    then records, each a kind byte followed by:
+        TURN      -- player, then a turn in codec's turn layout
+        RPS       -- hand 1, hand 2, winner (3 on tie)
+        SNAPSHOT  -- turns played so far (4 bytes), then a
+                     gamestate in codec's snapshot layout
+    then, once the journal is closed:
+        INDEX     -- snapshot count (4 bytes), then turns played
+                     and file offset of each snapshot (4 bytes each)
+        footer    -- offset of the index, turns played (4 bytes
+                     each), magic b"GOSI"
+
+A snapshot is taken when the journal starts, every snapshot
+interval turns and after a reset, so rebuilding the gamestate at
+a turn loads the closest snapshot before it and replays at most
+an interval of turns. The reader of a closed journal finds the
+snapshots through the index at its end. Otherwise it hops from
+record to record, which it can do without parsing them since
+every record of a kind has the same size.
+
+Records are buffered in memory. While an event loop is running,
+as on the server, a task writes them out in an executor thread at
+most FLUSH_DELAY seconds after they were recorded, so a crash only
+loses the last moments of each open match. Without an event loop
+they are written once the buffer fills up or the journal is closed.
+
+"""
+import asyncio
+import bisect
+import mmap
+import struct
+
+from src.codec import (CODEC_VERSION, GAMESTATE_FORMAT, TURN_FORMAT, decode_gamestate,
+                       decode_turn, encode_gamestate, encode_turn)
+from src.rules import Rules
+
+MAGIC = b"GOSJ"
+
+# Bumped whenever the layout changes
+JOURNAL_VERSION = 1
+
+HEADER = struct.Struct("!4sBBH")
+
+INDEX_MAGIC = b"GOSI"
+
+FOOTER = struct.Struct("!II4s")
+
+# Record kinds
+TURN_RECORD = 1
+RPS_RECORD = 2
+SNAPSHOT_RECORD = 3
+INDEX_RECORD = 4
+
+TURN_RECORD_FORMAT = struct.Struct("!BB" + str(TURN_FORMAT.size) + "s")
+RPS_RECORD_FORMAT = struct.Struct("!B3B")
+SNAPSHOT_RECORD_FORMAT = struct.Struct("!BI" + str(GAMESTATE_FORMAT.size) + "s")
+INDEX_HEADER = struct.Struct("!BI")
+INDEX_ENTRY = struct.Struct("!II")
+
+RECORD_SIZES = {
+    TURN_RECORD: TURN_RECORD_FORMAT.size,
+    RPS_RECORD: RPS_RECORD_FORMAT.size,
+    SNAPSHOT_RECORD: SNAPSHOT_RECORD_FORMAT.size
+}
+
+# Turns between snapshots
+SNAPSHOT_INTERVAL = 32
+
+# Bytes buffered before they are written
+BUFFER_SIZE = 64 * 1024
+
+# Seconds records wait in the buffer while an event loop is running
+FLUSH_DELAY = 1.0
+
+# Tasks writing journals; the loop only keeps weak references
+write_tasks = set()
+
+class Journal:
+    """
+    Records the accepted turns and rock paper scissors
+    results of one match.
+    """
+
+    def __init__(self, path, gamestate, snapshot_interval=SNAPSHOT_INTERVAL,
+                 buffer_size=BUFFER_SIZE, flush_delay=FLUSH_DELAY):
+        """
+        Arguments:
+            path {str} -- File to write, replaced if it exists
+            gamestate {GameState} -- The match's gamestate, snapshotted as it is now
+
+        Keyword Arguments:
+            snapshot_interval {int} -- Turns between snapshots (default: {SNAPSHOT_INTERVAL})
+            buffer_size {int} -- Bytes buffered before writing (default: {BUFFER_SIZE})
+            flush_delay {float} -- Seconds records wait while an event
+                                   loop is running (default: {FLUSH_DELAY})
+        """
+        self.path = path
+        self.gamestate = gamestate
+        self.snapshot_interval = snapshot_interval
+        self.buffer_size = buffer_size
+        self.flush_delay = flush_delay
+        self.turn_count = 0
+
+        # Bytes taken out of the buffer to be written so far,
+        # and (turns played, offset) of each snapshot
+        self.size = 0
+        self.snapshots = []
+
+        self.buffer = bytearray(HEADER.pack(MAGIC, JOURNAL_VERSION, CODEC_VERSION,
+                                            snapshot_interval))
+        # Start a new file on the first write
+        self.mode = "wb"
+        # Task writing the buffer, and whether the index was recorded
+        self.write_task = None
+        self.closed = False
+        self.record_snapshot()
+
+    def record_turn(self, player_num, turn):
+        """
+        Appends a turn that was applied to the gamestate.
+        """
+        self.buffer += TURN_RECORD_FORMAT.pack(TURN_RECORD, player_num, encode_turn(turn))
+        self.turn_count += 1
+        if not self.turn_count % self.snapshot_interval:
+            self.record_snapshot()
+        else:
+            self.schedule_write()
+
+    def record_rps(self, hand_1, hand_2, winner):
+        self.buffer += RPS_RECORD_FORMAT.pack(RPS_RECORD, hand_1, hand_2, winner)
+        self.schedule_write()
+
+    def record_snapshot(self):
+        """
+        Appends the gamestate as it is now, such as after a reset.
+        """
+        self.snapshots.append((self.turn_count, self.size + len(self.buffer)))
+        self.buffer += SNAPSHOT_RECORD_FORMAT.pack(SNAPSHOT_RECORD, self.turn_count,
+                                                   encode_gamestate(self.gamestate))
+        self.schedule_write()
+
+    def schedule_write(self):
+        """
+        Has the buffer written by a task if an event loop is running,
+        or right away if there is none and the buffer is full or
+        the journal closed.
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            if len(self.buffer) >= self.buffer_size or self.closed:
+                self.flush()
+            return
+        if self.write_task is None:
+            self.write_task = loop.create_task(self.write_batches())
+            write_tasks.add(self.write_task)
+            self.write_task.add_done_callback(write_tasks.discard)
+
+    async def write_batches(self):
+        """
+        Writes the buffer in an executor thread until there is
+        nothing left, after waiting flush_delay seconds for more
+        records unless the journal was closed.
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            while self.buffer:
+                if not self.closed:
+                    await asyncio.sleep(self.flush_delay)
+                data = bytes(self.buffer)
+                self.size += len(data)
+                self.buffer.clear()
+                await loop.run_in_executor(None, self.write, data)
+        finally:
+            self.write_task = None
+
+    def flush(self):
+        """
+        Writes out buffered records. Only used without an event
+        loop, as a write task may be running otherwise.
+        """
+        if not self.buffer:
+            return
+        self.size += len(self.buffer)
+        self.write(bytes(self.buffer))
+        self.buffer.clear()
+
+    def write(self, data):
+        # Runs in an executor thread while an event loop is running
+        with open(self.path, self.mode) as journal_file:
+            journal_file.write(data)
+        self.mode = "ab"
+
+    def close(self):
+        """
+        Writes out buffered records followed by the snapshot index.
+        Nothing can be recorded afterwards.
+        """
+        self.closed = True
+        index_offset = self.size + len(self.buffer)
+        self.buffer += INDEX_HEADER.pack(INDEX_RECORD, len(self.snapshots))
+        for snapshot in self.snapshots:
+            self.buffer += INDEX_ENTRY.pack(*snapshot)
+        self.buffer += FOOTER.pack(index_offset, self.turn_count, INDEX_MAGIC)
+        self.schedule_write()
+
+class JournalReader:
+    """
+    Reads a journal written by Journal through a
+    memory map, so only the pages read are loaded.
+    """
+
+    def __init__(self, path):
+        """
+        Arguments:
+            path {str} -- Journal file to read
+
+        Raises:
+            ValueError -- If the file isn't a journal this version can read
+        """
+        with open(path, "rb") as journal_file:
+            self.data = mmap.mmap(journal_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self.data) < HEADER.size:
+            raise ValueError("Not a match journal")
+        magic, journal_version, codec_version, self.snapshot_interval = \
+            HEADER.unpack_from(self.data)
+        if magic != MAGIC or journal_version != JOURNAL_VERSION:
+            raise ValueError("Not a match journal")
+        if codec_version != CODEC_VERSION:
+            raise ValueError("Journal uses an unsupported codec version")
+
+        # Turns played at each snapshot and where it starts, in order
+        self.snapshot_turns = []
+        self.snapshot_offsets = []
+        if not self.read_index():
+            self.index()
+
+    def read_index(self):
+        """
+        Loads the snapshot index written when the journal was closed.
+
+        Returns:
+            {bool} -- False if the journal wasn't closed
+        """
+        data = self.data
+        if len(data) < HEADER.size + INDEX_HEADER.size + FOOTER.size:
+            return False
+        index_offset, self.turn_count, magic = FOOTER.unpack_from(data, len(data) - FOOTER.size)
+        if magic != INDEX_MAGIC:
+            return False
+
+        kind, count = INDEX_HEADER.unpack_from(data, index_offset)
+        entries = INDEX_ENTRY.iter_unpack(
+            data[index_offset + INDEX_HEADER.size:len(data) - FOOTER.size])
+        for turn_count, offset in entries:
+            self.snapshot_turns.append(turn_count)
+            self.snapshot_offsets.append(offset)
+        if kind != INDEX_RECORD or len(self.snapshot_offsets) != count:
+            raise ValueError("Corrupt journal index")
+        self.end = index_offset
+        return True
+
+    def index(self):
+        """
+        Finds every snapshot by hopping from record to record.
+        A record cut short by a crash ends the journal.
+        """
+        data = self.data
+        offset = HEADER.size
+        turn_count = 0
+        while offset < len(data):
+            kind = data[offset]
+            size = RECORD_SIZES.get(kind)
+            if size is None or offset + size > len(data):
+                break
+            if kind == TURN_RECORD:
+                turn_count += 1
+            elif kind == SNAPSHOT_RECORD:
+                self.snapshot_turns.append(turn_count)
+                self.snapshot_offsets.append(offset)
+            offset += size
+        self.turn_count = turn_count
+        self.end = offset
+
+    def records(self, offset=HEADER.size):
+        """
+        Yields (kind, values) for each record from offset on, where
+        values are (player, turn) for turns, (hand 1, hand 2, winner)
+        for rock paper scissors and (turns played, gamestate) for
+        snapshots.
+        """
+        data = self.data
+        while offset < self.end:
+            kind = data[offset]
+            if kind == TURN_RECORD:
+                _, player_num, turn = TURN_RECORD_FORMAT.unpack_from(data, offset)
+                yield kind, (player_num, decode_turn(turn))
+            elif kind == RPS_RECORD:
+                yield kind, RPS_RECORD_FORMAT.unpack_from(data, offset)[1:]
+            else:
+                _, turn_count, gamestate = SNAPSHOT_RECORD_FORMAT.unpack_from(data, offset)
+                yield kind, (turn_count, decode_gamestate(gamestate))
+            offset += RECORD_SIZES[kind]
+
+    def state_at(self, turn_index):
+        """
+        Rebuilds the gamestate after the first turn_index turns.
+
+        Returns:
+            {GameState} -- A new gamestate object
+
+        Raises:
+            IndexError -- If turn_index is outside the journal
+        """
+        if not 0 <= turn_index <= self.turn_count:
+            raise IndexError("Journal has {} turns".format(self.turn_count))
+
+        # The last snapshot at or before turn_index
+        snapshot = bisect.bisect_right(self.snapshot_turns, turn_index) - 1
+        records = self.records(self.snapshot_offsets[snapshot])
+        _, (turn_count, gamestate) = next(records)
+
+        rules = Rules(gamestate)
+        for kind, values in records:
+            if turn_count == turn_index:
+                break
+            if kind == TURN_RECORD:
+                rules.play_turn(*values)
+                turn_count += 1
+        return gamestate
+
+    def close(self):
+        self.data.close()
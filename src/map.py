@@ -13,6 +13,10 @@ import random
 # Constants
 import src.colors as colors
 from src.constants import *
+from src.fonts import render_text
+from src.frames import FrameScheduler, window_exposed
+from src.protocol import RPS_ABANDONED, RPS_WINNER_EVENT
+from src.sprites import get_unit_sprite
 
 # Classes
 from src.grid import Grid
@@ -29,7 +33,7 @@ class Map:
 
     """
 
-    def __init__(self, screen, player_num, network):
+    def __init__(self, screen, player_num, network, grid=None):
         """
         Set up tile grid and units.
 
@@ -37,7 +41,10 @@ class Map:
         Arguments:
             screen {pygame.Surface} -- The main display window
             player_num {int} -- The player identifier; 1 or 2
-            network {Network} -- Connection to the server
+            network {BackgroundNetwork} -- Connection to the server
+
+        Keyword Arguments:
+            grid {Grid} -- Board to play on, such as a BitboardGrid (default: {Grid()})
         """
 
         self.screen = screen
@@ -45,7 +52,7 @@ class Map:
         self.network = network
 
         # The grid is a 2D array with columns and rows
-        self.grid = Grid()
+        self.grid = grid or Grid()
         cols = self.grid.cols
         rows = self.grid.rows
 
@@ -67,11 +74,38 @@ class Map:
         # Create map surface
         self.surface = self.screen.subsurface(map_rect)
 
+        # (col, row) of each tile, its rect on the map surface and
+        # its rect with the margin to the right and below, which
+        # units can spill into. All indexed by row * cols + col
+        self.tile_positions = []
+        self.tile_rects = []
+        self.cell_rects = []
+        for row in range(rows):
+            for col in range(cols):
+                self.tile_positions.append((col, row))
+                x = (self.margin + self.tile_w) * col + self.margin
+                y = (self.margin + self.tile_h) * row + self.margin
+                self.tile_rects.append(pygame.Rect(x, y, self.tile_w, self.tile_h))
+                self.cell_rects.append(pygame.Rect(x, y, self.tile_w + self.margin,
+                                                   self.tile_h + self.margin))
+        # Cells relative to the window, for pygame.display.update()
+        self.window_rects = [cell.move(map_x, map_y) for cell in self.cell_rects]
+
+        # The map with every tile blank, drawn behind changed tiles
+        self.board = self.render_board()
+
+        # (tile_type, unit, hovered) of each tile as last
+        # drawn, or None if the whole map must be drawn again
+        self.drawn_tiles = None
+
         # Keep track of unit that was last clicked on
         # and last tile hovered over
         self.selected_unit = None
         self.hover_location = None
 
+        # Tiles set by highlight_tiles(), keyed by range type
+        self.highlighted_tiles = {}
+
         # Set up player units
         self.all_units = []
         self.players_units = []
@@ -80,6 +114,8 @@ class Map:
 
         # The rock paper scissors class
         self.rps = RPS(self.screen)
+        # Paces rps_loop()
+        self.frames = FrameScheduler()
         
     def handle_hover(self, mouse_position):
         """
@@ -241,11 +277,10 @@ class Map:
             tile_type = MOVABLE
         elif range_type == "attack":
             tile_type = ATTACKABLE
-        movable_list = unit.get_range(range_type, self.grid.cols, self.grid.rows)
-        for position in movable_list:
-            col = position[0]
-            row = position[1]
+        tiles = unit.get_range(range_type, self.grid.cols, self.grid.rows)
+        for col, row in tiles:
             self.grid.set_tile_type(col, row, tile_type)
+        self.highlighted_tiles[range_type] = tiles
 
     def remove_highlight(self, range_type):
         """
@@ -255,100 +290,105 @@ class Map:
             highlight_type = MOVABLE
         elif range_type == "attack":
             highlight_type = ATTACKABLE
-        for row in range(self.grid.rows):
-            for col in range(self.grid.cols):
-                tile_type = self.grid.get_tile_type(col, row)
-                if tile_type == highlight_type:
-                    self.grid.set_tile_type(col, row, 0)
+        # Only tiles highlighted by highlight_tiles() can have the type
+        for col, row in self.highlighted_tiles.pop(range_type, ()):
+            if self.grid.get_tile_type(col, row) == highlight_type:
+                self.grid.set_tile_type(col, row, 0)
+
+    def render_board(self):
+        """
+        Returns:
+            {pygame.Surface} -- The map's background and blank tiles
+        """
+        board = pygame.Surface(self.map_size, 0, self.screen)
+        board.fill(colors.white)
+        for tile_rect in self.tile_rects:
+            pygame.draw.rect(board, colors.darkgray, tile_rect)
+        return board
+
+    def invalidate(self):
+        """
+        Makes the next draw() draw the whole map, such as
+        after something else was drawn over the window.
+        """
+        self.drawn_tiles = None
 
     def draw(self):
         """
         Draw map onto surface.
-        """
 
-        self.surface.fill(colors.white)
-
-        # Loop through the grid data structure
-        for row in range(self.grid.rows):
-            for col in range(self.grid.cols):
-
-                # Get current unit and tile
-                unit_type = self.grid.get_unit_type(col, row)
-                unit = None
-                if unit_type != 0:
-                    unit = self.get_unit_by_type(unit_type)
-                tile_type = self.grid.get_tile_type(col, row)
-
-                # Determine color of tiles
-                tile_color = colors.darkgray
-                if tile_type == HEALTH:
-                    tile_color = colors.green
-                elif tile_type == HARM:
-                    tile_color = colors.purple
-                elif tile_type == MOVABLE:
-                    tile_color = colors.lightergrey
-                elif tile_type == ATTACKABLE:
-                    tile_color = colors.red
-
-                # Display tiles
-                tile_rect = pygame.draw.rect(self.surface,
-                                        tile_color,
-                                        [(self.margin + self.tile_w) * col + self.margin,
-                                         (self.margin + self.tile_h) * row + self.margin,
-                                         self.tile_w,
-                                         self.tile_h])
-
-                # Highlight hovered tile
-                if self.hover_location:
-                    if self.hover_location == (col, row):
-                        pygame.draw.rect(self.surface,
-                                     colors.get_hover_color(tile_color),
-                                     tile_rect)
-
-                # TODO: Draw units inside Unit class. Pass in tile_rect
-                # Determine unit color and shape
-                # using tile's rect as reference
-                pointlist = None
-                if unit:
-                    if unit.is_triangle():
-                        # Green triangle
-                        pointlist = [
-                            tile_rect.midtop,
-                            tile_rect.bottomleft,
-                            tile_rect.bottomright
-                        ]
-                    elif unit.is_diamond():
-                        # Red diamond
-                        pointlist = [
-                            tile_rect.midtop,
-                            tile_rect.midleft,
-                            tile_rect.midbottom,
-                            tile_rect.midright
-                        ]
-                    elif unit.is_circle():
-                        # Blue circle
-                        pos = tile_rect.center
-                        radius = tile_rect.width / 2
-
-                    # Draw unit
-                    if pointlist is not None:
-                        pygame.draw.polygon(
-                            self.surface,
-                            unit.color,
-                            pointlist
-                        )
-                    else:
-                        pygame.draw.circle(
-                            self.surface,
-                            unit.color,
-                            pos,
-                            int(radius)
-                        )
+        Only tiles whose tile type, unit or hover state changed
+        since the last call are drawn again, over the board.
+
+        Returns:
+            {list} -- Rects of the window that were drawn on
+        """
+        grid = self.grid
+        hover_location = self.hover_location
+        drawn_tiles = self.drawn_tiles
+        full_redraw = drawn_tiles is None
+        if full_redraw:
+            # Every tile is now drawn blank, empty and not hovered
+            self.surface.blit(self.board, (0, 0))
+            drawn_tiles = self.drawn_tiles = [(BLANK, None, False)] * len(self.tile_positions)
+
+        dirty_rects = []
+        for index, position in enumerate(self.tile_positions):
+            col, row = position
+            unit = None
+            unit_type = grid.get_unit_type(col, row)
+            if unit_type != 0:
+                unit = self.get_unit_by_type(unit_type)
+            tile = (grid.get_tile_type(col, row), unit, position == hover_location)
+            if tile != drawn_tiles[index]:
+                drawn_tiles[index] = tile
+                self.draw_tile(index, *tile)
+                dirty_rects.append(self.window_rects[index])
+
+        if full_redraw:
+            return [self.get_rect()]
+        return dirty_rects
+
+    def draw_tile(self, index, tile_type, unit, hovered):
+        """
+        Draws one tile and the unit on it, if any, over the board.
+        """
+        # Start from a blank tile
+        cell_rect = self.cell_rects[index]
+        self.surface.blit(self.board, cell_rect, cell_rect)
+
+        # Determine color of tiles
+        tile_color = colors.darkgray
+        if tile_type == HEALTH:
+            tile_color = colors.green
+        elif tile_type == HARM:
+            tile_color = colors.purple
+        elif tile_type == MOVABLE:
+            tile_color = colors.lightergrey
+        elif tile_type == ATTACKABLE:
+            tile_color = colors.red
+
+        # Display tiles; blank ones are already on the board
+        tile_rect = self.tile_rects[index]
+        if tile_color != colors.darkgray:
+            pygame.draw.rect(self.surface, tile_color, tile_rect)
+
+        # Highlight hovered tile
+        if hovered:
+            pygame.draw.rect(self.surface,
+                             colors.get_hover_color(tile_color),
+                             tile_rect)
+
+        # Draw unit from its pre-rendered shape
+        if unit:
+            sprite = get_unit_sprite(unit.archetype, unit.color, self.tile_w, self.tile_h)
+            self.surface.blit(sprite, tile_rect)
 
     def flash_red(self):
         """
         Makes screen red for a moment.
         """
+        self.invalidate()
         self.screen.fill(colors.darkred)
         pygame.display.update()
         pygame.time.delay(18)
@@ -357,7 +397,8 @@ class Map:
         """
         Parameter result is either "hit", "block", "damage", or "kill".
         """
-        font = pygame.font.Font(GAME_FONT, 26)
+        # The popup stays on the window until the next full frame
+        self.invalidate()
         text = ""
         color = colors.white
         display_time = 740
@@ -377,7 +418,7 @@ class Map:
             display_time = 1200
 
         # Set up popup window
-        text_surface = font.render(text, False, color)
+        text_surface = render_text(text, 26, color)
         text_rect = text_surface.get_rect()
         text_rect.center = (WINDOW_CENTER[0], WINDOW_CENTER[1] + self.get_rect().h // 2 + 30)
 
@@ -483,13 +524,8 @@ class Map:
         """
         Returns true if an enemy unit is in self.selected_unit's attack range.
         """
-        is_in_range = False
         attack_range = self.selected_unit.get_range("attack", self.grid.cols, self.grid.rows)
-        for enemy_unit in self.enemy_units:
-            if enemy_unit.pos in attack_range:
-                is_in_range = True
-
-        return is_in_range
+        return any(tuple(enemy_unit.pos) in attack_range for enemy_unit in self.enemy_units)
 
     def kill_unit(self, unit):
         """
@@ -512,11 +548,25 @@ class Map:
         player_has_picked = False
         hand_sent = False
         winner = 0
+        # Rock paper scissors is drawn over the whole window
+        self.invalidate()
 
+        # Whether a get_rps_winner request is waiting on a reply
+        asking = False
+
+        def receive_winner(result):
+            nonlocal winner, asking
+            asking = False
+            # No reply, such as after a network error, is asked again
+            winner = result or 0
+
+        events = []
+        # Whether the player had picked when the window was last drawn
+        drawn_picked = None
         while winner == 0:
             # Loop until rps is over
+            self.network.poll()
             mouse_position = pygame.mouse.get_pos()
-            events = pygame.event.get()
             for event in events:
                 if event.type == pygame.QUIT:
                     print("Exiting game...")
@@ -532,19 +582,33 @@ class Map:
                             player_has_picked = True
             
             if (not hand_sent) and player_has_picked:
-                self.network.send_hand(self.rps.hand)
+                # Winner is asked for right away, no need to wait for "ok"
+                self.network.request("send_hand", self.rps.hand, False)
                 hand_sent = True
-            elif player_has_picked:
-                winner = self.network.get_rps_winner()
-
-            # Draw RPS graphics
-            self.screen.fill(colors.lightgray)
-            if not player_has_picked:
-                # Draw RPS graphics
-                self.rps.draw(role)
-            else:
-                self.display_rps_waiting()
-            pygame.display.update()
+            if self.network.subscribed:
+                # Also pushed before picking if the other player leaves
+                winner = self.network.take_event(RPS_WINNER_EVENT) or 0
+            elif hand_sent and not asking and winner == 0:
+                # The server replies once the other player has thrown
+                asking = True
+                self.network.request("get_rps_winner", callback=receive_winner)
+            if winner == 0 and self.network.connection_lost:
+                # The game loop reconnects; the attack is dropped
+                winner = RPS_ABANDONED
+
+            # Draw RPS graphics, which only change once the player picks
+            if player_has_picked != drawn_picked or window_exposed(events):
+                self.screen.fill(colors.lightgray)
+                if not player_has_picked:
+                    # Draw RPS graphics
+                    self.rps.draw(role)
+                else:
+                    self.display_rps_waiting()
+                pygame.display.update()
+                drawn_picked = player_has_picked
+
+            if winner == 0:
+                events = self.frames.next_frame(WAITING_FPS if player_has_picked else PLAYING_FPS)
 
         # Make tie go to attacker
         if role == "attacker" and winner == 3:
@@ -556,11 +620,41 @@ class Map:
         """
         Draws waiting text for rock, paper, scissors.
         """
-        font = pygame.font.Font(GAME_FONT, 24)
-        textsurface = font.render("Waiting for other player's choice...", False, colors.white)
+        textsurface = render_text("Waiting for other player's choice...", 24, colors.white)
         text_rect = textsurface.get_rect(center=(WINDOW_CENTER))
         self.screen.blit(textsurface, text_rect)
 
+    def sync(self, gamestate):
+        """
+        Puts every unit where the gamestate has it, with its
+        health, undoing anything the server didn't accept.
+        """
+        self.grid.fill(BLANK)
+        self.highlighted_tiles.clear()
+        self.selected_unit = None
+        self.invalidate()
+
+        # Take the units off the grid, and bring them
+        # all back, starting from their first tiles
+        for unit in self.all_units:
+            self.grid.set_unit_type(unit.col(), unit.row(), NO_UNIT)
+        self.all_units.clear()
+        self.players_units.clear()
+        self.enemy_units.clear()
+        self.initialize_units()
+        for unit in self.all_units:
+            self.grid.set_unit_type(unit.col(), unit.row(), NO_UNIT)
+
+        for unit in list(self.all_units):
+            unit.change_health(gamestate.unit_health[unit.type])
+            if not unit.is_alive:
+                self.kill_unit(unit)
+        for unit in self.all_units:
+            location = gamestate.unit_locations[unit.type]
+            if location:
+                unit.pos = list(location)
+            self.grid.set_unit_type(unit.col(), unit.row(), unit.type)
+
     def reset(self):
         """
         Initialize the map.
@@ -568,9 +662,9 @@ class Map:
         Removes special tile_types and
         resets unit health and positions.
         """
-        for row in range(self.grid.rows):
-            for col in range(self.grid.cols):
-                self.grid.set_tile_type(col, row, 0)
+        self.grid.fill(BLANK)
+        self.highlighted_tiles.clear()
+        self.invalidate()
 
         self.initialize_units()
 
@@ -0,0 +1,91 @@
+"""
+File: match.py
+Programmers: Fernando Rodriguez, Charles Davis
+
+Contains the Match class which pairs two clients on the server.
+
+"""
+import secrets
+
+from src.gamestate import GameState
+from src.rules import Rules
+
+class Match:
+    """
+    A single game hosted by the server.
+
+    Holds the gamestate shared by both players
+    and tracks which players are connected.
+    """
+
+    def __init__(self, match_id, gamestate=None):
+        """
+        Arguments:
+            match_id {int} -- Key of the match in the server's match table
+
+        Keyword Arguments:
+            gamestate {GameState} -- State to pick up from, such as after a restart (default: {None})
+        """
+        self.match_id = match_id
+        self.gamestate = gamestate or GameState()
+        # Checks turns before they're applied to the gamestate
+        self.rules = Rules(self.gamestate)
+        # Journal of the match's turns, if the server keeps one
+        self.journal = None
+
+        # Player numbers of connected clients
+        self.players = set()
+
+        # Connections of players that asked for pushed
+        # events, keyed by player number
+        self.subscribers = {}
+
+        # Futures of rps_winner requests waiting on the second hand
+        self.rps_waiters = []
+        # Winner of the last rock paper scissors, 3 on a tie. An
+        # attack is only accepted from a player who won or tied it
+        self.rps_winner = 0
+
+        # Secret each player can show to take their seat
+        # back after reconnecting, keyed by player number
+        self.tokens = {1: secrets.token_bytes(8), 2: secrets.token_bytes(8)}
+
+        # True if player 2 is played by the server
+        self.computer_opponent = False
+
+    def add_player(self):
+        """
+        Seats a new client in the match.
+
+        Returns:
+            {int} -- The player number given to the client
+        """
+        player_num = 1
+        if 1 in self.players:
+            player_num = 2
+        self.players.add(player_num)
+        return player_num
+
+    def remove_player(self, player_num):
+        self.players.discard(player_num)
+        self.subscribers.pop(player_num, None)
+
+    def subscribe(self, player_num, connection):
+        self.subscribers[player_num] = connection
+
+    def wake_rps_waiters(self, winner):
+        """
+        Resolves every request waiting on rock paper scissors
+        with winner, RPS_ABANDONED if it can no longer be decided.
+        """
+        waiters = self.rps_waiters
+        self.rps_waiters = []
+        for future in waiters:
+            if not future.done():
+                future.set_result(winner)
+
+    def is_full(self):
+        return len(self.players) == 2
+
+    def is_empty(self):
+        return not self.players
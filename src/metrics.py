@@ -0,0 +1,121 @@
+"""
+File: metrics.py
+Programmers: Fernando Rodriguez, Charles Davis
+
+Counters, gauges and histograms rendered in the Prometheus
+text exposition format.
+
+Metrics are created once, up front, and kept in variables so
+recording one on the hot path is just an attribute update.
+
+"""
+import bisect
+
+# Upper bounds in seconds of histogram buckets
+LATENCY_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0
+)
+
+class Counter:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+class Gauge:
+    __slots__ = ("value", "function")
+
+    def __init__(self, function=None):
+        """
+        Keyword Arguments:
+            function {callable} -- Computes the value when rendered (default: {None})
+        """
+        self.value = 0
+        self.function = function
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def get(self):
+        if self.function:
+            return self.function()
+        return self.value
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        # Last count is for values above every bound
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+class Registry:
+    """
+    Holds every metric family by name. A family has one
+    metric per distinct set of labels.
+    """
+
+    def __init__(self):
+        # name -> [type, help, {labels: metric}]
+        self.families = {}
+
+    def counter(self, name, help_text, **labels):
+        return self.get_metric(name, "counter", help_text, labels, Counter)
+
+    def gauge(self, name, help_text, function=None, **labels):
+        return self.get_metric(name, "gauge", help_text, labels, lambda: Gauge(function))
+
+    def histogram(self, name, help_text, **labels):
+        return self.get_metric(name, "histogram", help_text, labels, Histogram)
+
+    def get_metric(self, name, metric_type, help_text, labels, create):
+        family = self.families.setdefault(name, [metric_type, help_text, {}])
+        key = tuple(sorted(labels.items()))
+        if key not in family[2]:
+            family[2][key] = create()
+        return family[2][key]
+
+    def render(self):
+        """
+        Returns:
+            {str} -- Every metric in Prometheus text format
+        """
+        lines = []
+        for name, (metric_type, help_text, metrics) in sorted(self.families.items()):
+            lines.append("# HELP {} {}".format(name, help_text))
+            lines.append("# TYPE {} {}".format(name, metric_type))
+            for labels, metric in metrics.items():
+                if metric_type == "counter":
+                    lines.append(format_sample(name, labels, metric.value))
+                elif metric_type == "gauge":
+                    lines.append(format_sample(name, labels, metric.get()))
+                else:
+                    cumulative = 0
+                    for bound, count in zip(metric.bounds + ("+Inf",), metric.counts):
+                        cumulative += count
+                        lines.append(format_sample(name + "_bucket", labels + (("le", bound),),
+                                                   cumulative))
+                    lines.append(format_sample(name + "_sum", labels, metric.sum))
+                    lines.append(format_sample(name + "_count", labels, cumulative))
+        return "\n".join(lines) + "\n"
+
+def format_sample(name, labels, value):
+    if labels:
+        label_text = ",".join('{}="{}"'.format(key, value) for key, value in labels)
+        return "{}{{{}}} {}".format(name, label_text, value)
+    return "{} {}".format(name, value)
+
+# Registry shared by the server modules
+registry = Registry()
@@ -2,14 +2,24 @@
 File: network.py
 Programmers: Fernando Rodriguez, Charles Davis
 
-Contains the Network class which adds connectivity to a client.
+Contains the Network class which adds connectivity to a client,
+and BackgroundNetwork, which runs a Network on a thread of its
+own so the game loop never waits on the server.
 
 """
+import collections
+import itertools
+import queue
+import select
 import socket
-import pickle
+import threading
 
-from src.encryption import encrypt, decrypt
+from src.codec import decode_gamestate, decode_changes, encode_turn
+from src.encryption import create_keypair, create_session
 from src.gamestate import GameState
+from src.protocol import (FrameBuffer, RECV_SIZE, EVENT_PREFIX, REQUEST_PREFIX,
+                          RPS_WINNER_EVENT, pack_frame, pack_request,
+                          unpack_event, unpack_request)
 
 class Network:
     """
@@ -24,6 +34,34 @@ class Network:
         self.ADDR = (self.HOST, self.PORT)
         self.player_num = None
 
+        # "<match id> <player num> <token>" given by the server,
+        # sent back to take the same seat after reconnecting
+        self.seat = None
+        # Set once the server stops answering
+        self.connection_lost = False
+
+        # Session keys, agreed on when connecting
+        self.session = None
+
+        # Reused for every recv() on this connection
+        self.recv_buffer = bytearray(RECV_SIZE)
+        self.frame_buffer = FrameBuffer()
+
+        # Decrypted replies to commands, and (name, value)
+        # events pushed by the server, in order of arrival
+        self.replies = collections.deque()
+        self.events = collections.deque()
+        self.subscribed = False
+
+        # Replies to commands sent with submit(), by request id.
+        # Replies to ids in ignored_requests are dropped.
+        self.request_ids = itertools.count(1)
+        self.tagged_replies = {}
+        self.ignored_requests = set()
+
+        # Gamestate version last received from server
+        self.version = 0
+
         gamestate = GameState()
 
     def get_gamestate(self):
@@ -31,20 +69,57 @@ class Network:
         Retrieves the gamestate from server.
         """
         self.send_command("get")
-        return self.receive_pickle()
+        try:
+            gamestate = decode_gamestate(self.receive_payload())
+        except socket.error as e:
+            print(str(e))
+            return None
+        self.version = gamestate.version
+        return gamestate
+
+    def get_changes(self):
+        """
+        Retrieves the gamestate changes made since the
+        last gamestate or changes received.
+
+        Returns:
+            {list} -- (kind, target, a, b) records for GameState.apply_change,
+                      or None if a full gamestate must be fetched instead
+        """
+        self.send_command("since {}".format(self.version))
+        try:
+            version, changes = decode_changes(self.receive_payload())
+        except socket.error as e:
+            print(str(e))
+            return None
+        if changes is not None:
+            self.version = version
+        return changes
+
+    def send_turn(self, turn, wait=True):
+        """
+        Sends move and attack to server in one message.
+
+        Keyword Arguments:
+            wait {bool} -- Wait for the server to acknowledge the turn (default: {True})
+
+        Returns:
+            {bool} -- False if the server rejected the turn
+        """
+        request_id = self.submit("turn", encode_turn(turn), wait)
+        if wait:
+            return self.wait_for_ok(request_id)
+        return True
 
-    def send_turn(self, turn):
+    def start(self):
         """
-        Sends move and attack to server.
+        Tells the server this player is ready to play.
+
+        Returns:
+            {bool} -- True if the server acknowledged it
         """
-        reply = None
-        while reply != "ok":
-            self.send_command("turn")
-            reply = self.receive()
-        reply = None
-        while reply != "ok":
-            self.send_pickle(turn)
-            reply = self.receive()
+        self.send_command("start")
+        return self.receive() == "ok"
 
     def request_turn(self):
         """
@@ -54,28 +129,38 @@ class Network:
         turn = self.receive_integer()
         return turn
 
-    def send_hand(self, hand):
+    def send_hand(self, hand, wait=True):
         """
-        Sends rock paper scissors move to server.
+        Sends rock paper scissors move to server in one message.
+
+        Keyword Arguments:
+            wait {bool} -- Wait for the server to acknowledge the hand (default: {True})
         """
-        reply = None
-        while reply != "ok":
-            self.send_command("hand")
-            reply = self.receive()
-        reply = None
-        while reply != "ok":
-            self.send_pickle(hand)
-            reply = self.receive()
+        request_id = self.submit("hand", str(hand).encode(), wait)
+        if wait:
+            self.wait_for_ok(request_id)
+
+    def wait_for_ok(self, request_id):
+        try:
+            reply = self.get_reply(request_id)
+        except socket.error as e:
+            print(str(e))
+            return False
+        if reply != b"ok":
+            print("Unexpected reply from server:", reply)
+            return False
+        return True
 
     def get_rps_winner(self):
         """
         Retrieves winner of rock paper scissors.
         """
-        winner = None
-        while not winner:
-            self.send_command("rps_winner")
-            winner = self.receive_integer()
-        return winner
+        if self.subscribed:
+            return self.wait_for_event(RPS_WINNER_EVENT)
+
+        # The server replies once the other player has thrown
+        self.send_command("rps_winner")
+        return self.receive_integer()
 
     def check_for_rps(self):
         """
@@ -90,51 +175,134 @@ class Network:
             rps_in_session = False
         return rps_in_session
 
+    def subscribe(self):
+        """
+        Asks the server to push events (see protocol.py)
+        instead of waiting to be polled.
+        """
+        self.send_command("subscribe")
+        self.subscribed = self.receive() == "ok"
+
+    def wait_for_event(self, name):
+        """
+        Blocks until an event called name is pushed and returns
+        its value. Other events stay queued.
+        """
+        while True:
+            for event in self.events:
+                if event[0] == name:
+                    self.events.remove(event)
+                    return event[1]
+            try:
+                self.read_socket()
+                self.dispatch_frames()
+            except socket.error as e:
+                print(str(e))
+                return None
+
+    def submit(self, command, argument=b"", want_reply=True):
+        """
+        Sends a command tagged with a new request id without
+        waiting for the reply, so several commands can be in
+        flight at once. Collect the reply with get_reply().
+
+        Arguments:
+            command {str} -- The command, such as "get" or "turn"
+
+        Keyword Arguments:
+            argument {bytes} -- Payload sent along with the command (default: {b""})
+            want_reply {bool} -- If False the reply is dropped on arrival (default: {True})
+
+        Returns:
+            {int} -- The request id
+        """
+        request_id = next(self.request_ids)
+        if not want_reply:
+            self.ignored_requests.add(request_id)
+        message = command.encode()
+        if argument:
+            message += b" " + argument
+        self.send_frame(self.session.encrypt(pack_request(request_id, message)))
+        return request_id
+
+    def get_reply(self, request_id):
+        """
+        Returns the reply to a submitted command, reading
+        from the socket until it arrives.
+        """
+        self.dispatch_frames()
+        while request_id not in self.tagged_replies:
+            self.read_socket()
+            self.dispatch_frames()
+        return self.tagged_replies.pop(request_id)
+
     def send_command(self, data):
         """
         Sends a command the server understands, such
         as requesting data or letting the server know
         that the client is about to send data.
         """
-        try:
-            encrypted_data = encrypt(data.encode())
-            self.CLIENT.sendall(encrypted_data)
-        except socket.error as e:
-            print(str(e))
-            
-    def send_pickle(self, data):
+        self.send_frame(self.session.encrypt(data.encode()))
+
+    def send_frame(self, payload):
         """
-        Sends a serialized object to server.
+        Sends one length-prefixed frame.
         """
-        data_pickle = pickle.dumps(data)
         try:
-            encrypted_data = encrypt(data_pickle)
-            self.CLIENT.sendall(encrypted_data)
+            self.CLIENT.sendall(pack_frame(payload))
         except socket.error as e:
             print(str(e))
+            self.connection_lost = True
 
-    def receive_pickle(self):
+    def read_socket(self):
         """
-        Retrieves pickle from server.
-        
-        Returns:
-            {object} -- An object loaded from pickle
+        Reads whatever the server has sent into the frame buffer.
         """
         try:
-            decrypted_data = decrypt(self.CLIENT.recv(2048))
-            return pickle.loads(decrypted_data)
-        except socket.error as e:
-            print(str(e))
-            return None
+            received = self.CLIENT.recv_into(self.recv_buffer)
+        except socket.error:
+            self.connection_lost = True
+            raise
+        if not received:
+            self.connection_lost = True
+            raise ConnectionError("Server closed the connection")
+        self.frame_buffer.feed(memoryview(self.recv_buffer)[:received])
+
+    def dispatch_frames(self):
+        """
+        Decrypts complete frames and sorts them into
+        replies and pushed events.
+        """
+        for frame in self.frame_buffer.frames():
+            payload = self.session.decrypt(frame)
+            if payload.startswith(EVENT_PREFIX):
+                self.events.append(unpack_event(payload))
+            elif payload.startswith(REQUEST_PREFIX):
+                request_id, payload = unpack_request(payload)
+                if request_id in self.ignored_requests:
+                    self.ignored_requests.discard(request_id)
+                else:
+                    self.tagged_replies[request_id] = payload
+            else:
+                self.replies.append(payload)
+
+    def receive_payload(self):
+        """
+        Returns the next decrypted reply from server,
+        reading from the socket until one is available.
+        """
+        self.dispatch_frames()
+        while not self.replies:
+            self.read_socket()
+            self.dispatch_frames()
+        return self.replies.popleft()
 
     def receive(self):
         """
         Receives regular data from server.
         """
         try:
-            decrypted_data = decrypt(self.CLIENT.recv(2048))
-            data = decrypted_data.decode()
-            return data
+            return self.receive_payload().decode()
         except socket.error as e:
             print(str(e))
             return None
@@ -155,9 +323,65 @@ class Network:
         Initiates a connection with server.
         """
         self.CLIENT.connect(self.ADDR)
+        self.handshake()
         self.player_num = self.receive_integer()
+        self.send_command("seat")
+        self.seat = self.receive()
         print("Connected to server:", self.HOST)
 
+    def reconnect(self):
+        """
+        Connects again after the connection was lost, such as
+        when the server restarted, and takes back the same seat.
+
+        Returns:
+            {bool} -- True if the seat was taken back
+        """
+        if self.seat is None:
+            return False
+        self.CLIENT.close()
+        self.CLIENT = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.frame_buffer = FrameBuffer()
+        self.replies.clear()
+        self.events.clear()
+        self.tagged_replies.clear()
+        self.ignored_requests.clear()
+        self.connection_lost = False
+        try:
+            self.CLIENT.connect(self.ADDR)
+            self.handshake()
+            self.receive_integer()
+        except (socket.error, ValueError) as e:
+            print(str(e))
+            self.connection_lost = True
+            return False
+
+        self.send_command("resume " + self.seat)
+        if self.receive() != "ok":
+            self.connection_lost = True
+            return False
+
+        # The server may have lost changes it hadn't logged
+        self.version = 0
+        if self.subscribed:
+            self.subscribe()
+        print("Reconnected to server:", self.HOST)
+        return True
+
+    def handshake(self):
+        """
+        Swaps public keys with server and derives session keys.
+        """
+        private_key, public_key = create_keypair()
+        self.send_frame(public_key)
+
+        server_public_key = self.frame_buffer.next_frame()
+        while server_public_key is None:
+            self.read_socket()
+            server_public_key = self.frame_buffer.next_frame()
+
+        self.session = create_session(private_key, server_public_key, is_server=False)
+
     def get_player_num(self):
         """
         Gets player's number stored in Network class.
@@ -169,4 +393,179 @@ class Network:
         Safely closes client socket.
         """
         self.send_command("quit")
-        self.CLIENT.close()
\ No newline at end of file
+        self.CLIENT.close()
+
+# Kinds of item BackgroundNetwork hands from its thread to poll()
+FINISHED_CALL = 1
+PUSHED_EVENT = 2
+
+# Seconds close() waits for the thread to say goodbye to the server
+CLOSE_TIMEOUT = 1
+
+class BackgroundNetwork:
+    """
+    Owns a connected Network on a thread of its own.
+
+    The game loop queues Network calls with request() and, once a
+    frame, poll() runs the callbacks of the calls that finished and
+    queues the events the server pushed. The game loop never touches
+    the socket, so a slow round trip can't hold up input or drawing.
+    """
+
+    def __init__(self, network, notify=None):
+        """
+        Arguments:
+            network {Network} -- A connected network, only used by the thread from now on
+
+        Keyword Arguments:
+            notify {function} -- Called from the thread when poll() has something new (default: {None})
+        """
+        self.network = network
+        self.notify = notify
+
+        # (method name, arguments, callback) of calls to make,
+        # or None to stop the thread
+        self.calls = queue.Queue()
+        # (FINISHED_CALL, callback, result) and (PUSHED_EVENT, event)
+        # waiting for poll(), in order
+        self.finished = queue.Queue()
+
+        # (name, value) events pushed by the server, drained by poll()
+        self.events = collections.deque()
+
+        # A byte is sent here with each call to wake the thread
+        # up from waiting on the server
+        self.wake_reader, self.wake_writer = socket.socketpair()
+
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    @property
+    def player_num(self):
+        return self.network.player_num
+
+    @property
+    def subscribed(self):
+        return self.network.subscribed
+
+    @property
+    def connection_lost(self):
+        return self.network.connection_lost
+
+    def request(self, name, *args, callback=None):
+        """
+        Queues a call to the Network method called name.
+
+        Arguments:
+            name {str} -- Network method, such as "get_gamestate"
+            args -- Arguments to the method
+
+        Keyword Arguments:
+            callback {function} -- Called by poll() with the result (default: {None})
+        """
+        self.calls.put((name, args, callback))
+        self.wake_writer.send(b"\0")
+
+    def poll(self):
+        """
+        Runs the callbacks of calls that finished since the last
+        poll and queues pushed events for get_event().
+        """
+        while True:
+            try:
+                item = self.finished.get_nowait()
+            except queue.Empty:
+                return
+            if item[0] == PUSHED_EVENT:
+                self.events.append(item[1])
+            elif item[1] is not None:
+                item[1](item[2])
+
+    def get_event(self):
+        """
+        Returns:
+            {(str, int)} -- The next event pushed by server, or None
+        """
+        if self.events:
+            return self.events.popleft()
+        return None
+
+    def take_event(self, name):
+        """
+        Removes the first queued event called name.
+        Other events stay queued for get_event().
+
+        Returns:
+            {int} -- The event's value, or None if it hasn't arrived
+        """
+        for event in self.events:
+            if event[0] == name:
+                self.events.remove(event)
+                return event[1]
+        return None
+
+    def close(self):
+        """
+        Says goodbye to the server and stops the thread.
+        """
+        self.calls.put(("close", (), None))
+        self.calls.put(None)
+        self.wake_writer.send(b"\0")
+        self.thread.join(CLOSE_TIMEOUT)
+
+    ############   Network thread   ############
+
+    def run(self):
+        """
+        Makes queued calls, and reads pushed events
+        from the server while there are none.
+        """
+        network = self.network
+        while True:
+            readers = [self.wake_reader]
+            if network.subscribed and not network.connection_lost:
+                readers.append(network.CLIENT)
+            readable, _, _ = select.select(readers, [], [])
+
+            if self.wake_reader in readable:
+                self.wake_reader.recv(RECV_SIZE)
+            if network.CLIENT in readable:
+                try:
+                    network.read_socket()
+                    network.dispatch_frames()
+                except Exception as e:
+                    print(str(e))
+                self.forward_events()
+                # Events, or the connection being lost
+                self.wake_game_loop()
+
+            while True:
+                try:
+                    call = self.calls.get_nowait()
+                except queue.Empty:
+                    break
+                if call is None:
+                    self.wake_reader.close()
+                    self.wake_writer.close()
+                    return
+                self.make_call(*call)
+
+    def make_call(self, name, args, callback):
+        try:
+            result = getattr(self.network, name)(*args)
+        except Exception as e:
+            print("[Error]: {} failed: {}".format(name, e))
+            result = None
+        # Events that arrived along with the reply go first
+        self.forward_events()
+        self.finished.put((FINISHED_CALL, callback, result))
+        self.wake_game_loop()
+
+    def wake_game_loop(self):
+        if self.notify:
+            self.notify()
+
+    def forward_events(self):
+        events = self.network.events
+        while events:
+            self.finished.put((PUSHED_EVENT, events.popleft()))
@@ -0,0 +1,168 @@
+"""
+File: protocol.py
+Programmers: Fernando Rodriguez, Charles Davis
+
+Framing used by both server and client.
+
+Every message on the wire is a frame: a 4 byte big-endian
+length followed by that many bytes of (encrypted) payload.
+Frames may be split or merged by TCP in any way; FrameBuffer
+and read_frame put them back together.
+
+"""
+import asyncio
+import struct
+
+# Length prefix of each frame
+HEADER = struct.Struct("!I")
+
+# Largest payload accepted, guards against corrupt headers
+MAX_FRAME_SIZE = 1 << 20
+
+# Size of the socket receive buffer
+RECV_SIZE = 65536
+
+def pack_frame(payload):
+    """
+    Prefixes payload with its length.
+
+    Arguments:
+        payload {bytes} -- The data to send
+
+    Returns:
+        {bytes} -- The frame ready to be written to a socket
+    """
+    return HEADER.pack(len(payload)) + payload
+
+def pack_frames(payloads):
+    """
+    Joins several payloads into one buffer so they
+    can be sent with a single sendall/write.
+    """
+    return b"".join([HEADER.pack(len(payload)) + payload for payload in payloads])
+
+def check_frame_size(length):
+    if length > MAX_FRAME_SIZE:
+        raise ValueError("Frame of {} bytes exceeds limit of {}".format(length, MAX_FRAME_SIZE))
+
+class FrameBuffer:
+    """
+    Reassembles frames from a stream of bytes.
+
+    Bytes are appended with feed() as they arrive, and
+    next_frame() returns complete payloads in order.
+    The same bytearray is reused for the whole connection.
+    """
+
+    def __init__(self):
+        self.data = bytearray()
+        # Offset of the first unread byte
+        self.start = 0
+
+    def feed(self, data):
+        """
+        Appends received bytes to the buffer.
+        """
+        if self.start:
+            # Drop frames already handed out
+            del self.data[:self.start]
+            self.start = 0
+        self.data += data
+
+    def next_frame(self):
+        """
+        Returns the next complete payload, or None if
+        more bytes are needed.
+        """
+        header_end = self.start + HEADER.size
+        if len(self.data) < header_end:
+            return None
+
+        length, = HEADER.unpack_from(self.data, self.start)
+        check_frame_size(length)
+
+        frame_end = header_end + length
+        if len(self.data) < frame_end:
+            return None
+
+        payload = bytes(self.data[header_end:frame_end])
+        self.start = frame_end
+        return payload
+
+    def frames(self):
+        """
+        Yields every complete payload in the buffer.
+        """
+        payload = self.next_frame()
+        while payload is not None:
+            yield payload
+            payload = self.next_frame()
+
+async def read_frame(reader):
+    """
+    Reads one frame from an asyncio stream.
+
+    Returns:
+        {bytes} -- The payload, or None if the stream
+                   closed between frames
+    """
+    try:
+        header = await reader.readexactly(HEADER.size)
+    except asyncio.IncompleteReadError as e:
+        if e.partial:
+            raise
+        return None
+
+    length, = HEADER.unpack(header)
+    check_frame_size(length)
+    return await reader.readexactly(length)
+
+#################   Events   ###################
+
+# Marks a message pushed by the server rather than
+# sent in reply to a command
+EVENT_PREFIX = b"!"
+
+# Event names, each carries one integer value
+TURN_EVENT = "turn"              # Player whose turn it is
+RPS_START_EVENT = "rps_start"    # Player who threw the first hand
+RPS_WINNER_EVENT = "rps_winner"  # Winner of rock paper scissors, 3 on tie
+GAME_OVER_EVENT = "game_over"    # Player who won the game
+
+# Sent as the winner of rock paper scissors, in an event or in
+# reply to "rps_winner", when a player left before it was decided
+RPS_ABANDONED = -1
+
+def pack_event(name, value=0):
+    return EVENT_PREFIX + "{} {}".format(name, value).encode()
+
+def unpack_event(payload):
+    """
+    Returns:
+        {(str, int)} -- The event name and value
+    """
+    name, value = payload[len(EVENT_PREFIX):].decode().split()
+    return name, int(value)
+
+###############   Request Ids   ################
+
+# A command may start with "@<id> ". The reply to it then
+# starts with the same tag, so a client can send several
+# commands without waiting and match up the replies.
+REQUEST_PREFIX = b"@"
+
+def pack_request(request_id, payload):
+    if request_id is None:
+        return payload
+    return REQUEST_PREFIX + str(request_id).encode() + b" " + payload
+
+def unpack_request(payload):
+    """
+    Returns:
+        {(int, bytes)} -- The request id, or None if untagged,
+                          and the rest of the payload
+    """
+    if not payload.startswith(REQUEST_PREFIX):
+        return None, payload
+    request_id, _, payload = payload[len(REQUEST_PREFIX):].partition(b" ")
+    return int(request_id), payload
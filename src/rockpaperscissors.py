@@ -8,6 +8,7 @@ import os
 
 import src.colors as colors
 from src.constants import *
+from src.fonts import render_text
 
 class RPS:
     """
@@ -76,15 +77,13 @@ class RPS:
             help_text = "HELP: Play rock, paper, scissors! You must win to avoid damage."
 
         # Display title
-        title_font = pygame.font.Font(GAME_FONT, 20)
-        text_surface = title_font.render(title_text, False, title_color)
+        text_surface = render_text(title_text, 20, title_color)
         location = [(WINDOW_WIDTH // 2) - (text_surface.get_width() // 2), 10] 
         self.screen.blit(text_surface, location)
 
         # Display help text
         location = [0, WINDOW_HEIGHT-25]
-        font = pygame.font.Font(GAME_FONT, 12)
-        text_surface = font.render(help_text, False, colors.white)
+        text_surface = render_text(help_text, 12, colors.white)
         self.screen.blit(text_surface, location)
 
     def scale(self, image):
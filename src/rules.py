@@ -0,0 +1,306 @@
+"""
+File: rules.py
+Programmers: Fernando Rodriguez, Charles Davis
+
+Contains the Rules class, which checks and applies turns without pygame.
+
+Tiles are numbered row by row: tile = row * GRID_COLUMNS + col.
+A unit's move or attack range is the square of tiles within its
+speed or attack range in both directions, the same tiles that
+Unit.get_range returns. Ranges are looked up in tables built
+once at import, and an occupancy index maps each tile to the
+unit standing on it, so checking an action takes constant time.
+The position's Zobrist hash (see zobrist.py) is kept in hash.
+
+"""
+from src.constants import *
+from src.unit import Unit
+from src.zobrist import HEALTH_KEYS, TURN_KEY, UNIT_KEYS, unit_key
+
+TILE_COUNT = GRID_COLUMNS * GRID_ROWS
+
+UNIT_TYPES = range(1, 2 * MAX_UNITS + 1)
+
+def tile_of(col, row):
+    return row * GRID_COLUMNS + col
+
+def position_of(tile):
+    row, col = divmod(tile, GRID_COLUMNS)
+    return [col, row]
+
+def build_range_table(distance):
+    """
+    Returns:
+        {list} -- For every tile, a tuple of the tiles at most
+                  distance columns and rows away, itself included
+    """
+    table = []
+    for tile in range(TILE_COUNT):
+        col, row = position_of(tile)
+        table.append(tuple(
+            tile_of(range_col, range_row)
+            for range_row in range(max(row - distance, 0), min(row + distance + 1, GRID_ROWS))
+            for range_col in range(max(col - distance, 0), min(col + distance + 1, GRID_COLUMNS))
+        ))
+    return table
+
+# Unit attributes indexed by unit type, index 0 is NO_UNIT
+UNITS = [None] + [Unit(unit_type) for unit_type in UNIT_TYPES]
+OWNER = [0] + [unit.get_owning_player() for unit in UNITS[1:]]
+SPEED = [0] + [unit.speed for unit in UNITS[1:]]
+ATTACK_POWER = [0] + [unit.attack_power for unit in UNITS[1:]]
+ATTACK_RANGE = [0] + [unit.attack_range for unit in UNITS[1:]]
+MAX_HEALTH = [0] + [unit.max_health for unit in UNITS[1:]]
+
+# Tiles in range keyed by distance, as tuples for looping
+# over and frozensets for membership tests
+RANGES = {distance: build_range_table(distance)
+          for distance in set(SPEED[1:] + ATTACK_RANGE[1:])}
+RANGE_SETS = {distance: [frozenset(tiles) for tiles in table]
+              for distance, table in RANGES.items()}
+
+def build_start_tiles():
+    """
+    Returns:
+        {list} -- Where each unit stands before it first
+                  moves, see Map.initialize_units
+    """
+    rows = (0, GRID_ROWS // 2, GRID_ROWS - 1)
+    start_tiles = [None]
+    for unit_type in UNIT_TYPES:
+        col = 0 if OWNER[unit_type] == 1 else GRID_COLUMNS - 1
+        start_tiles.append(tile_of(col, rows[(unit_type - 1) % MAX_UNITS]))
+    return start_tiles
+
+START_TILES = build_start_tiles()
+
+class IllegalTurn(Exception):
+    """
+    Raised when a turn breaks the rules.
+    """
+
+class Rules:
+    """
+    Tracks where units stand and how much health they
+    have, and checks turns against the game rules.
+
+    If given a GameState, legal turns are also applied
+    to it and the Rules start from its state.
+    """
+
+    def __init__(self, gamestate=None):
+        """
+        Keyword Arguments:
+            gamestate {GameState} -- Gamestate to check and apply turns to (default: {None})
+        """
+        self.gamestate = gamestate
+        self.sync()
+
+    def sync(self):
+        """
+        Rebuilds the index from the gamestate, or sets
+        up a new game if there is no gamestate.
+        """
+        self.tiles = [None] * len(START_TILES)
+        self.health = list(MAX_HEALTH)
+        # Unit type standing on each tile
+        self.occupancy = bytearray(TILE_COUNT)
+        self.units_left = {1: MAX_UNITS, 2: MAX_UNITS}
+        self.turn = 1
+        self.winner = None
+
+        gamestate = self.gamestate
+        if gamestate:
+            self.turn = gamestate.get_turn()
+            self.winner = gamestate.winner
+
+        for unit_type in UNIT_TYPES:
+            tile = START_TILES[unit_type]
+            if gamestate:
+                self.health[unit_type] = gamestate.unit_health[unit_type]
+                location = gamestate.unit_locations[unit_type]
+                if location:
+                    tile = tile_of(*location)
+
+            if self.health[unit_type] > 0:
+                self.tiles[unit_type] = tile
+                self.occupancy[tile] = unit_type
+            else:
+                self.units_left[OWNER[unit_type]] -= 1
+
+        self.hash = TURN_KEY if self.turn == 2 else 0
+        for unit_type in UNIT_TYPES:
+            self.hash ^= unit_key(unit_type, self.tiles[unit_type], self.health[unit_type])
+
+    def copy(self):
+        """
+        Returns:
+            {Rules} -- A copy of the position, not tied to any gamestate
+        """
+        rules = Rules.__new__(Rules)
+        rules.gamestate = None
+        rules.tiles = self.tiles[:]
+        rules.health = self.health[:]
+        rules.occupancy = self.occupancy[:]
+        rules.units_left = self.units_left.copy()
+        rules.turn = self.turn
+        rules.winner = self.winner
+        rules.hash = self.hash
+        return rules
+
+    def get_position(self, unit_type):
+        """
+        Returns:
+            {list} -- The [col, row] of the unit, or None if it is dead
+        """
+        tile = self.tiles[unit_type]
+        if tile is None:
+            return None
+        return position_of(tile)
+
+    def get_units(self, player_num):
+        """
+        Returns:
+            {list} -- Unit types of the player's living units
+        """
+        return [unit_type for unit_type in UNIT_TYPES
+                if OWNER[unit_type] == player_num and self.tiles[unit_type] is not None]
+
+    def get_moves(self, unit_type):
+        """
+        Returns:
+            {list} -- Free tiles the unit can move to
+        """
+        occupancy = self.occupancy
+        return [tile for tile in RANGES[SPEED[unit_type]][self.tiles[unit_type]]
+                if not occupancy[tile]]
+
+    def get_targets(self, unit_type):
+        """
+        Returns:
+            {list} -- Enemy units in the unit's attack range
+        """
+        player_num = OWNER[unit_type]
+        occupancy = self.occupancy
+        return [occupancy[tile] for tile in RANGES[ATTACK_RANGE[unit_type]][self.tiles[unit_type]]
+                if occupancy[tile] and OWNER[occupancy[tile]] != player_num]
+
+    def check_turn(self, player_num, turn):
+        """
+        Checks that player_num may play turn now.
+
+        Arguments:
+            player_num {int} -- Player sending the turn
+            turn {dict} -- Has a "move" of [unit_type, col, row] and an "attack"
+                           of [unit_type, attack_power], either may be None
+
+        Returns:
+            {int} -- The attacking unit type, or NO_UNIT if there is no attack
+
+        Raises:
+            IllegalTurn -- If the turn breaks the rules
+        """
+        if self.winner:
+            raise IllegalTurn("game is over")
+        if player_num != self.turn:
+            raise IllegalTurn("not player's turn")
+
+        move = turn.get("move")
+        moved_unit = NO_UNIT
+        tile = None
+        if move:
+            moved_unit, col, row = move
+            if not self.is_own_unit(player_num, moved_unit):
+                raise IllegalTurn("unit can't move")
+            if not (0 <= col < GRID_COLUMNS and 0 <= row < GRID_ROWS):
+                raise IllegalTurn("move is off the map")
+            tile = tile_of(col, row)
+            if tile not in RANGE_SETS[SPEED[moved_unit]][self.tiles[moved_unit]]:
+                raise IllegalTurn("move is out of range")
+            if self.occupancy[tile]:
+                raise IllegalTurn("tile is taken")
+
+        attack = turn.get("attack")
+        if not attack:
+            return NO_UNIT
+
+        target, attack_power = attack
+        if not self.is_own_unit(3 - player_num, target):
+            raise IllegalTurn("unit can't be attacked")
+
+        # The attacker is the unit that moved, or without a
+        # move, the player's unit with that attack power
+        attacker = moved_unit
+        if not attacker:
+            for unit_type in self.get_units(player_num):
+                if ATTACK_POWER[unit_type] == attack_power:
+                    attacker = unit_type
+        if not attacker or ATTACK_POWER[attacker] != attack_power:
+            raise IllegalTurn("wrong attack power")
+
+        # Attack is made from where the attacker ends up
+        if tile is None:
+            tile = self.tiles[attacker]
+        if self.tiles[target] not in RANGE_SETS[ATTACK_RANGE[attacker]][tile]:
+            raise IllegalTurn("attack is out of range")
+        return attacker
+
+    def play_turn(self, player_num, turn):
+        """
+        Checks turn and applies it, along with
+        the gamestate if there is one.
+
+        Raises:
+            IllegalTurn -- If the turn breaks the rules, nothing is applied
+        """
+        self.check_turn(player_num, turn)
+        gamestate = self.gamestate
+
+        move = turn.get("move")
+        if move:
+            self.move(move[0], tile_of(move[1], move[2]))
+            if gamestate:
+                gamestate.move_unit(move)
+
+        attack = turn.get("attack")
+        if attack:
+            self.damage(attack[0], attack[1])
+            if gamestate:
+                gamestate.attack_unit(attack)
+                gamestate.determine_if_game_over()
+
+        self.end_turn()
+        if gamestate:
+            gamestate.change_turns()
+
+    def end_turn(self):
+        self.turn = 3 - self.turn
+        self.hash ^= TURN_KEY
+
+    def move(self, unit_type, tile):
+        keys = UNIT_KEYS[unit_type]
+        self.hash ^= keys[self.tiles[unit_type]] ^ keys[tile]
+        self.occupancy[self.tiles[unit_type]] = NO_UNIT
+        self.occupancy[tile] = unit_type
+        self.tiles[unit_type] = tile
+
+    def damage(self, unit_type, amount):
+        health = max(self.health[unit_type] - amount, 0)
+        keys = HEALTH_KEYS[unit_type]
+        self.hash ^= keys[self.health[unit_type]] ^ keys[health]
+        self.health[unit_type] = health
+        if health == 0:
+            self.hash ^= UNIT_KEYS[unit_type][self.tiles[unit_type]]
+            self.occupancy[self.tiles[unit_type]] = NO_UNIT
+            self.tiles[unit_type] = None
+            player_num = OWNER[unit_type]
+            self.units_left[player_num] -= 1
+            if not self.units_left[player_num]:
+                self.winner = 3 - player_num
+
+    def is_own_unit(self, player_num, unit_type):
+        """
+        Returns true if unit_type is a living unit of player_num.
+        """
+        return (unit_type in UNIT_TYPES and OWNER[unit_type] == player_num
+                and self.tiles[unit_type] is not None)
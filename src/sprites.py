@@ -0,0 +1,60 @@
+"""
+File: sprites.py
+Programmers: Fernando Rodriguez, Charles Davis
+
+Unit shapes drawn once and reused.
+
+Each unit is a triangle, diamond or circle filling its tile.
+Rasterizing the shape for every unit on every frame costs more
+than copying it, so each (archetype, color, tile size) is drawn
+once into a sprite that the map blits onto the tile. Any variant
+of a unit that differs only in color, such as a highlighted or
+dimmed one, is its own entry in the same cache. Sprites are
+shared and must only be blitted, never drawn on.
+
+"""
+import functools
+
+import pygame
+
+# Fills the parts of a sprite outside the shape; no unit uses it
+TRANSPARENT = (255, 0, 255)
+
+@functools.lru_cache(maxsize=None)
+def get_unit_sprite(archetype, color, tile_w, tile_h):
+    """
+    Draws a unit shape the way the map used to draw it onto
+    the tile, so a sprite blitted at the tile's top left gives
+    the same pixels. Sprites are a pixel wider and taller than
+    the tile, as polygon edges reach one pixel past it.
+
+    Arguments:
+        archetype {str} -- "triangle", "diamond" or "circle"
+        color {(int, int, int)} -- Color of the shape
+        tile_w {int} -- Width of a tile
+        tile_h {int} -- Height of a tile
+
+    Returns:
+        {pygame.Surface} -- The shape, transparent around it
+    """
+    sprite = pygame.Surface((tile_w + 1, tile_h + 1))
+    sprite.fill(TRANSPARENT)
+    sprite.set_colorkey(TRANSPARENT, pygame.RLEACCEL)
+
+    tile_rect = pygame.Rect(0, 0, tile_w, tile_h)
+    if archetype == "triangle":
+        pygame.draw.polygon(sprite, color, [
+            tile_rect.midtop,
+            tile_rect.bottomleft,
+            tile_rect.bottomright
+        ])
+    elif archetype == "diamond":
+        pygame.draw.polygon(sprite, color, [
+            tile_rect.midtop,
+            tile_rect.midleft,
+            tile_rect.midbottom,
+            tile_rect.midright
+        ])
+    elif archetype == "circle":
+        pygame.draw.circle(sprite, color, tile_rect.center, int(tile_rect.width / 2))
+    return sprite
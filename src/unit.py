@@ -3,9 +3,27 @@ File: unit.py
 Programmers: Fernando Rodriguez, Charles Davis
 
 """
+import functools
+
 import src.colors as colors
 from src.constants import *
 
+@functools.lru_cache(maxsize=None)
+def get_tiles_in_range(unit_range, col, row, max_col, max_row):
+    """
+    Returns every tile at most unit_range columns and rows away
+    from (col, row), including (col, row) itself. Built once
+    per range, position and grid size, then served from cache.
+
+    Returns:
+        {frozenset} -- (col, row) tuples
+    """
+    return frozenset(
+        (range_col, range_row)
+        for range_col in range(max(col - unit_range, 0), min(col + unit_range + 1, max_col))
+        for range_row in range(max(row - unit_range, 0), min(row + unit_range + 1, max_row))
+    )
+
 class Unit:
     """
     A player's unit on the gameboard.
@@ -99,13 +117,15 @@ class Unit:
 
     def get_range(self, range_type, max_col, max_row):
         """
-        Returns a list of tiles the unit can move to.
+        Returns the tiles the unit can move to or attack.
 
         Arguments:
             range_type {string} -- Range type to calculate (attack, move)
             max_col {int}       -- Number of columns
             max_row {int}       -- Number of rows
 
+        Returns:
+            {frozenset} -- (col, row) tuples, shared with other callers
         """
         # Determine range type based on input
         if range_type == "attack":
@@ -113,59 +133,10 @@ class Unit:
         elif range_type == "move":
             unit_range = self.speed
         else:
-            return []
+            return frozenset()
 
-        # Create list of tiles
         # Unit pos is [col, row]
-        range_list = []
-        # Add current pos of unit to list
-        range_list.append(self.pos)
-
-        # Loop for range of points within speed
-        for s in range(1, unit_range + 1):
-            # Add speed to col i.e. right
-            possible_pos = [self.pos[0] + s, self.pos[1]]
-            if not possible_pos[0] >= max_col:
-                range_list.append(possible_pos)
-
-            # Subtract speed from col i.e. left
-            possible_pos = [self.pos[0] - s, self.pos[1]]
-            if not possible_pos[0] < 0:
-                range_list.append(possible_pos)
-
-            # Add speed to row i.e. down
-            possible_pos = [self.pos[0], self.pos[1] + s]
-            if not possible_pos[1] >= max_row:
-                range_list.append(possible_pos)
-
-            # Subtract speed from row i.e. up
-            possible_pos = [self.pos[0], self.pos[1] - s]
-            if not possible_pos[1] < 0:
-                range_list.append(possible_pos)
-
-            # Loop for corners and inbetweens
-            for i in range(1, unit_range + 1):
-                # Add speed to col and row i.e. bottom right
-                possible_pos = [self.pos[0] + s, self.pos[1] + i]
-                if not (possible_pos[0] >= max_col or possible_pos[1] >= max_row):
-                    range_list.append(possible_pos)
-
-                # Subtract speed to col and row i.e. top left
-                possible_pos = [self.pos[0] - s, self.pos[1] - i]
-                if not (possible_pos[0] < 0 or possible_pos[1] < 0):
-                    range_list.append(possible_pos)
-                
-                # i.e. top right
-                possible_pos = [self.pos[0] + s, self.pos[1] - i]
-                if not (possible_pos[0] >= max_col or possible_pos[1] < 0):
-                    range_list.append(possible_pos)
-                
-                # i.e. bottom left
-                possible_pos = [self.pos[0] - s, self.pos[1] + i]
-                if not (possible_pos[0] < 0 or possible_pos[1] >= max_row):
-                    range_list.append(possible_pos)
-        
-        return range_list
+        return get_tiles_in_range(unit_range, self.pos[0], self.pos[1], max_col, max_row)
 
     def is_triangle(self):
         return self.type == P1_TRIANGLE or self.type == P2_TRIANGLE
@@ -0,0 +1,288 @@
+"""
+File: wal.py
+Programmers: Fernando Rodriguez, Charles Davis
+
+Write-ahead log that lets the server recover in-flight matches
+after it crashes or restarts.
+
+One log is shared by every match on the server. Records are
+appended to a buffer and a background task writes and fsyncs the
+buffer in batches, so one fsync covers every turn that arrived
+while the last one was running. commit() waits until what was
+logged so far is on disk; the server waits on it before telling a
+client its turn was accepted.
+
+When the log grows past CHECKPOINT_SIZE it is replaced by a new
+log holding a snapshot of each open match.
+
+Layout (unsigned, big-endian), a series of records, each a kind
+byte and a match id (4 bytes) followed by:
+    OPENED    -- flags (bit 0: player 2 is the computer), seat
+                 token of player 1 and 2 (8 bytes each), then a
+                 gamestate in codec's snapshot layout
+    SNAPSHOT  -- a gamestate in codec's snapshot layout
+    TURN      -- player, then a turn in codec's turn layout
+    CLOSED    -- nothing
+
+"""
+import asyncio
+import os
+import struct
+
+from src.codec import (GAMESTATE_FORMAT, TURN_FORMAT, decode_gamestate, decode_turn,
+                       encode_gamestate, encode_turn)
+from src.rules import IllegalTurn, Rules
+
+# Record kinds
+OPENED_RECORD = 1
+SNAPSHOT_RECORD = 2
+TURN_RECORD = 3
+CLOSED_RECORD = 4
+
+RECORD_HEADER = struct.Struct("!BI")
+OPENED_FORMAT = struct.Struct("!B8s8s" + str(GAMESTATE_FORMAT.size) + "s")
+SNAPSHOT_FORMAT = struct.Struct("!" + str(GAMESTATE_FORMAT.size) + "s")
+TURN_RECORD_FORMAT = struct.Struct("!B" + str(TURN_FORMAT.size) + "s")
+
+RECORD_FORMATS = {
+    OPENED_RECORD: OPENED_FORMAT,
+    SNAPSHOT_RECORD: SNAPSHOT_FORMAT,
+    TURN_RECORD: TURN_RECORD_FORMAT,
+    CLOSED_RECORD: None
+}
+
+# Flag bits
+COMPUTER_OPPONENT = 1
+
+# Seconds to wait for more records before syncing a batch. Records
+# logged while a sync is running always wait for the next batch
+SYNC_DELAY = 0
+
+# Bytes logged before the log is replaced by a checkpoint
+CHECKPOINT_SIZE = 16 * 1024 * 1024
+
+class RecoveredMatch:
+    """
+    A match read back from the log.
+    """
+
+    def __init__(self, match_id, flags, tokens, gamestate):
+        self.match_id = match_id
+        self.flags = flags
+        # Seat tokens keyed by player number
+        self.tokens = tokens
+        self.gamestate = gamestate
+        self.rules = Rules(gamestate)
+
+class WriteAheadLog:
+    """
+    Logs the matches on a server and syncs
+    the log to disk in batches.
+    """
+
+    def __init__(self, path, get_matches, sync_delay=SYNC_DELAY,
+                 checkpoint_size=CHECKPOINT_SIZE):
+        """
+        Arguments:
+            path {str} -- Log file, replaced by a checkpoint of get_matches()
+            get_matches {function} -- Returns the open matches, for checkpoints
+
+        Keyword Arguments:
+            sync_delay {float} -- Seconds to gather records before a sync (default: {SYNC_DELAY})
+            checkpoint_size {int} -- Log size that triggers a checkpoint (default: {CHECKPOINT_SIZE})
+        """
+        self.path = path
+        self.get_matches = get_matches
+        self.sync_delay = sync_delay
+        self.checkpoint_size = checkpoint_size
+
+        # Start from a checkpoint of the recovered matches,
+        # which also drops any record cut short by a crash
+        self.log_file = None
+        self.replace_log(self.checkpoint())
+
+        self.buffer = bytearray()
+        # Bytes logged since startup and bytes known to be on disk
+        self.logged = 0
+        self.synced = 0
+        # (bytes logged, future) of each commit() waiting on a sync
+        self.waiters = []
+        self.sync_task = None
+
+    ############   Records   ############
+
+    def append(self, kind, match_id, values=()):
+        record = RECORD_HEADER.pack(kind, match_id)
+        record_format = RECORD_FORMATS[kind]
+        if record_format:
+            record += record_format.pack(*values)
+        self.buffer += record
+        self.logged += len(record)
+        if self.sync_task is None:
+            self.sync_task = asyncio.ensure_future(self.sync_batches())
+
+    def opened_record(self, match):
+        flags = COMPUTER_OPPONENT if match.computer_opponent else 0
+        return (flags, match.tokens[1], match.tokens[2], encode_gamestate(match.gamestate))
+
+    def log_opened(self, match):
+        self.append(OPENED_RECORD, match.match_id, self.opened_record(match))
+
+    def log_snapshot(self, match):
+        """
+        Logs changes to a match that aren't
+        turns, such as players getting ready.
+        """
+        self.append(SNAPSHOT_RECORD, match.match_id, (encode_gamestate(match.gamestate),))
+
+    def log_turn(self, match, player_num, turn):
+        self.append(TURN_RECORD, match.match_id, (player_num, encode_turn(turn)))
+
+    def log_closed(self, match):
+        self.append(CLOSED_RECORD, match.match_id)
+
+    ############   Syncing   ############
+
+    async def commit(self):
+        """
+        Waits until everything logged so far is on disk.
+        """
+        if self.synced >= self.logged:
+            return
+        future = asyncio.get_running_loop().create_future()
+        self.waiters.append((self.logged, future))
+        await future
+
+    async def sync_batches(self):
+        """
+        Writes and syncs the buffer until there is nothing left.
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            while self.buffer:
+                await asyncio.sleep(self.sync_delay)
+
+                logged = self.logged
+                if self.size + len(self.buffer) > self.checkpoint_size:
+                    # Snapshots of the open matches replace everything logged
+                    data = self.checkpoint()
+                    self.buffer.clear()
+                    await loop.run_in_executor(None, self.replace_log, data)
+                else:
+                    data = bytes(self.buffer)
+                    self.buffer.clear()
+                    await loop.run_in_executor(None, self.write_log, data)
+                self.synced = logged
+
+                waiting = []
+                for waiter in self.waiters:
+                    if waiter[0] <= logged:
+                        if not waiter[1].done():
+                            waiter[1].set_result(None)
+                    else:
+                        waiting.append(waiter)
+                self.waiters = waiting
+        finally:
+            self.sync_task = None
+
+    def checkpoint(self):
+        """
+        Returns:
+            {bytes} -- An OPENED record for every open match
+        """
+        records = bytearray()
+        for match in self.get_matches():
+            records += RECORD_HEADER.pack(OPENED_RECORD, match.match_id)
+            records += OPENED_FORMAT.pack(*self.opened_record(match))
+        return bytes(records)
+
+    def write_log(self, data):
+        # Runs in an executor thread
+        self.log_file.write(data)
+        self.log_file.flush()
+        os.fsync(self.log_file.fileno())
+        self.size += len(data)
+
+    def replace_log(self, data):
+        # Runs in an executor thread, apart from at startup
+        new_path = self.path + ".new"
+        with open(new_path, "wb") as new_file:
+            new_file.write(data)
+            new_file.flush()
+            os.fsync(new_file.fileno())
+        os.replace(new_path, self.path)
+        sync_directory(self.path)
+
+        if self.log_file:
+            self.log_file.close()
+        self.log_file = open(self.path, "ab")
+        self.size = len(data)
+
+    async def close(self):
+        """
+        Syncs what is left and closes the log.
+        """
+        await self.commit()
+        self.log_file.close()
+
+def sync_directory(path):
+    """
+    Makes a rename in path's directory durable.
+    """
+    directory = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(directory)
+    finally:
+        os.close(directory)
+
+def recover(path):
+    """
+    Reads a log back and replays it. A record cut
+    short by a crash ends the log.
+
+    Arguments:
+        path {str} -- Log written by WriteAheadLog
+
+    Returns:
+        {dict} -- RecoveredMatch of every match not closed, by match id
+    """
+    try:
+        with open(path, "rb") as log_file:
+            data = log_file.read()
+    except FileNotFoundError:
+        return {}
+
+    matches = {}
+    offset = 0
+    while offset + RECORD_HEADER.size <= len(data):
+        kind, match_id = RECORD_HEADER.unpack_from(data, offset)
+        if kind not in RECORD_FORMATS:
+            break
+        record_format = RECORD_FORMATS[kind]
+        values = ()
+        offset += RECORD_HEADER.size
+        if record_format:
+            if offset + record_format.size > len(data):
+                break
+            values = record_format.unpack_from(data, offset)
+            offset += record_format.size
+
+        if kind == OPENED_RECORD:
+            flags, token_1, token_2, gamestate = values
+            matches[match_id] = RecoveredMatch(match_id, flags, {1: token_1, 2: token_2},
+                                               decode_gamestate(gamestate))
+        elif match_id not in matches:
+            continue
+        elif kind == SNAPSHOT_RECORD:
+            match = matches[match_id]
+            match.gamestate = decode_gamestate(values[0])
+            match.rules = Rules(match.gamestate)
+        elif kind == TURN_RECORD:
+            try:
+                matches[match_id].rules.play_turn(values[0], decode_turn(values[1]))
+            except IllegalTurn as e:
+                print("[Error]: Log of match {} has an illegal turn: {}".format(match_id, e))
+        else:
+            del matches[match_id]
+
+    return matches
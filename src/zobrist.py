@@ -0,0 +1,47 @@
+"""
+File: zobrist.py
+Programmers: Fernando Rodriguez, Charles Davis
+
+Keys for Zobrist hashing of game positions.
+
+A position is where each living unit stands, each unit's health
+and whose turn it is. Its hash is the XOR of one random 64-bit
+key per (unit, tile), one per (unit, health) and TURN_KEY when it
+is player 2's turn, so a move or a hit changes the hash with a
+few XORs. GameState and Rules keep their hash up to date this
+way. Keys come from a fixed seed, so every process hashes the
+same position to the same value.
+
+"""
+import random
+
+from src.constants import *
+
+TILE_COUNT = GRID_COLUMNS * GRID_ROWS
+
+UNIT_TYPES = range(1, 2 * MAX_UNITS + 1)
+
+# Healths are sent as one byte, so no health can be out of range
+HEALTH_LEVELS = 256
+
+rng = random.Random(0x5A0B2157)
+
+# UNIT_KEYS[unit_type][tile] and HEALTH_KEYS[unit_type][health], index 0 unused
+UNIT_KEYS = [None] + [[rng.getrandbits(64) for tile in range(TILE_COUNT)]
+                      for unit_type in UNIT_TYPES]
+HEALTH_KEYS = [None] + [[rng.getrandbits(64) for health in range(HEALTH_LEVELS)]
+                        for unit_type in UNIT_TYPES]
+
+TURN_KEY = rng.getrandbits(64)
+
+del rng
+
+def unit_key(unit_type, tile, health):
+    """
+    Returns:
+        {int} -- The unit's share of the hash; tile is None if it is dead
+    """
+    key = HEALTH_KEYS[unit_type][health]
+    if tile is not None:
+        key ^= UNIT_KEYS[unit_type][tile]
+    return key